@@ -15,14 +15,20 @@ document.addEventListener("DOMContentLoaded", () => {
   let detectionInterval = null;
   let isFaceDetected = false;
   let lastFacePosition = null;
+  let lastDetectedFaces = null; // Raw boxes of the last response, sent as a detection hint
   let frameCount = 0;
   let capturedFaces = [];
+  // Camera session id: the server reuses its last result while the scene does not change
+  const cameraSession = window.crypto && crypto.randomUUID
+    ? crypto.randomUUID()
+    : Math.random().toString(36).slice(2);
   let lastCaptureTime = 0;
   const REQUIRED_FACES = 5;
   const FACE_QUALITY_THRESHOLD = 0.4; // Reduced threshold for face size
   const MIN_FACE_SIZE = 100;
   const AUTO_CAPTURE_INTERVAL = 2000; // 2 seconds between auto captures
   const STABLE_FACE_FRAMES = 10; // Number of frames face must be stable
+  const FULL_SCAN_EVERY = 10; // Scan the whole frame every Nth request to find new faces
   let stableFaceCount = 0;
 
   // Start camera
@@ -61,18 +67,24 @@ document.addEventListener("DOMContentLoaded", () => {
 
       canvas.toBlob(
         async (blob) => {
-          const formData = new FormData();
-          formData.append("image", blob, "detection.jpg");
+          // The JPEG is sent as the raw body, so the server never writes it to disk
+          const params = new URLSearchParams({ session: cameraSession });
+          if (lastDetectedFaces && (frameCount / 2) % FULL_SCAN_EVERY !== 0) {
+            params.set("prev_faces", JSON.stringify(lastDetectedFaces));
+          }
+          const url = `detect_face.php?${params}`;
 
           try {
-            const response = await fetch("detect_face.php", {
+            const response = await fetch(url, {
               method: "POST",
-              body: formData,
+              headers: { "Content-Type": "image/jpeg" },
+              body: blob,
             });
 
             const result = await response.json();
 
             if (result.success && result.faces && result.faces.length > 0) {
+              lastDetectedFaces = result.faces;
               const largestFace = result.faces.reduce((largest, current) => {
                 const currentArea = current.width * current.height;
                 const largestArea = largest.width * largest.height;
@@ -157,6 +169,7 @@ document.addEventListener("DOMContentLoaded", () => {
               captureButton.disabled = true;
               status.textContent = "Status: No face detected";
               lastFacePosition = null;
+              lastDetectedFaces = null;
               stableFaceCount = 0;
             }
           } catch (err) {
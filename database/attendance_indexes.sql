@@ -0,0 +1,28 @@
+-- Indexes for marking attendance from face recognition.
+-- Run once against attendance-db, after attendance-db.sql.
+--
+-- The unique key lets a mark be written with a single
+-- INSERT ... ON DUPLICATE KEY UPDATE (update_attendance.php,
+-- python/attendance_writer.py) instead of a SELECT followed by an INSERT or UPDATE.
+-- Until it is applied, update_attendance.php keeps the SELECT first and the
+-- recognition server does not batch marks, so no duplicate rows are written.
+
+--
+-- Remove duplicate marks first: per student, course, unit and day keep the
+-- 'Present' row if there is one, otherwise the earliest
+--
+DELETE a FROM `tblattendance` a
+  JOIN `tblattendance` b
+    ON a.studentRegistrationNumber = b.studentRegistrationNumber
+   AND a.course = b.course
+   AND a.unit = b.unit
+   AND a.dateMarked = b.dateMarked
+ WHERE (b.attendanceStatus = 'Present') > (a.attendanceStatus = 'Present')
+    OR ((b.attendanceStatus = 'Present') = (a.attendanceStatus = 'Present') AND a.attendanceID > b.attendanceID);
+
+--
+-- Indexes for table `tblattendance`
+--
+ALTER TABLE `tblattendance`
+  ADD UNIQUE KEY `uq_attendance_mark` (`studentRegistrationNumber`, `course`, `unit`, `dateMarked`),
+  ADD KEY `idx_attendance_course_unit_date` (`course`, `unit`, `dateMarked`);
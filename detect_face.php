@@ -1,7 +1,11 @@
 <?php
 header('Content-Type: application/json');
 
-if ($_SERVER['REQUEST_METHOD'] !== 'POST' || empty($_FILES['image'])) {
+require_once __DIR__ . '/recognition_client.php';
+
+// The frame is the raw request body or an 'image' upload, read into memory
+$imageData = $_SERVER['REQUEST_METHOD'] === 'POST' ? getUploadedImageData() : null;
+if ($imageData === null) {
     echo json_encode([
         'success' => false,
         'message' => 'Invalid request. Please send an image file.'
@@ -22,15 +26,17 @@ function logMessage($message)
 }
 
 try {
-    // Save the uploaded image temporarily
-    $tmpImage = $_FILES['image']['tmp_name'];
+    // Faces found in the previous frame, searched first
+    $prevFaces = getPrevFaces();
+    $session = getSessionId();
 
-    // Execute the Python script for face detection
-    $command = escapeshellcmd("python python/detect_face.py " . escapeshellarg($tmpImage));
-    $output = shell_exec($command);
+    // Use the resident recognition server when it is running
+    $result = callRecognitionServerBytes('detect', $imageData, 10, $prevFaces, $session);
 
-    // Parse the JSON output from Python script
-    $result = json_decode($output, true);
+    if ($result === null) {
+        // Pipe the image to the Python script for face detection
+        $result = runPythonWithImage(__DIR__ . '/python/detect_face.py', $imageData, $prevFaces);
+    }
 
     if ($result === null) {
         throw new Exception('Failed to parse Python script output');
@@ -1,14 +1,16 @@
 <?php
 header('Content-Type: application/json');
 
-$attendanceFile = 'attendance.json';
-$records = [];
+require_once __DIR__ . '/recognition_client.php';
 
-if (file_exists($attendanceFile)) {
-    $records = json_decode(file_get_contents($attendanceFile), true);
+// Newest records by default, or the page after ?cursor=N (the last record id seen)
+$cursor = isset($_GET['cursor']) ? (int)$_GET['cursor'] : null;
+$limit = isset($_GET['limit']) ? (int)$_GET['limit'] : 50;
+
+$result = getAttendanceRecords($cursor, $limit);
+if (!$result) {
+    echo json_encode(['success' => false, 'message' => 'Failed to load attendance records']);
+    exit;
 }
 
-echo json_encode([
-    'success' => true,
-    'records' => $records
-]);
\ No newline at end of file
+echo json_encode($result);
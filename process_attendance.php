@@ -7,29 +7,25 @@ date_default_timezone_set('Asia/Kathmandu');
 
 header('Content-Type: application/json');
 
-// Check if image was uploaded
-if (!isset($_FILES['image'])) {
+require_once __DIR__ . '/recognition_client.php';
+
+// The frame is posted as the raw request body (or as an 'image' upload) and
+// handed to Python in memory, it is never saved
+$imageData = getUploadedImageData();
+if ($imageData === null) {
     echo json_encode(['success' => false, 'message' => 'No image uploaded']);
     exit;
 }
 
-// Create uploads directory if it doesn't exist
-if (!file_exists('uploads')) {
-    mkdir('uploads', 0777, true);
-}
-
-// Save the uploaded image
-$uploadedFile = $_FILES['image']['tmp_name'];
-$imagePath = 'uploads/capture_' . time() . '.jpg';
-move_uploaded_file($uploadedFile, $imagePath);
-
-// Use Python script for face recognition
-$command = "python recognize_face.py " . escapeshellarg($imagePath);
-$output = shell_exec($command);
-$result = json_decode($output, true);
+// Face location from the previous frame, searched before the whole frame
+$prevFaces = getPrevFaces();
+$session = getSessionId();
 
-// Clean up the temporary image
-unlink($imagePath);
+// Use the resident recognition server, or the Python script when it is not running
+$result = callRecognitionServerBytes('recognize', $imageData, 10, $prevFaces, $session);
+if ($result === null) {
+    $result = runPythonWithImage(__DIR__ . '/python/realtime_recognition.py', $imageData, $prevFaces);
+}
 
 if (!$result) {
     echo json_encode(['success' => false, 'message' => 'Face recognition failed - No response from recognition script']);
@@ -47,7 +43,7 @@ if (!$result['success']) {
 }
 
 // Check if face was detected but not recognized
-if (!isset($result['student_id'])) {
+if (!isset($result['student_id']) || $result['student_id'] === 'Unknown') {
     echo json_encode([
         'success' => true,
         'message' => 'Face detected but not recognized',
@@ -69,51 +65,20 @@ if (!$studentInfo) {
     exit;
 }
 
-// Save attendance record
-$attendanceFile = 'attendance.json';
-$records = [];
-if (file_exists($attendanceFile)) {
-    $records = json_decode(file_get_contents($attendanceFile), true);
-}
-
-// Check if 5 seconds have passed since last attendance
-$currentTime = time();
-$lastAttendanceTime = 0;
-
-// Find the last attendance time for this student
-foreach (array_reverse($records) as $record) {
-    if (isset($record['student_id']) && $record['student_id'] === $result['student_id']) {
-        $lastAttendanceTime = strtotime($record['time']);
-        break;
-    }
-}
-
-// If less than 5 seconds have passed, return early
-if (($currentTime - $lastAttendanceTime) < 5) {
-    echo json_encode([
-        'success' => true,
-        'name' => $studentInfo['name'],
-        'message' => 'Please wait 5 seconds before marking attendance again',
-        'face_location' => $result['face_location'] ?? null,
-        'records' => $records
-    ]);
+// Append to the attendance log, which refuses a second mark within 5 seconds.
+// Only the records after the browser's cursor are sent back.
+$cursor = isset($_GET['cursor']) ? (int)$_GET['cursor'] : 0;
+$mark = markAttendance($result['student_id'], $studentInfo['name'], $result['confidence'], $cursor);
+if (!$mark || !$mark['success']) {
+    echo json_encode(['success' => false, 'message' => $mark['message'] ?? 'Failed to save attendance']);
     exit;
 }
 
-$records[] = [
-    'student_id' => $result['student_id'],
-    'name' => $studentInfo['name'],
-    'time' => date('Y-m-d H:i:s'),
-    'confidence' => $result['confidence']
-];
-
-file_put_contents($attendanceFile, json_encode($records));
-
-// Return success response
 echo json_encode([
     'success' => true,
     'name' => $studentInfo['name'],
-    'message' => 'Attendance marked successfully',
+    'message' => $mark['marked'] ? 'Attendance marked successfully' : 'Please wait 5 seconds before marking attendance again',
     'face_location' => $result['face_location'] ?? null,
-    'records' => $records
+    'records' => $mark['records'],
+    'cursor' => $mark['cursor']
 ]);
\ No newline at end of file
@@ -0,0 +1,271 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from pathlib import Path
+
+from logging_setup import setup_logging
+
+# Configure logging
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# A student is marked at most once per this many seconds
+DEBOUNCE_SECONDS = 5
+
+# Records returned per page when the caller does not ask for a size
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id TEXT,
+    name TEXT,
+    time TEXT NOT NULL,
+    ts REAL NOT NULL,
+    confidence REAL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS last_seen (
+    student_id TEXT PRIMARY KEY,
+    ts REAL NOT NULL,
+    record_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+
+def default_paths():
+    base_dir = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return {
+        'db': base_dir / 'attendance.db',
+        'json': base_dir / 'attendance.json'
+    }
+
+def _parse_time(text):
+    """Epoch seconds of a 'Y-m-d H:i:s' local time, None if it does not parse"""
+    try:
+        return time.mktime(time.strptime(text, TIME_FORMAT))
+    except (TypeError, ValueError):
+        return None
+
+class AttendanceStore:
+    """Append-only attendance log in SQLite (WAL mode) with a last-seen index
+
+    Records are only ever inserted, each gets an increasing id that doubles
+    as the pagination cursor. last_seen holds every student's latest mark
+    and is mirrored in memory, so the debounce check is a dict lookup;
+    a mark re-checks the table row inside its write transaction, so several
+    processes writing the same database never mark a student twice.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = str(db_path or default_paths()['db'])
+        self.conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        # Readers don't block the writer and a mark costs one WAL append
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self.last_seen_index = {row['student_id']: row['ts']
+                                for row in self.conn.execute('SELECT student_id, ts FROM last_seen')}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def last_seen(self, student_id):
+        """Epoch seconds of the student's last mark, or None"""
+        return self.last_seen_index.get(str(student_id))
+
+    def mark(self, student_id, name, confidence=None, debounce=DEBOUNCE_SECONDS, now=None, time_text=None):
+        """Append a mark unless the student was marked less than debounce seconds ago
+
+        Returns {'marked': bool, 'record': the new record or None,
+        'wait': seconds until the student can be marked again}.
+        time_text is the displayed time, by default now in local time.
+        """
+        student_id = str(student_id)
+        now = time.time() if now is None else now
+
+        # Fast path: the in-memory index is never ahead of the database
+        last = self.last_seen_index.get(student_id)
+        if last is not None and now - last < debounce:
+            return {'marked': False, 'record': None, 'wait': round(debounce - (now - last), 3)}
+
+        record = {
+            'student_id': student_id,
+            'name': name,
+            'time': time_text or time.strftime(TIME_FORMAT, time.localtime(now)),
+            'confidence': confidence
+        }
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Another process may have marked the student since the index was read
+                row = self.conn.execute('SELECT ts FROM last_seen WHERE student_id = ?', (student_id,)).fetchone()
+                if row is not None and now - row['ts'] < debounce:
+                    self.conn.execute('COMMIT')
+                    self.last_seen_index[student_id] = row['ts']
+                    return {'marked': False, 'record': None, 'wait': round(debounce - (now - row['ts']), 3)}
+
+                cursor = self.conn.execute(
+                    'INSERT INTO records (student_id, name, time, ts, confidence, data) VALUES (?, ?, ?, ?, ?, ?)',
+                    (student_id, name, record['time'], now, confidence, json.dumps(record))
+                )
+                record_id = cursor.lastrowid
+                self.conn.execute(
+                    'INSERT INTO last_seen (student_id, ts, record_id) VALUES (?, ?, ?) '
+                    'ON CONFLICT(student_id) DO UPDATE SET ts = excluded.ts, record_id = excluded.record_id',
+                    (student_id, now, record_id)
+                )
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.last_seen_index[student_id] = now
+        return {'marked': True, 'record': dict(record, id=record_id), 'wait': debounce}
+
+    def _rows(self, query, params):
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [dict(json.loads(row['data']), id=row['id']) for row in rows]
+
+    def records_since(self, cursor=0, limit=DEFAULT_PAGE_SIZE):
+        """(records, next_cursor): up to limit records added after cursor, oldest first
+
+        Pass next_cursor back to get the following page; it stays the same
+        when nothing new was added.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        records = self._rows('SELECT id, data FROM records WHERE id > ? ORDER BY id LIMIT ?', (int(cursor), limit))
+        if records:
+            return records, records[-1]['id']
+        # A cursor past the end (e.g. from another database) would skip every future record
+        with self.lock:
+            last_id = self.conn.execute('SELECT MAX(id) FROM records').fetchone()[0] or 0
+        return records, min(int(cursor), last_id)
+
+    def recent(self, limit=DEFAULT_PAGE_SIZE):
+        """(records, cursor): the newest limit records, oldest first, and the cursor after them"""
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        records = self._rows('SELECT id, data FROM records ORDER BY id DESC LIMIT ?', (limit,))
+        records.reverse()
+        return records, records[-1]['id'] if records else 0
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+
+    def migrate_json(self, json_path=None):
+        """One-shot import of the old attendance.json, returns the number of records imported
+
+        Runs once per database: the import is recorded in the meta table and
+        the JSON file is renamed to attendance.json.migrated afterwards.
+        """
+        json_path = Path(json_path or default_paths()['json'])
+        with self.lock:
+            if self.conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_json'").fetchone():
+                return 0
+        if not json_path.exists():
+            return 0
+
+        with open(json_path) as f:
+            records = json.load(f) or []
+
+        imported = 0
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Another process may have imported it while the file was read
+                if self.conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_json'").fetchone():
+                    self.conn.execute('ROLLBACK')
+                    return 0
+                for record in records:
+                    if not isinstance(record, dict):
+                        continue
+                    ts = _parse_time(record.get('time')) or 0.0
+                    student_id = record.get('student_id')
+                    cursor = self.conn.execute(
+                        'INSERT INTO records (student_id, name, time, ts, confidence, data) VALUES (?, ?, ?, ?, ?, ?)',
+                        (student_id, record.get('name'), record.get('time', ''), ts, record.get('confidence'),
+                         json.dumps(record))
+                    )
+                    if student_id is not None:
+                        self.conn.execute(
+                            'INSERT INTO last_seen (student_id, ts, record_id) VALUES (?, ?, ?) '
+                            'ON CONFLICT(student_id) DO UPDATE SET ts = excluded.ts, record_id = excluded.record_id '
+                            'WHERE excluded.ts >= last_seen.ts',
+                            (str(student_id), ts, cursor.lastrowid)
+                        )
+                    imported += 1
+                self.conn.execute("INSERT INTO meta (key, value) VALUES ('migrated_json', ?)",
+                                  (json.dumps({'path': str(json_path), 'records': imported}),))
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.last_seen_index = {row['student_id']: row['ts']
+                                    for row in self.conn.execute('SELECT student_id, ts FROM last_seen')}
+
+        os.replace(json_path, json_path.with_name(json_path.name + '.migrated'))
+        logger.info(f"Imported {imported} attendance records from {json_path}")
+        return imported
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_attendance_store():
+    """Process-wide AttendanceStore on the default database, migrated on first use"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = AttendanceStore()
+            _store.migrate_json()
+        return _store
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Attendance log')
+    parser.add_argument('command', choices=['mark', 'since', 'recent', 'migrate'])
+    parser.add_argument('--db', help='SQLite database (default: attendance.db in the project root)')
+    parser.add_argument('--student-id', help='mark: student to mark')
+    parser.add_argument('--name', help='mark: student name')
+    parser.add_argument('--confidence', type=float, help='mark: recognition confidence')
+    parser.add_argument('--time', dest='time_text', help="mark: displayed time, default now")
+    parser.add_argument('--debounce', type=float, default=DEBOUNCE_SECONDS, help='mark: seconds between marks')
+    parser.add_argument('--cursor', type=int, default=0, help='mark/since: last record id already seen')
+    parser.add_argument('--limit', type=int, default=DEFAULT_PAGE_SIZE, help='since/recent: page size')
+    parser.add_argument('--json', help='migrate: attendance.json to import')
+    args = parser.parse_args()
+
+    store = AttendanceStore(args.db)
+    if args.command == 'migrate':
+        imported = store.migrate_json(args.json)
+        result = {'success': True, 'imported': imported, 'records': store.count()}
+    else:
+        store.migrate_json()
+        if args.command == 'mark':
+            if not args.student_id:
+                print(json.dumps({'success': False, 'message': 'No student id provided'}))
+                sys.exit(1)
+            result = store.mark(args.student_id, args.name, args.confidence, args.debounce,
+                                time_text=args.time_text)
+            records, cursor = store.records_since(args.cursor, args.limit)
+            result = dict(result, success=True, records=records, cursor=cursor)
+        elif args.command == 'since':
+            records, cursor = store.records_since(args.cursor, args.limit)
+            result = {'success': True, 'records': records, 'cursor': cursor}
+        else:
+            records, cursor = store.recent(args.limit)
+            result = {'success': True, 'records': records, 'cursor': cursor}
+    print(json.dumps(result))
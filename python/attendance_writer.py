@@ -0,0 +1,284 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from datetime import date
+
+from logging_setup import setup_logging
+
+try:
+    import pymysql
+except ImportError:  # Only needed to write to the MySQL/MariaDB database
+    pymysql = None
+
+# Configure logging
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Marks are written at most this often, or as soon as MAX_BATCH are waiting
+FLUSH_INTERVAL = 0.5
+MAX_BATCH = 200
+
+COLUMNS = ['studentRegistrationNumber', 'course', 'unit', 'attendanceStatus', 'dateMarked', 'confidence']
+
+# Multi-row upserts against the unique (studentRegistrationNumber, course, unit,
+# dateMarked) key from database/attendance_indexes.sql. Like update_attendance.php,
+# an existing mark only changes while it is 'Absent'; confidence keeps the best score.
+UPSERT_SQL = {
+    'mysql': (
+        "INSERT INTO tblattendance (" + ', '.join(COLUMNS) + ") VALUES {rows} "
+        "ON DUPLICATE KEY UPDATE "
+        "attendanceStatus = IF(attendanceStatus = 'Absent', VALUES(attendanceStatus), attendanceStatus), "
+        "confidence = GREATEST(COALESCE(confidence, VALUES(confidence)), COALESCE(VALUES(confidence), confidence))"
+    ),
+    'sqlite': (
+        "INSERT INTO tblattendance (" + ', '.join(COLUMNS) + ") VALUES {rows} "
+        "ON CONFLICT (studentRegistrationNumber, course, unit, dateMarked) DO UPDATE SET "
+        "attendanceStatus = CASE WHEN tblattendance.attendanceStatus = 'Absent' "
+        "THEN excluded.attendanceStatus ELSE tblattendance.attendanceStatus END, "
+        "confidence = MAX(COALESCE(tblattendance.confidence, excluded.confidence), "
+        "COALESCE(excluded.confidence, tblattendance.confidence))"
+    )
+}
+
+PLACEHOLDERS = {'mysql': '%s', 'sqlite': '?'}
+
+# tblattendance as in database/attendance-db.sql, for SQLite stand-ins
+SQLITE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tblattendance (
+    attendanceID INTEGER PRIMARY KEY AUTOINCREMENT,
+    studentRegistrationNumber TEXT NOT NULL,
+    course TEXT NOT NULL,
+    attendanceStatus TEXT NOT NULL,
+    dateMarked TEXT NOT NULL,
+    unit TEXT NOT NULL,
+    confidence REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_attendance_mark
+    ON tblattendance (studentRegistrationNumber, course, unit, dateMarked);
+CREATE INDEX IF NOT EXISTS idx_attendance_course_unit_date
+    ON tblattendance (course, unit, dateMarked);
+'''
+
+def sqlite_connection(path):
+    """SQLite stand-in for the attendance database, with the tblattendance schema"""
+    conn = sqlite3.connect(str(path), check_same_thread=False)
+    conn.executescript(SQLITE_SCHEMA)
+    return conn
+
+def mysql_connection():
+    """Connection to the MySQL/MariaDB database, configured like database/database_connection.php
+
+    ATTENDANCE_DB_HOST, ATTENDANCE_DB_NAME, ATTENDANCE_DB_USER and
+    ATTENDANCE_DB_PASSWORD override the defaults. None without pymysql.
+    """
+    if pymysql is None:
+        return None
+    return pymysql.connect(
+        host=os.environ.get('ATTENDANCE_DB_HOST', 'localhost'),
+        database=os.environ.get('ATTENDANCE_DB_NAME', 'attendance-db'),
+        user=os.environ.get('ATTENDANCE_DB_USER', 'root'),
+        password=os.environ.get('ATTENDANCE_DB_PASSWORD', ''),
+        autocommit=False
+    )
+
+def has_unique_key(connection):
+    """True if tblattendance has the uq_attendance_mark key the MySQL upserts rely on
+
+    Without it (database/attendance_indexes.sql not applied yet) every upsert
+    would insert a duplicate row.
+    """
+    cursor = connection.cursor()
+    cursor.execute("SHOW INDEX FROM tblattendance WHERE Key_name = 'uq_attendance_mark'")
+    return cursor.fetchone() is not None
+
+class AttendanceWriter:
+    """Collects recognized marks and writes them as batched multi-row upserts
+
+    submit() only touches memory: a mark for a (student, course, unit, day)
+    that is already waiting is merged into it, and one that was already
+    written as 'Present' this session is dropped, so a student seen on
+    every frame costs one row in one statement. A background thread
+    flushes every flush_interval seconds, or right away once max_batch
+    marks are waiting. A failed flush keeps the marks for the next one;
+    with a connect function the connection is replaced after a failure,
+    so a dropped database connection (e.g. MySQL's wait_timeout) recovers.
+    """
+
+    def __init__(self, connection, dialect='sqlite', flush_interval=FLUSH_INTERVAL, max_batch=MAX_BATCH,
+                 background=True, connect=None):
+        if dialect not in UPSERT_SQL:
+            raise ValueError(f"Unknown dialect: {dialect}")
+        self.connection = connection
+        self.connect = connect
+        self.dialect = dialect
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.pending = {}
+        self.written = {}
+        self.lock = threading.Lock()
+        # Serializes flushes, the connection is used by one thread at a time
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.closed = False
+        self.stats = {'submitted': 0, 'deduplicated': 0, 'rows': 0, 'statements': 0, 'errors': 0}
+        self.thread = None
+        if background:
+            self.thread = threading.Thread(target=self._run, name='attendance-writer', daemon=True)
+            self.thread.start()
+
+    def submit(self, student_id, course, unit, status='Present', confidence=None, day=None):
+        """Queue a mark, returns False if it was a repeat that will not reach the database"""
+        key = (str(student_id), str(course), str(unit), str(day or date.today().isoformat()))
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("AttendanceWriter is closed")
+            self.stats['submitted'] += 1
+            written = self.written.get(key)
+            if written == 'Present' or (written is not None and written == status):
+                self.stats['deduplicated'] += 1
+                return False
+            queued = self.pending.get(key)
+            if queued is not None:
+                self.stats['deduplicated'] += 1
+                # Present wins over Absent, the best confidence is kept
+                if queued['status'] != 'Present':
+                    queued['status'] = status
+                if confidence is not None:
+                    queued['confidence'] = max(confidence, queued['confidence'] or confidence)
+                return False
+            self.pending[key] = {'status': status, 'confidence': confidence}
+            full = len(self.pending) >= self.max_batch
+        if full:
+            self.wakeup.set()
+        return True
+
+    def _statement(self, count):
+        placeholder = PLACEHOLDERS[self.dialect]
+        row = '(' + ', '.join([placeholder] * len(COLUMNS)) + ')'
+        return UPSERT_SQL[self.dialect].format(rows=', '.join([row] * count))
+
+    def _requeue(self, batch):
+        """Put unwritten marks back, merged with anything submitted meanwhile"""
+        with self.lock:
+            for key, mark in batch.items():
+                queued = self.pending.get(key)
+                if queued is None:
+                    self.pending[key] = mark
+                    continue
+                if mark['status'] == 'Present':
+                    queued['status'] = 'Present'
+                if mark['confidence'] is not None:
+                    queued['confidence'] = max(mark['confidence'], queued['confidence'] or mark['confidence'])
+
+    def _ensure_connection(self):
+        """Reconnect if the last flush dropped the connection, ping it otherwise"""
+        if self.connection is None:
+            if self.connect is None:
+                raise RuntimeError("Attendance database connection lost")
+            self.connection = self.connect()
+            if self.connection is None:
+                raise RuntimeError("Attendance database not reachable")
+        elif hasattr(self.connection, 'ping'):
+            # pymysql reopens a connection the server closed
+            self.connection.ping(reconnect=True)
+
+    def _drop_connection(self):
+        """Roll back and forget a connection that failed, if it can be replaced"""
+        try:
+            self.connection.rollback()
+        except Exception as e:
+            logger.warning(f"Rollback after a failed attendance write failed: {str(e)}")
+        if self.connect is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+    def flush(self):
+        """Write everything queued so far, returns the number of marks written"""
+        with self.flush_lock:
+            with self.lock:
+                batch, self.pending = self.pending, {}
+            if not batch:
+                return 0
+
+            items = list(batch.items())
+            try:
+                self._ensure_connection()
+                cursor = self.connection.cursor()
+                for start in range(0, len(items), self.max_batch):
+                    chunk = items[start:start + self.max_batch]
+                    params = []
+                    for (student_id, course, unit, day), mark in chunk:
+                        params.extend([student_id, course, unit, mark['status'], day, mark['confidence']])
+                    cursor.execute(self._statement(len(chunk)), params)
+                    self.stats['statements'] += 1
+                self.connection.commit()
+            except Exception as e:
+                # Marks first, nothing below may lose them
+                self._requeue(batch)
+                self.stats['errors'] += 1
+                logger.error(f"Writing {len(items)} attendance marks failed: {str(e)}")
+                if self.connection is not None:
+                    self._drop_connection()
+                return 0
+
+            with self.lock:
+                for key, mark in items:
+                    self.written[key] = mark['status']
+                self.stats['rows'] += len(items)
+            return len(items)
+
+    def _run(self):
+        while not self.closed:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # The thread must outlive any error, or marks pile up unwritten
+                logger.error(f"Attendance writer flush failed: {str(e)}")
+
+    def close(self):
+        """Stop the background thread and write what is left"""
+        with self.lock:
+            self.closed = True
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+
+_writer = None
+_writer_lock = threading.Lock()
+# Set once the database turned out to lack the unique key, so it is not re-checked per mark
+_missing_key = False
+
+def get_attendance_writer():
+    """Process-wide writer to the MySQL/MariaDB database
+
+    None if it can't be reached or lacks the unique key, callers then write
+    the mark themselves (update_attendance.php checks for an existing one).
+    """
+    global _writer, _missing_key
+    with _writer_lock:
+        if _writer is None:
+            if _missing_key:
+                return None
+            try:
+                connection = mysql_connection()
+                if connection is not None and not has_unique_key(connection):
+                    logger.warning("tblattendance has no uq_attendance_mark key, run database/attendance_indexes.sql "
+                                   "and restart the server to batch attendance marks")
+                    _missing_key = True
+                    connection.close()
+                    return None
+            except Exception as e:
+                logger.warning(f"Attendance database not reachable: {str(e)}")
+                return None
+            if connection is None:
+                return None
+            _writer = AttendanceWriter(connection, 'mysql', connect=mysql_connection)
+        return _writer
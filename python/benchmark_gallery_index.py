@@ -0,0 +1,120 @@
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+from lbp_engine import NumpyLBPHRecognizer
+
+# Identities generated per chunk, keeps the float64 temporaries small
+GENERATE_CHUNK = 500
+
+def synthetic_histograms(prototypes, pixels_per_cell, noise, rng):
+    """Sample LBP-like cell histograms around each identity's prototype
+
+    Real LBPH cells hold the pattern counts of a few hundred pixels, so each
+    sample is a multinomial draw from the (noisy) prototype divided by the
+    pixel count, which gives the same sparsity as real histograms.
+    """
+    bins = prototypes.shape[-1]
+    mixed = (1 - noise) * prototypes + noise * rng.dirichlet(np.full(bins, 0.1), size=prototypes.shape[:-1])
+    mixed /= mixed.sum(axis=-1, keepdims=True)
+    counts = rng.multinomial(pixels_per_cell, mixed)
+    return (counts / pixels_per_cell).astype(np.float32).reshape(len(prototypes), -1)
+
+def build_synthetic_gallery(num_ids, samples, grid, pixels_per_cell, noise, num_probes, rng):
+    """Gallery histograms/labels plus probe histograms with their true labels"""
+    cells = grid * grid
+    histograms = []
+    labels = []
+    probe_ids = np.sort(rng.choice(num_ids, min(num_probes, num_ids), replace=False))
+    probes = []
+
+    for start in range(0, num_ids, GENERATE_CHUNK):
+        ids = np.arange(start, min(start + GENERATE_CHUNK, num_ids))
+        prototypes = rng.dirichlet(np.full(256, 0.05), size=(len(ids), cells))
+        for _ in range(samples):
+            histograms.append(synthetic_histograms(prototypes, pixels_per_cell, noise, rng))
+            labels.append(ids)
+        chosen = probe_ids[(probe_ids >= ids[0]) & (probe_ids <= ids[-1])]
+        if len(chosen):
+            probes.append(synthetic_histograms(prototypes[chosen - start], pixels_per_cell, noise, rng))
+
+    return np.vstack(histograms), np.concatenate(labels), np.vstack(probes), probe_ids
+
+def time_search(search, probes):
+    """Run one search per probe, returns (predicted labels, per-probe latencies in ms)"""
+    predictions = []
+    latencies = []
+    for probe in probes:
+        start = time.perf_counter()
+        label, _ = search(probe)
+        latencies.append((time.perf_counter() - start) * 1000)
+        predictions.append(label)
+    return np.array(predictions), np.array(latencies)
+
+def summarize(latencies):
+    return {
+        'mean_ms': round(float(latencies.mean()), 3),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 3)
+    }
+
+def benchmark(sizes, samples, grid, pixels_per_cell, noise, num_probes, nprobe, rerank, seed):
+    rng = np.random.default_rng(seed)
+    results = []
+    for num_ids in sizes:
+        histograms, labels, probes, truth = build_synthetic_gallery(
+            num_ids, samples, grid, pixels_per_cell, noise, num_probes, rng)
+
+        engine = NumpyLBPHRecognizer(grid_x=grid, grid_y=grid)
+        engine.set_gallery(histograms, labels)
+        del histograms
+
+        def exhaustive(probe):
+            return engine.best_match(engine.distances(probe[np.newaxis])[0])
+
+        exact_labels, exact_latency = time_search(exhaustive, probes)
+
+        result = {
+            'identities': num_ids,
+            'gallery_size': len(labels),
+            'probes': len(probes),
+            'exhaustive': dict(summarize(exact_latency),
+                               accuracy=round(float((exact_labels == truth).mean()), 4))
+        }
+
+        # Centroid pruning alone, then with an inverted file of sqrt(identities) lists
+        for mode, n_lists in (('centroids', 0), ('ivf', int(np.sqrt(num_ids)))):
+            start = time.perf_counter()
+            index = engine.build_index(n_lists=n_lists, nprobe=nprobe, rerank=rerank)
+            build_seconds = time.perf_counter() - start
+            indexed_labels, indexed_latency = time_search(lambda probe: index.search(probe[np.newaxis])[0], probes)
+            result[mode] = dict(summarize(indexed_latency),
+                                accuracy=round(float((indexed_labels == truth).mean()), 4),
+                                agreement_with_exhaustive=round(float((indexed_labels == exact_labels).mean()), 4),
+                                build_seconds=round(build_seconds, 3),
+                                lists=n_lists)
+
+        results.append(result)
+        print(json.dumps(result), file=sys.stderr)
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the gallery index on synthetic identities')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000],
+                        help='Numbers of synthetic identities')
+    parser.add_argument('--samples', type=int, default=2, help='Gallery histograms per identity')
+    parser.add_argument('--grid', type=int, default=4,
+                        help='LBPH grid size (the real model uses 8, which needs 4x the memory)')
+    parser.add_argument('--pixels-per-cell', type=int, default=144, help='Pixels counted per histogram cell')
+    parser.add_argument('--noise', type=float, default=0.5, help='Share of each sample drawn away from the prototype')
+    parser.add_argument('--probes', type=int, default=50, help='Probe faces per size')
+    parser.add_argument('--nprobe', type=int, default=16, help='Inverted-file lists opened per search')
+    parser.add_argument('--rerank', type=int, default=8, help='Students re-ranked with the exact distance')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    results = benchmark(args.sizes, args.samples, args.grid, args.pixels_per_cell, args.noise,
+                        args.probes, args.nprobe, args.rerank, args.seed)
+    print(json.dumps(results, indent=2))
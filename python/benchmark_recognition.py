@@ -0,0 +1,188 @@
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+import subprocess
+import numpy as np
+from pathlib import Path
+
+from realtime_recognition import load_recognition_models, recognize_single_image
+from logging_setup import setup_logging
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Configure logging
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Benchmark sets, relative to the project root, with the expected student id
+# (None: taken from the file name, test45_3.jpg -> '45', random7.jpg -> 'Unknown')
+DATASETS = {
+    'test_images': ('test_images', None),
+    'student45': ('tested_faces/student45', '45'),
+    'student99': ('tested_faces/student99', '99'),
+    'random': ('tested_faces/random', 'Unknown')
+}
+
+# Stages in pipeline order, 'change' only runs with a camera session
+STAGES = ['change', 'decode', 'color', 'preprocess', 'detect', 'quality', 'predict']
+
+PERCENTILES = [50, 90, 95, 99]
+
+def expected_student(image_path, default=None):
+    """Student id an image should be recognized as, 'Unknown' for strangers"""
+    name = Path(image_path).name
+    match = re.match(r'test(\d+)_', name)
+    if match:
+        return match.group(1)
+    if name.startswith('random'):
+        return 'Unknown'
+    return default
+
+def dataset_images(base_dir, directory):
+    """Source images of a set; debug_ overlays and face_ crops from earlier runs are skipped"""
+    directory = base_dir / directory
+    if not directory.exists():
+        return []
+    return [path for path in sorted(directory.iterdir())
+            if path.suffix.lower() in ('.jpg', '.jpeg', '.png')
+            and not path.name.startswith(('debug_', 'face_'))]
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, None where unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    if sys.platform == 'darwin':
+        return round(peak / (1024 * 1024), 1)
+    return round(peak / 1024, 1)
+
+def git_commit():
+    """Short hash of the checked out commit, so results can be compared across commits"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def latency_summary(samples):
+    """Percentiles, mean and max of a list of stage latencies, in milliseconds"""
+    if not samples:
+        return {'count': 0}
+    values = np.array(samples) * 1000
+    summary = {'count': len(samples), 'mean_ms': round(float(values.mean()), 3)}
+    for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f'p{p}_ms'] = round(float(value), 3)
+    summary['max_ms'] = round(float(values.max()), 3)
+    return summary
+
+def run_image(image_path, models, timings, session=None):
+    """Recognize one image through recognize_single_image, appending each stage's latency to timings
+
+    The stages are the ones the recognition code times itself (see
+    instrumentation.stage), so the breakdown matches the server's.
+    """
+    result = recognize_single_image(str(image_path), models=models, timings=True, session=session)
+    for name, milliseconds in result.pop('timings', {}).items():
+        timings.setdefault(name, []).append(milliseconds / 1000)
+    return result
+
+def score(records):
+    """Accuracy and false accepts of a list of (expected, result) pairs"""
+    total = len(records)
+    detected = sum(1 for _, result in records if result.get('success'))
+    correct = sum(1 for expected, result in records
+                  if result.get('student_id', 'Unknown') == expected)
+    strangers = [result for expected, result in records if expected == 'Unknown']
+    false_accepts = sum(1 for result in strangers if result.get('student_id', 'Unknown') != 'Unknown')
+    summary = {
+        'images': total,
+        'faces_detected': detected,
+        'correct': correct,
+        'accuracy': round(correct / total, 4) if total else None
+    }
+    if strangers:
+        summary['false_accepts'] = false_accepts
+        summary['false_accept_rate'] = round(false_accepts / len(strangers), 4)
+    return summary
+
+def run_benchmark(datasets=None, backend='opencv', repeat=1, warmup=1, session=None):
+    """Run every image of the selected sets repeat times and return the report dict
+
+    With a session id the images go through the frame-change cache like a
+    camera's frames do, so repeated passes measure cache hits.
+    """
+    base_dir = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    models = load_recognition_models(backend)
+    if models is None:
+        return {'success': False, 'message': 'Required model files not found, train the model first'}
+
+    selected = datasets or list(DATASETS)
+    images = []
+    for name in selected:
+        directory, default = DATASETS[name]
+        for path in dataset_images(base_dir, directory):
+            images.append((name, path, expected_student(path, default)))
+    if not images:
+        return {'success': False, 'message': 'No benchmark images found'}
+
+    # Warm up caches, lazy allocations and the per-thread preprocessor
+    scratch = {}
+    for _, path, _ in images[:warmup]:
+        run_image(path, models, scratch)
+
+    timings = {}
+    totals = []
+    records = {name: [] for name in selected}
+    for _ in range(repeat):
+        for name, path, expected in images:
+            start = time.perf_counter()
+            result = run_image(path, models, timings, session)
+            totals.append(time.perf_counter() - start)
+            records[name].append((expected, result))
+
+    elapsed = sum(totals)
+    every_record = [record for name in selected for record in records[name]]
+    report = {
+        'success': True,
+        'commit': git_commit(),
+        'backend': backend,
+        'repeat': repeat,
+        'images': len(totals),
+        'images_per_second': round(len(totals) / elapsed, 2) if elapsed else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'session': session,
+        'latency': dict({stage: latency_summary(timings[stage])
+                         for stage in STAGES + sorted(set(timings) - set(STAGES)) if stage in timings},
+                        total=latency_summary(totals)),
+        'overall': score(every_record),
+        'datasets': {name: score(records[name]) for name in selected}
+    }
+    return report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark face detection and recognition speed and accuracy')
+    parser.add_argument('--dataset', action='append', dest='datasets', choices=list(DATASETS),
+                        help='Benchmark only this set (repeatable), default all')
+    parser.add_argument('--backend', choices=['opencv', 'numpy', 'indexed'], default='opencv',
+                        help='LBPH implementation to benchmark')
+    parser.add_argument('--repeat', type=int, default=1, help='Passes over the images')
+    parser.add_argument('--warmup', type=int, default=1, help='Untimed images run first')
+    parser.add_argument('--session', help='Send the images as one camera session, through the frame-change cache')
+    parser.add_argument('--output', help='Also write the JSON report to this file')
+    args = parser.parse_args()
+
+    report = run_benchmark(args.datasets, args.backend, max(1, args.repeat), max(0, args.warmup), args.session)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
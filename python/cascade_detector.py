@@ -0,0 +1,201 @@
+import cv2
+import os
+import json
+import math
+import logging
+import threading
+import numpy as np
+
+from logging_setup import setup_logging
+
+# Configure logging
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Smallest face, in pixels of the downscaled image, the cascade is asked to find.
+# The frontal face cascade's window is 24x24, 30 leaves some margin.
+DETECTION_MIN_FACE = 30
+
+# Default smallest expected face as a share of the shorter image side, which
+# sets the detection scale of large frames (FACE_MIN_FACE_RATIO, 0 scans at
+# full resolution). 0.04 scans 1080p frames at 1/1.33 and keeps 640x480 webcam
+# frames at full resolution. On the 82 1080p test images detection is 1.26x
+# faster (55.6 s instead of 70.3 s) and finds all 71 faces of 100px or more the
+# full-resolution scan finds, but only 7 of its 32 smaller ones: resampling the
+# frame changes which windows the cascade accepts.
+DEFAULT_MIN_FACE_RATIO = float(os.environ.get('FACE_MIN_FACE_RATIO', '0.04'))
+
+# Previous boxes are searched in a window this share of the box larger on each side
+HINT_EXPAND = 0.5
+
+# Face sizes searched around a previous box, as a factor either way of its size
+HINT_SIZE_RANGE = 1.5
+
+# A face found around its previous box that overlaps it at least this much keeps
+# the previous box. The window's pixel grid is offset from the frame's, so a
+# face that did not move comes back a few pixels off (IoU of 0.86 or more for
+# 95% of the faces in the test images), while a face that moved a fifth of its
+# width drops below 0.7
+HINT_KEEP_IOU = 0.8
+
+# CascadeClassifier is not safe to share between threads, cache one per thread
+_local = threading.local()
+
+def get_cascade_path():
+    """Path of the bundled frontal face Haar cascade"""
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base_dir, 'assets', 'haarcascade_frontalface_default.xml')
+
+def load_cascade(cascade_path=None):
+    """Load a cascade once per thread and path"""
+    cascade_path = str(cascade_path or get_cascade_path())
+    cascades = getattr(_local, 'cascades', None)
+    if cascades is None:
+        cascades = _local.cascades = {}
+    if cascade_path not in cascades:
+        cascades[cascade_path] = cv2.CascadeClassifier(cascade_path)
+    return cascades[cascade_path]
+
+def detection_scale(image_shape, min_size=(30, 30), min_face_ratio=DEFAULT_MIN_FACE_RATIO, scale_factor=1.1):
+    """Downscale factor so the smallest expected face still spans DETECTION_MIN_FACE pixels
+
+    The expected smallest face is min_size, or min_face_ratio of the shorter
+    image side if that is larger (None or 0 scales by min_size alone). The
+    factor is a whole level of the detector's own scale_factor pyramid, so
+    the window sizes tried on the small image are the same face sizes the
+    full-resolution scan would try and the boxes (and the crops LBPH sees) do
+    not shift in size.
+    """
+    expected = max(min(min_size), (min_face_ratio or 0) * min(image_shape[:2]))
+    if expected <= DETECTION_MIN_FACE:
+        return 1.0
+    level = math.floor(math.log(expected / DETECTION_MIN_FACE) / math.log(scale_factor))
+    return scale_factor ** level
+
+def detect_faces_scaled(gray, face_cascade, scaleFactor=1.1, minNeighbors=4, minSize=(30, 30),
+                        maxSize=(400, 400), min_face_ratio=DEFAULT_MIN_FACE_RATIO):
+    """Run the cascade on a downscaled copy of gray, boxes are in gray's coordinates
+
+    Takes the same parameters as detectMultiScale (sizes in full-resolution
+    pixels). Crop faces from the full-resolution image with the returned
+    boxes so recognition quality does not depend on the detection scale.
+    """
+    scale = detection_scale(gray.shape, minSize, min_face_ratio, scaleFactor)
+    if scale == 1.0:
+        small = gray
+    else:
+        small = cv2.resize(gray, (max(1, round(gray.shape[1] / scale)), max(1, round(gray.shape[0] / scale))),
+                           interpolation=cv2.INTER_AREA)
+        # Actual factors after rounding the size
+        scale = gray.shape[1] / small.shape[1]
+
+    min_side = max(1, math.ceil(min(minSize) / scale))
+    kwargs = {'minSize': (min_side, min_side)}
+    if maxSize and scale == 1.0:
+        kwargs['maxSize'] = tuple(maxSize)
+    elif maxSize:
+        # Rounded up and one pyramid step larger, so faces near maxSize are not cut off
+        kwargs['maxSize'] = (math.ceil(maxSize[0] / scale * scaleFactor), math.ceil(maxSize[1] / scale * scaleFactor))
+
+    faces = face_cascade.detectMultiScale(small, scaleFactor=scaleFactor, minNeighbors=minNeighbors, **kwargs)
+    if len(faces) == 0 or scale == 1.0:
+        return np.asarray(faces, dtype=np.int32).reshape(-1, 4)
+
+    # Map back to full resolution and keep the boxes inside the image
+    boxes = np.round(np.asarray(faces, dtype=np.float64) * scale).astype(np.int32)
+    height, width = gray.shape[:2]
+    boxes[:, 0] = np.clip(boxes[:, 0], 0, width - 1)
+    boxes[:, 1] = np.clip(boxes[:, 1], 0, height - 1)
+    boxes[:, 2] = np.minimum(boxes[:, 2], width - boxes[:, 0])
+    boxes[:, 3] = np.minimum(boxes[:, 3], height - boxes[:, 1])
+    return boxes
+
+def box_iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = min(ax + aw, bx + bw) - max(ax, bx)
+    ih = min(ay + ah, by + bh) - max(ay, by)
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    return inter / float(aw * ah + bw * bh - inter)
+
+def parse_face_boxes(faces):
+    """(x, y, w, h) tuples from a JSON string or list of face dicts/boxes
+
+    Accepts the 'faces' list detect_faces returns, a single face_location
+    dict or plain [x, y, w, h] lists. Coordinates may be floats (the browser
+    smooths them).
+    """
+    if not faces:
+        return []
+    if isinstance(faces, (str, bytes)):
+        faces = json.loads(faces)
+    if isinstance(faces, dict):
+        faces = [faces]
+
+    boxes = []
+    for face in faces:
+        if isinstance(face, dict):
+            face = (face['x'], face['y'], face['width'], face['height'])
+        x, y, w, h = (int(round(float(v))) for v in face)
+        if w > 0 and h > 0:
+            boxes.append((x, y, w, h))
+    return boxes
+
+def detect_faces_hinted(gray, face_cascade, prev_faces, scaleFactor=1.1, minNeighbors=4, minSize=(30, 30),
+                        maxSize=(400, 400), min_face_ratio=DEFAULT_MIN_FACE_RATIO):
+    """Look for each face near its previous box first, scan the whole frame on a miss
+
+    Every previous box is searched in a window HINT_EXPAND larger on each
+    side, for faces within HINT_SIZE_RANGE of its size. If any previous face
+    is not found there (it moved too far or left), the full-frame
+    detect_faces_scaled result is returned instead. A face that has not
+    moved keeps its previous box (HINT_KEEP_IOU). Faces that just entered
+    the frame are only found by a full scan, so callers should drop the hint
+    now and then.
+
+    Returns (boxes, hinted) where hinted is False if the full scan ran.
+    """
+    height, width = gray.shape[:2]
+    boxes = []
+    for (x, y, w, h) in parse_face_boxes(prev_faces):
+        margin_x, margin_y = int(w * HINT_EXPAND), int(h * HINT_EXPAND)
+        x0, y0 = max(0, x - margin_x), max(0, y - margin_y)
+        x1, y1 = min(width, x + w + margin_x), min(height, y + h + margin_y)
+
+        min_side = max(min(minSize), int(min(w, h) / HINT_SIZE_RANGE))
+        max_side = min(x1 - x0, y1 - y0, int(max(w, h) * HINT_SIZE_RANGE))
+        if maxSize:
+            max_side = min(max_side, min(maxSize))
+        if min_side > max_side:
+            boxes = None
+            break
+
+        # At full resolution: a downscaled window returns slightly larger boxes
+        found = face_cascade.detectMultiScale(gray[y0:y1, x0:x1], scaleFactor=scaleFactor,
+                                              minNeighbors=minNeighbors, minSize=(min_side, min_side),
+                                              maxSize=(max_side, max_side))
+        if len(found) == 0:
+            boxes = None
+            break
+
+        # The candidate closest to where the face was
+        cx, cy = x + w / 2, y + h / 2
+        fx, fy, fw, fh = min(found, key=lambda f: abs(x0 + f[0] + f[2] / 2 - cx) + abs(y0 + f[1] + f[3] / 2 - cy))
+        box = (x0 + int(fx), y0 + int(fy), int(fw), int(fh))
+        # Keeps a still face's box from drifting as each box becomes the next hint
+        if box_iou(box, (x, y, w, h)) >= HINT_KEEP_IOU:
+            box = (x, y, w, h)
+
+        # Overlapping hints can land on the same face
+        if not any(box_iou(box, other) > 0.5 for other in boxes):
+            boxes.append(box)
+
+    if boxes:
+        return np.array(boxes, dtype=np.int32), True
+
+    faces = detect_faces_scaled(gray, face_cascade, scaleFactor=scaleFactor, minNeighbors=minNeighbors,
+                                minSize=minSize, maxSize=maxSize, min_face_ratio=min_face_ratio)
+    return faces, False
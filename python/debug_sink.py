@@ -0,0 +1,128 @@
+import os
+import cv2
+import queue
+import atexit
+import logging
+import threading
+from multiprocessing import util as mp_util
+
+from logging_setup import setup_logging
+
+# Configure logging
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Debug images are off unless FACE_DEBUG_IMAGES is set: 1 writes every one,
+# N writes one in N per kind of image
+DEBUG_ENV = 'FACE_DEBUG_IMAGES'
+
+# Images waiting for the writer thread, more are dropped instead of blocking
+DEFAULT_QUEUE_SIZE = 16
+
+class DebugSink:
+    """Writes debug JPEGs on a background thread, off the request path
+
+    Callers ask wants(kind) first and only draw the annotated copy when it
+    returns True, so a disabled sink costs one attribute check. Submitted
+    images go into a bounded queue; when the writer falls behind new images
+    are dropped, never waited for. The image must not be modified after it
+    is submitted.
+    """
+
+    def __init__(self, sample_every=0, queue_size=DEFAULT_QUEUE_SIZE):
+        # 0 disables the sink
+        self.sample_every = max(0, int(sample_every))
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.counters = {}
+        self.written = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.thread = None
+        self.closed = False
+
+    @property
+    def enabled(self):
+        return self.sample_every > 0
+
+    def wants(self, kind='default'):
+        """True if the next image of this kind should be written (1 in sample_every)"""
+        if not self.sample_every:
+            return False
+        with self.lock:
+            count = self.counters.get(kind, 0)
+            self.counters[kind] = count + 1
+        return count % self.sample_every == 0
+
+    def submit(self, path, image):
+        """Queue an image for writing, returns False if it was dropped"""
+        if not self.sample_every or self.closed:
+            return False
+        self._start()
+        try:
+            self.queue.put_nowait((str(path), image))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _start(self):
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='debug-sink', daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            path, image = item
+            try:
+                if cv2.imwrite(path, image):
+                    self.written += 1
+                else:
+                    logger.warning(f"Could not write debug image {path}")
+            except Exception as e:
+                logger.warning(f"Could not write debug image {path}: {str(e)}")
+
+    def close(self):
+        """Write what is queued and stop the writer thread"""
+        if self.closed:
+            return
+        self.closed = True
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            if self.dropped:
+                logger.info(f"Debug images: {self.written} written, {self.dropped} dropped")
+
+_sink = None
+_sink_pid = None
+
+def _sample_from_env():
+    try:
+        return int(os.environ.get(DEBUG_ENV, '0') or 0)
+    except ValueError:
+        return 1
+
+def get_debug_sink():
+    """This process's DebugSink, configured from FACE_DEBUG_IMAGES"""
+    global _sink, _sink_pid
+    if _sink is None or _sink_pid != os.getpid():
+        _sink = DebugSink(_sample_from_env())
+        _sink_pid = os.getpid()
+        # atexit does not run in multiprocessing workers, their finalizers do
+        atexit.register(_sink.close)
+        mp_util.Finalize(_sink, _sink.close, exitpriority=10)
+    return _sink
+
+def configure_debug_images(sample_every):
+    """Turn debug images on (1 in sample_every) or off (0) for this process and its children"""
+    global _sink
+    os.environ[DEBUG_ENV] = str(int(sample_every))
+    if _sink is not None and _sink_pid == os.getpid():
+        _sink.close()
+    _sink = None
+    return get_debug_sink()
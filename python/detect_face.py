@@ -4,19 +4,92 @@ import os
 import sys
 import json
 import logging
+import argparse
+
+from cascade_detector import detect_faces_hinted, get_cascade_path
+from face_preprocessing import load_image
+import frame_change
+import instrumentation
+from instrumentation import stage, collect_timings, count_result, write_prometheus
+from logging_setup import setup_logging
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+setup_logging()
+logger = logging.getLogger(__name__)
+
+def load_face_cascade():
+    """Load the Haar cascade used for detection"""
+    return cv2.CascadeClassifier(get_cascade_path())
 
-def detect_faces(image_path):
-    """Simple face detection using Haar Cascade"""
+def find_faces(img, face_cascade, prev_faces=None):
+    """Detect faces in an already loaded image
+    
+    prev_faces (the faces of the previous frame) are searched first, see
+    cascade_detector.detect_faces_hinted.
+    """
+    # Convert to grayscale
+    with stage('color'):
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    
+    # Detect faces around the previous ones or on a downscaled copy,
+    # boxes come back in full-resolution pixels
+    with stage('detect'):
+        faces, _ = detect_faces_hinted(
+            gray,
+            face_cascade,
+            prev_faces,
+            scaleFactor=1.1,
+            minNeighbors=3,
+            minSize=(30, 30),
+            maxSize=(300, 300)
+        )
+    
+    if len(faces) == 0:
+        return {
+            'success': False,
+            'message': 'No face detected'
+        }
+    
+    # Convert faces to list of dictionaries
+    faces_list = []
+    for (x, y, w, h) in faces:
+        faces_list.append({
+            'x': int(x),
+            'y': int(y),
+            'width': int(w),
+            'height': int(h)
+        })
+    
+    return {
+        'success': True,
+        'message': 'Face(s) detected successfully',
+        'faces': faces_list
+    }
+
+def detect_faces(image_path, face_cascade=None, prev_faces=None, timings=False, session=None):
+    """Simple face detection using Haar Cascade
+    
+    image_path can also be the encoded JPEG/PNG bytes, decoded in memory.
+    With timings=True the result includes a per-stage breakdown in milliseconds.
+    With a session id, an unchanged scene returns that session's last result.
+    """
+    if timings:
+        with collect_timings() as stage_timings:
+            result = detect_faces(image_path, face_cascade, prev_faces, session=session)
+        result['timings'] = stage_timings
+        return result
+    
+    if session:
+        with stage('change'):
+            cached, signature = frame_change.cached_result('detect', session, image_path)
+        if cached is not None:
+            count_result('detect', cached)
+            return cached
+    
     try:
-        # Get the cascade file path
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        cascade_path = os.path.join(base_dir, 'assets/haarcascade_frontalface_default.xml')
-        
         # Load the cascade
-        face_cascade = cv2.CascadeClassifier(cascade_path)
+        if face_cascade is None:
+            face_cascade = load_face_cascade()
         if face_cascade.empty():
             return {
                 'success': False,
@@ -24,61 +97,54 @@ def detect_faces(image_path):
             }
         
         # Read the image
-        img = cv2.imread(image_path)
+        with stage('decode'):
+            img = load_image(image_path)
         if img is None:
-            return {
+            result = {
                 'success': False,
                 'message': 'Failed to load image'
             }
-        
-        # Convert to grayscale
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        # Detect faces
-        faces = face_cascade.detectMultiScale(
-            gray,
-            scaleFactor=1.1,
-            minNeighbors=3,
-            minSize=(30, 30),
-            maxSize=(300, 300)
-        )
-        
-        if len(faces) == 0:
-            return {
-                'success': False,
-                'message': 'No face detected'
-            }
-        
-        # Convert faces to list of dictionaries
-        faces_list = []
-        for (x, y, w, h) in faces:
-            faces_list.append({
-                'x': int(x),
-                'y': int(y),
-                'width': int(w),
-                'height': int(h)
-            })
-        
-        return {
-            'success': True,
-            'message': 'Face(s) detected successfully',
-            'faces': faces_list
-        }
+        else:
+            result = find_faces(img, face_cascade, prev_faces)
+            if session:
+                frame_change.remember('detect', session, signature, result)
         
     except Exception as e:
-        logging.error(f"Error in face detection: {str(e)}")
-        return {
+        logger.error(f"Error in face detection: {str(e)}")
+        result = {
             'success': False,
             'message': str(e)
         }
+    count_result('detect', result)
+    return result
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
+    parser = argparse.ArgumentParser(description='Detect faces in an image')
+    parser.add_argument('image_path', nargs='?', help='Path to image')
+    parser.add_argument('--prev-faces', metavar='JSON',
+                        help="Faces found in the previous frame, e.g. the last response's 'faces' list")
+    parser.add_argument('--timings', action='store_true', help='Add per-stage timings (ms) to the result')
+    parser.add_argument('--stdin', action='store_true',
+                        help='Detect faces in the JPEG/PNG bytes read from stdin instead of image_path')
+    parser.add_argument('--metrics-file', metavar='PATH',
+                        help='Write the stage histograms of this run as a Prometheus textfile')
+    args = parser.parse_args()
+    if args.metrics_file:
+        instrumentation.enable()
+    
+    if not args.image_path and not args.stdin:
         print(json.dumps({
             'success': False,
             'message': 'No image path provided'
         }))
         sys.exit(1)
         
-    result = detect_faces(sys.argv[1])
-    print(json.dumps(result)) 
\ No newline at end of file
+    # With --stdin the image never touches the disk
+    image = sys.stdin.buffer.read() if args.stdin else args.image_path
+    result = detect_faces(image, prev_faces=args.prev_faces, timings=args.timings)
+    with stage('serialize'):
+        output = json.dumps(result)
+    print(output)
+    
+    if args.metrics_file:
+        write_prometheus(args.metrics_file) 
\ No newline at end of file
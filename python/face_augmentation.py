@@ -0,0 +1,75 @@
+import cv2
+import logging
+import numpy as np
+
+from face_preprocessing import rotation_matrix
+from logging_setup import setup_logging
+
+# Configure logging
+setup_logging()
+logger = logging.getLogger(__name__)
+
+class FaceAugmenter:
+    """A fixed set of flips, rotations and scalings applied to stacks of faces
+
+    The affine matrices are built once when the augmenter is created, and
+    apply() writes every variant of every face straight into one
+    preallocated (N, variants, H, W) array. Variants are ordered original,
+    flip, rotations, scales, so variant 0 is always the input face when
+    include_original is set.
+    """
+
+    def __init__(self, size=(100, 100), flip=False, rotations=(), scales=(), include_original=True):
+        self.size = tuple(size)
+        self.flip = flip
+        self.rotations = [float(angle) for angle in rotations]
+        self.scales = [float(scale) for scale in scales]
+        self.include_original = include_original
+
+        width, height = self.size
+        self.transforms = []
+        if include_original:
+            self.transforms.append(('original', None))
+        if flip:
+            self.transforms.append(('flip', None))
+        for angle in self.rotations:
+            self.transforms.append((f'rotate{angle:+g}', rotation_matrix(angle, self.size)))
+        for scale in self.scales:
+            self.transforms.append((f'scale{scale:g}', cv2.getRotationMatrix2D((width / 2, height / 2), 0, scale)))
+
+    @property
+    def names(self):
+        return [name for name, _ in self.transforms]
+
+    @property
+    def num_variants(self):
+        return len(self.transforms)
+
+    def config(self):
+        """Settings that change the output, for cache keys"""
+        return {
+            'size': list(self.size),
+            'flip': self.flip,
+            'rotations': self.rotations,
+            'scales': self.scales,
+            'include_original': self.include_original
+        }
+
+    def apply(self, faces, out=None):
+        """(N, variants, H, W) array with every variant of every face in a (N, H, W) stack"""
+        faces = np.asarray(faces, dtype=np.uint8)
+        if out is None:
+            out = np.empty((len(faces), self.num_variants) + self.size[::-1], dtype=np.uint8)
+        for v, (name, matrix) in enumerate(self.transforms):
+            for i, face in enumerate(faces):
+                if name == 'original':
+                    out[i, v] = face
+                elif name == 'flip':
+                    cv2.flip(face, 1, dst=out[i, v])
+                else:
+                    cv2.warpAffine(face, matrix, self.size, dst=out[i, v])
+        return out
+
+    def apply_one(self, face):
+        """(variants, H, W) stack of one face's variants"""
+        return self.apply(face[np.newaxis])[0]
@@ -0,0 +1,114 @@
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+from pathlib import Path
+
+from logging_setup import setup_logging
+
+# Configure logging
+setup_logging()
+logger = logging.getLogger(__name__)
+
+def get_cache_dir():
+    """Default location of the preprocessed face cache"""
+    base_dir = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return base_dir / 'models' / 'face_cache'
+
+def file_hash(path):
+    """SHA-1 of the file contents"""
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+class FaceCache:
+    """On-disk cache of preprocessed 100x100 faces and their detection boxes
+
+    Entries are keyed by the image content hash plus the preprocessing
+    parameters, so changing either invalidates them. Each student is stored as
+    one .npz shard under <cache_dir>/<pipeline>/. A box of (-1, -1, -1, -1)
+    records an image where no usable face was found, so it isn't re-detected.
+    """
+
+    def __init__(self, pipeline, params, cache_dir=None, face_size=(100, 100)):
+        self.dir = Path(cache_dir or get_cache_dir()) / pipeline
+        self.params_digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+        self.face_size = face_size
+        self.shards = {}
+        self.used = {}
+        self.dirty = set()
+        self.hits = 0
+        self.misses = 0
+
+    def _shard_path(self, student):
+        return self.dir / f'{student}.npz'
+
+    def _load_shard(self, student):
+        if student in self.shards:
+            return self.shards[student]
+
+        entries = {}
+        shard_path = self._shard_path(student)
+        if shard_path.exists():
+            try:
+                with np.load(shard_path) as data:
+                    for key, face, box in zip(data['keys'], data['faces'], data['boxes']):
+                        entries[str(key)] = (face, box)
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable cache shard {shard_path}: {str(e)}")
+        self.shards[student] = entries
+        self.used[student] = set()
+        return entries
+
+    def key_for(self, img_path):
+        """Cache key for an image under the current parameters"""
+        return hashlib.sha1(f'{file_hash(img_path)}:{self.params_digest}'.encode('utf-8')).hexdigest()
+
+    def lookup(self, student, img_path):
+        """Return (key, face, box); face is None on a miss or a cached rejection"""
+        entries = self._load_shard(student)
+        key = self.key_for(img_path)
+        self.used[student].add(key)
+        if key not in entries:
+            self.misses += 1
+            return key, None, None
+
+        self.hits += 1
+        face, box = entries[key]
+        if box[0] < 0:
+            return key, None, box
+        return key, face, box
+
+    def store(self, student, key, face, box):
+        """Add an entry, pass face=None to record that no usable face was found"""
+        entries = self._load_shard(student)
+        if face is None:
+            face = np.zeros(self.face_size, dtype=np.uint8)
+            box = (-1, -1, -1, -1)
+        entries[key] = (np.asarray(face, dtype=np.uint8), np.asarray(box, dtype=np.int32))
+        self.used[student].add(key)
+        self.dirty.add(student)
+
+    def save(self):
+        """Write changed shards, dropping entries for images that weren't seen this run"""
+        self.dir.mkdir(parents=True, exist_ok=True)
+        for student, entries in self.shards.items():
+            stale = set(entries) - self.used[student]
+            if not stale and student not in self.dirty:
+                continue
+            for key in stale:
+                del entries[key]
+
+            keys = sorted(entries)
+            faces = np.zeros((len(keys),) + tuple(self.face_size), dtype=np.uint8)
+            boxes = np.zeros((len(keys), 4), dtype=np.int32)
+            for i, key in enumerate(keys):
+                faces[i], boxes[i] = entries[key]
+
+            # Write to a temporary file first so a crash never leaves a torn shard
+            tmp_path = self.dir / f'{student}.tmp.npz'
+            np.savez(tmp_path, keys=np.array(keys), faces=faces, boxes=boxes)
+            os.replace(tmp_path, self._shard_path(student))
+
+        self.dirty.clear()
+        logger.info(f"Face cache: {self.hits} hits, {self.misses} misses")
@@ -4,6 +4,8 @@ import os
 import sys
 import json
 
+from cascade_detector import detect_faces_scaled, load_cascade
+
 def detect_faces(image_path):
     try:
         # Load the image
@@ -18,13 +20,14 @@ def detect_faces(image_path):
         gray = cv2.equalizeHist(gray)
 
         # Load face detection cascade
-        face_cascade = cv2.CascadeClassifier('haarcascade_frontalface_default.xml')
+        face_cascade = load_cascade()
         if face_cascade.empty():
             return {'success': False, 'message': 'Failed to load face detection model'}
 
         # Detect faces with optimized parameters
-        faces = face_cascade.detectMultiScale(
+        faces = detect_faces_scaled(
             gray,
+            face_cascade,
             scaleFactor=1.1,  # Reduced from 1.05 for better detection
             minNeighbors=4,   # Increased from 3 for better accuracy
             minSize=(30, 30),
@@ -0,0 +1,149 @@
+import cv2
+import logging
+import threading
+import numpy as np
+from functools import lru_cache
+
+from logging_setup import setup_logging
+
+# Configure logging
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Settings of each preprocessing pipeline in the project
+PIPELINES = {
+    # realtime_recognition: equalized frame for detection, crop, resize, equalize the face
+    'lbph': {'frame_contrast': 'equalize', 'face_equalize': True},
+    # face_recognition_with_existing_detection: CLAHE on the face image, resize, min-max stretch
+    'clahe': {'frame_contrast': 'clahe', 'face_normalize': True},
+    # train_test_lbph: equalize, blur and stretch the frame, then detect, crop and resize
+    'students': {'frame_contrast': 'equalize', 'frame_blur': 5, 'frame_normalize': True}
+}
+
+# Preprocessors are stateful (buffers, CLAHE), keep one per thread and pipeline
+_local = threading.local()
+
+def load_image(source):
+    """BGR image from a file path or from encoded (JPEG/PNG) bytes, None if unreadable
+
+    Bytes are decoded in memory with cv2.imdecode, so images handed over on
+    stdin or in a request body never touch the disk.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        if len(source) == 0:
+            return None
+        return cv2.imdecode(np.frombuffer(source, dtype=np.uint8), cv2.IMREAD_COLOR)
+    return cv2.imread(str(source))
+
+@lru_cache(maxsize=64)
+def rotation_matrix(angle, size=(100, 100)):
+    """Affine matrix rotating a size=(width, height) image about its centre"""
+    width, height = size
+    return cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1)
+
+class FacePreprocessor:
+    """Grayscale, contrast, crop, resize and normalize faces into reused buffers
+
+    The frame stage (grayscale conversion, equalizeHist or CLAHE, blur,
+    min-max stretch) writes into buffers kept per image shape, so the array
+    returned by gray()/frame() is only valid until the next call on the same
+    preprocessor. The face stage resizes each crop straight into its slot of
+    the output stack and equalizes/normalizes it in place, so a face costs no
+    temporaries beyond the output it is written to.
+    """
+
+    def __init__(self, size=(100, 100), frame_contrast=None, clip_limit=2.0, tile_grid=8,
+                 frame_blur=0, frame_normalize=False, face_equalize=False, face_normalize=False):
+        if frame_contrast not in (None, 'equalize', 'clahe'):
+            raise ValueError(f"Unknown contrast step: {frame_contrast}")
+        self.size = tuple(size)
+        self.frame_contrast = frame_contrast
+        self.frame_blur = frame_blur
+        self.frame_normalize = frame_normalize
+        self.face_equalize = face_equalize
+        self.face_normalize = face_normalize
+        self.clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(tile_grid, tile_grid)) \
+            if frame_contrast == 'clahe' else None
+        self.buffers = {}
+
+    def _buffer(self, name, shape):
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape != shape:
+            buffer = self.buffers[name] = np.empty(shape, dtype=np.uint8)
+        return buffer
+
+    def gray(self, image, out=None):
+        """Grayscale version of image (returned as is when already gray)"""
+        if image.ndim == 2:
+            return image
+        if out is None:
+            out = self._buffer('gray', image.shape[:2])
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=out)
+
+    def frame(self, image, out=None):
+        """Grayscale frame with the contrast, blur and normalize steps applied"""
+        gray = self.gray(image)
+        if not (self.frame_contrast or self.frame_blur or self.frame_normalize):
+            if out is None:
+                return gray
+            np.copyto(out, gray)
+            return out
+
+        # The first step reads the input, the rest work in place on the output
+        if out is None:
+            out = self._buffer('frame', gray.shape)
+        src = gray
+        if self.frame_contrast == 'equalize':
+            cv2.equalizeHist(src, dst=out)
+            src = out
+        elif self.frame_contrast == 'clahe':
+            self.clahe.apply(src, dst=out)
+            src = out
+        if self.frame_blur:
+            cv2.GaussianBlur(src, (self.frame_blur, self.frame_blur), 0, dst=out)
+            src = out
+        if self.frame_normalize:
+            cv2.normalize(src, out, 0, 255, cv2.NORM_MINMAX)
+        return out
+
+    def face(self, frame, box=None, out=None):
+        """One preprocessed face from a frame() result, box=None uses the whole frame"""
+        if out is None:
+            out = np.empty(self.size[::-1], dtype=np.uint8)
+        if box is None:
+            roi = frame
+        else:
+            x, y, w, h = (int(v) for v in box)
+            roi = frame[y:y+h, x:x+w]
+
+        cv2.resize(roi, self.size, dst=out)
+        if self.face_equalize:
+            cv2.equalizeHist(out, dst=out)
+        if self.face_normalize:
+            cv2.normalize(out, out, 0, 255, cv2.NORM_MINMAX)
+        return out
+
+    def faces(self, frame, boxes, out=None):
+        """(N, height, width) stack of preprocessed faces for every box"""
+        if out is None:
+            out = np.empty((len(boxes),) + self.size[::-1], dtype=np.uint8)
+        for i, box in enumerate(boxes):
+            self.face(frame, box, out=out[i])
+        return out
+
+    def rotate(self, face, angle, out=None):
+        """Rotate a face about its centre with a cached matrix"""
+        height, width = face.shape[:2]
+        if out is None:
+            out = np.empty_like(face)
+        return cv2.warpAffine(face, rotation_matrix(angle, (width, height)), (width, height), dst=out)
+
+def get_preprocessor(pipeline='lbph', size=(100, 100)):
+    """This thread's FacePreprocessor for one of PIPELINES"""
+    preprocessors = getattr(_local, 'preprocessors', None)
+    if preprocessors is None:
+        preprocessors = _local.preprocessors = {}
+    key = (pipeline, tuple(size))
+    if key not in preprocessors:
+        preprocessors[key] = FacePreprocessor(size=size, **PIPELINES[pipeline])
+    return preprocessors[key]
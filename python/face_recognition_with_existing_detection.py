@@ -1,33 +1,78 @@
 import cv2
 import numpy as np
 import os
-import sys
 import json
 import pickle
+import argparse
 import logging
 from pathlib import Path
 
+from face_augmentation import FaceAugmenter
+from debug_sink import get_debug_sink
+from face_cache import FaceCache
+from lbp_engine import NumpyLBPHRecognizer
+from face_preprocessing import get_preprocessor
+from model_store import binary_model_dir, load_binary_model, save_binary_model, export_opencv_model, is_stale
+from tta_policy import TTAPolicy, DEFAULT_EARLY_EXIT_DISTANCE
+from logging_setup import setup_logging
+
 # Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Preprocessing settings, part of the face cache key
+CACHE_PARAMS = {
+    'detector': None,
+    'size': 100,
+    'preprocess': 'clahe',
+    'clipLimit': 2.0,
+    'tileGridSize': 8,
+    'normalize': 'minmax'
+}
+
+# Slightly rotated copies added to the training set
+AUGMENTER = FaceAugmenter(rotations=[-5, 5])
+
+# Test-time augmentation counts, appended per process and summed by --tta-report
+TTA_STATS_PATH = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) / 'models' / 'tta_stats.jsonl'
+
+# Rotated probes scored at recognition time when the plain face is not a clear match
+TTA_VARIANTS = 'rotate-5,rotate+5'
+TTA_POLICY = TTAPolicy.from_spec(TTA_VARIANTS, stats_path=TTA_STATS_PATH)
+
+# (model mtime, labels mtime) -> (recognizer, labels_reverse), the model is loaded once per change
+_loaded_model = {}
 
 def preprocess_face(image, target_size=(100, 100)):
-    """Preprocess the already detected face for recognition"""
-    if len(image.shape) > 2:
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    else:
-        gray = image.copy()
-    
-    # Apply CLAHE for better contrast
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-    gray = clahe.apply(gray)
-    
-    # Resize to standard size
-    gray = cv2.resize(gray, target_size)
-    
-    # Normalize the image
-    gray = cv2.normalize(gray, None, 0, 255, cv2.NORM_MINMAX)
-    
-    return gray
+    """Preprocess the already detected face for recognition (CLAHE, resize, normalize)"""
+    preprocessor = get_preprocessor('clahe', target_size)
+    return preprocessor.face(preprocessor.frame(image))
+
+def load_model(model_path, labels_path):
+    """(NumpyLBPHRecognizer, labels_reverse), reloaded only when the model files change
+
+    Uses the memory-mapped binary copy of the model when it is up to date,
+    otherwise reads the YAML model and writes the binary copy for next time.
+    """
+    key = (os.path.getmtime(model_path), os.path.getmtime(labels_path))
+    if key not in _loaded_model:
+        binary_dir = binary_model_dir(model_path)
+        loaded = None if is_stale(binary_dir, model_path) else load_binary_model(binary_dir)
+        if loaded is not None:
+            recognizer, labels_dict = loaded
+        else:
+            # Load LBPH model into the NumPy engine so the extra test variants are scored in one pass
+            recognizer = NumpyLBPHRecognizer()
+            recognizer.read(str(model_path))
+            with open(labels_path, 'rb') as f:
+                labels_dict = pickle.load(f)
+            try:
+                save_binary_model(recognizer, labels_dict, binary_dir, source=model_path)
+            except OSError as e:
+                logger.warning(f"Could not write the binary model copy: {str(e)}")
+        _loaded_model.clear()
+        _loaded_model[key] = (recognizer, {v: k for k, v in labels_dict.items()})
+    return _loaded_model[key]
 
 def train_lbph_model():
     """Train LBPH model using validated face images"""
@@ -61,8 +106,11 @@ def train_lbph_model():
         labels = {}
         next_label = 0
         
+        # Preprocessed faces from previous runs
+        cache = FaceCache('clahe', CACHE_PARAMS)
+        
         # Process each student directory
-        logging.info("Starting to process validated face images...")
+        logger.info("Starting to process validated face images...")
         
         for student_dir in validated_dir.iterdir():
             if not student_dir.is_dir():
@@ -74,7 +122,7 @@ def train_lbph_model():
                 next_label += 1
             
             label = labels[student_id]
-            logging.info(f"Processing student {student_id} with label {label}")
+            logger.info(f"Processing student {student_id} with label {label}")
             
             # Process each face image (these are validated faces)
             face_count = 0
@@ -83,44 +131,50 @@ def train_lbph_model():
                 if img_path.name.startswith('debug_'):
                     continue
                     
-                logging.info(f"Processing image: {img_path}")
-                
-                # Read image
-                img = cv2.imread(str(img_path))
-                if img is None:
-                    logging.warning(f"Failed to load image: {img_path}")
-                    continue
+                logger.debug(f"Processing image: {img_path}")
                 
-                # Preprocess face
-                processed_face = preprocess_face(img)
+                # Reuse the preprocessed face if the image hasn't changed
+                key, processed_face, _ = cache.lookup(student_id, img_path)
+                if processed_face is None:
+                    # Read image
+                    img = cv2.imread(str(img_path))
+                    if img is None:
+                        logger.warning(f"Failed to load image: {img_path}")
+                        continue
+                    
+                    # Preprocess face
+                    processed_face = preprocess_face(img)
+                    h, w = img.shape[:2]
+                    cache.store(student_id, key, processed_face, (0, 0, w, h))
                 
-                # Add to training data
+                # Add to training data, augmented in one batch below
                 face_images.append(processed_face)
                 face_labels.append(label)
                 
-                # Add slightly rotated versions for better training
-                for angle in [-5, 5]:
-                    rows, cols = processed_face.shape
-                    M = cv2.getRotationMatrix2D((cols/2, rows/2), angle, 1)
-                    rotated = cv2.warpAffine(processed_face, M, (cols, rows))
-                    face_images.append(rotated)
-                    face_labels.append(label)
-                
                 face_count += 1
             
-            logging.info(f"Processed {face_count} faces for student {student_id}")
+            logger.info(f"Processed {face_count} faces for student {student_id}")
+        
+        cache.save()
         
         if not face_images:
             return {'success': False, 'message': 'No valid face images found for training'}
         
+        # Add slightly rotated versions for better training
+        augmented = AUGMENTER.apply(np.stack(face_images))
+        face_images = list(augmented.reshape((-1,) + augmented.shape[2:]))
+        face_labels = list(np.repeat(face_labels, AUGMENTER.num_variants))
+        
         # Train model
-        logging.info(f"Training model with {len(face_images)} faces...")
+        logger.info(f"Training model with {len(face_images)} faces...")
         recognizer.train(face_images, np.array(face_labels))
         
         # Save model and labels
         recognizer.save(str(model_path))
         with open(labels_path, 'wb') as f:
             pickle.dump(labels, f)
+        # Memory-mapped copy that recognize_face loads in milliseconds
+        export_opencv_model(recognizer, labels, model_path)
         
         return {
             'success': True,
@@ -130,12 +184,14 @@ def train_lbph_model():
         }
         
     except Exception as e:
-        logging.error(f"Error during training: {str(e)}")
+        logger.error(f"Error during training: {str(e)}")
         return {'success': False, 'message': str(e)}
 
-def recognize_face(face_image_path):
+def recognize_face(face_image_path, tta_policy=None):
     """Recognize an already detected face"""
     try:
+        tta_policy = tta_policy or TTA_POLICY
+        
         # Get paths
         base_dir = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
         models_dir = base_dir / 'models'
@@ -146,14 +202,8 @@ def recognize_face(face_image_path):
         if not model_path.exists() or not labels_path.exists():
             return {'success': False, 'message': 'Model files not found'}
         
-        # Load LBPH recognizer
-        recognizer = cv2.face.LBPHFaceRecognizer_create()
-        recognizer.read(str(model_path))
-        
-        # Load labels
-        with open(labels_path, 'rb') as f:
-            labels_dict = pickle.load(f)
-        labels_reverse = {v: k for k, v in labels_dict.items()}
+        # Load LBPH model and labels, cached until they change
+        recognizer, labels_reverse = load_model(model_path, labels_path)
         
         # Read and process image
         img = cv2.imread(str(face_image_path))
@@ -163,23 +213,8 @@ def recognize_face(face_image_path):
         # Preprocess face
         processed_face = preprocess_face(img)
         
-        # Try recognition with original and slightly rotated versions
-        predictions = []
-        angles = [0, -5, 5]  # Test multiple angles
-        
-        for angle in angles:
-            if angle == 0:
-                test_face = processed_face
-            else:
-                rows, cols = processed_face.shape
-                M = cv2.getRotationMatrix2D((cols/2, rows/2), angle, 1)
-                test_face = cv2.warpAffine(processed_face, M, (cols, rows))
-            
-            label, confidence = recognizer.predict(test_face)
-            predictions.append((label, confidence))
-        
-        # Get the best prediction (lowest confidence value)
-        best_label, best_confidence = min(predictions, key=lambda x: x[1])
+        # Try the face as is, then the augmented versions if it is not a clear match
+        best_label, best_confidence, best_variant = tta_policy.predict(recognizer, processed_face)
         
         # Convert LBPH distance to confidence percentage (0-100%)
         max_confidence = 100  # Maximum confidence threshold
@@ -192,32 +227,51 @@ def recognize_face(face_image_path):
             predicted_student_id = 'Unknown'
             confidence_percentage = 100 - confidence_percentage  # Invert for unknown faces
         
-        # Save debug image with recognition result
-        debug_img = img.copy()
-        color = (0, 255, 0) if predicted_student_id != 'Unknown' else (0, 0, 255)
-        h, w = img.shape[:2]
-        cv2.putText(debug_img, f'{predicted_student_id} ({confidence_percentage:.1f}%)', 
-                   (10, h-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-        debug_path = Path(face_image_path).parent / f'debug_recognition_{Path(face_image_path).name}'
-        cv2.imwrite(str(debug_path), debug_img)
+        # Save debug image with recognition result (only with FACE_DEBUG_IMAGES)
+        debug_sink = get_debug_sink()
+        if debug_sink.wants('recognition'):
+            debug_img = img.copy()
+            color = (0, 255, 0) if predicted_student_id != 'Unknown' else (0, 0, 255)
+            h, w = img.shape[:2]
+            cv2.putText(debug_img, f'{predicted_student_id} ({confidence_percentage:.1f}%)', 
+                       (10, h-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+            debug_path = Path(face_image_path).parent / f'debug_recognition_{Path(face_image_path).name}'
+            debug_sink.submit(debug_path, debug_img)
         
         return {
             'success': True,
             'predicted_student_id': predicted_student_id,
             'confidence': confidence_percentage,
+            'tta_variant': best_variant,
             'message': f'Face recognized as {predicted_student_id} with {confidence_percentage:.1f}% confidence'
         }
         
     except Exception as e:
-        logging.error(f"Error during recognition: {str(e)}")
+        logger.error(f"Error during recognition: {str(e)}")
         return {'success': False, 'message': str(e)}
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
+    parser = argparse.ArgumentParser(description='Train the LBPH model or recognize an already detected face')
+    parser.add_argument('image_path', nargs='?', help='Face image to recognize, trains the model when omitted')
+    parser.add_argument('--tta', default=TTA_VARIANTS,
+                        help="Test-time variants, e.g. 'flip,rotate-5,rotate+5,scale1.1' or 'none'")
+    parser.add_argument('--tta-cutoff', type=float, default=DEFAULT_EARLY_EXIT_DISTANCE,
+                        help='Skip the extra variants when the plain face is closer than this LBPH distance')
+    parser.add_argument('--tta-report', action='store_true',
+                        help='Print how often each test-time variant changed the answer')
+    args = parser.parse_args()
+    
+    if args.tta_report:
+        # Appended by every process that ran recognize_face
+        policy = TTAPolicy()
+        policy.stats = policy.load_stats(TTA_STATS_PATH)
+        result = policy.report()
+    elif args.image_path is None:
         # Train model if no arguments provided
         result = train_lbph_model()
     else:
         # Test recognition with provided image
-        result = recognize_face(sys.argv[1])
+        result = recognize_face(args.image_path, TTAPolicy.from_spec(args.tta, early_exit_distance=args.tta_cutoff,
+                                                                     stats_path=TTA_STATS_PATH))
     
     print(json.dumps(result, indent=2)) 
\ No newline at end of file
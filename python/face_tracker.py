@@ -0,0 +1,143 @@
+import cv2
+import logging
+import numpy as np
+
+from cascade_detector import box_iou
+from logging_setup import setup_logging
+
+# Configure logging
+setup_logging()
+logger = logging.getLogger(__name__)
+
+class FaceTrack:
+    """One face followed between detector runs, with its cached identity"""
+
+    def __init__(self, track_id, box, template):
+        self.track_id = track_id
+        self.box = tuple(int(v) for v in box)
+        self.template = template
+        # (label, distance) from the recognizer, None until recognized
+        self.identity = None
+        # False when the last prediction was not accepted, so it is retried
+        self.confirmed = False
+        self.lost = False
+
+class FaceTracker:
+    """Runs the face detector every few frames and follows faces in between
+
+    Between detections each face is followed by normalized template matching
+    inside a small window around its last position, on a downscaled frame, so
+    a tracked frame costs a few tiny matchTemplate calls instead of a full
+    detectMultiScale pass. Detections are associated with existing tracks by
+    IoU so a face keeps its identity and is only recognized once.
+    A detection is forced as soon as a track is lost (match score too low or
+    it left the frame).
+    """
+
+    def __init__(self, detect_interval=5, track_scale=0.5, search_margin=0.5,
+                 min_score=0.5, iou_threshold=0.3):
+        self.detect_interval = max(1, detect_interval)
+        self.track_scale = track_scale
+        self.search_margin = search_margin
+        self.min_score = min_score
+        self.iou_threshold = iou_threshold
+        self.tracks = []
+        self.frames_since_detection = 0
+        self.next_id = 0
+        self.track_lost = False
+
+    def should_detect(self):
+        """True when the detector has to run on the current frame"""
+        return (not self.tracks or self.track_lost
+                or self.frames_since_detection >= self.detect_interval)
+
+    def _scaled(self, gray):
+        if self.track_scale == 1:
+            return gray
+        return cv2.resize(gray, None, fx=self.track_scale, fy=self.track_scale,
+                          interpolation=cv2.INTER_AREA)
+
+    def _template(self, small, box):
+        s = self.track_scale
+        x, y, w, h = box
+        x0, y0 = int(round(x * s)), int(round(y * s))
+        x1, y1 = int(round((x + w) * s)), int(round((y + h) * s))
+        return small[y0:y1, x0:x1].copy()
+
+    def _follow(self, small, track):
+        """Move a track to the best template match near its last position"""
+        s = self.track_scale
+        th, tw = track.template.shape[:2]
+        x, y, w, h = track.box
+        margin_x = int(w * s * self.search_margin)
+        margin_y = int(h * s * self.search_margin)
+        x0 = max(0, int(round(x * s)) - margin_x)
+        y0 = max(0, int(round(y * s)) - margin_y)
+        x1 = min(small.shape[1], int(round((x + w) * s)) + margin_x)
+        y1 = min(small.shape[0], int(round((y + h) * s)) + margin_y)
+
+        window = small[y0:y1, x0:x1]
+        if th < 4 or tw < 4 or window.shape[0] < th or window.shape[1] < tw:
+            track.lost = True
+            return
+
+        scores = cv2.matchTemplate(window, track.template, cv2.TM_CCOEFF_NORMED)
+        _, best, _, (bx, by) = cv2.minMaxLoc(scores)
+        if best < self.min_score:
+            track.lost = True
+            return
+        track.box = (int(round((x0 + bx) / s)), int(round((y0 + by) / s)), w, h)
+
+    def _associate(self, small, detections):
+        """Match detections to tracks by IoU, tracks keep their identity"""
+        pairs = []
+        for t, track in enumerate(self.tracks):
+            for d, box in enumerate(detections):
+                iou = box_iou(track.box, box)
+                if iou >= self.iou_threshold:
+                    pairs.append((iou, t, d))
+
+        # Greedy, best overlap first
+        matched_tracks = set()
+        matched_detections = set()
+        tracks = []
+        for _, t, d in sorted(pairs, reverse=True):
+            if t in matched_tracks or d in matched_detections:
+                continue
+            matched_tracks.add(t)
+            matched_detections.add(d)
+            track = self.tracks[t]
+            track.box = tuple(int(v) for v in detections[d])
+            track.template = self._template(small, track.box)
+            if not track.confirmed:
+                # Retry faces that were not recognized, e.g. seen at a bad angle
+                track.identity = None
+            tracks.append(track)
+
+        # Faces the detector no longer sees are dropped, new ones start a track
+        for d, box in enumerate(detections):
+            if d not in matched_detections:
+                track = FaceTrack(self.next_id, box, None)
+                track.template = self._template(small, track.box)
+                self.next_id += 1
+                tracks.append(track)
+        self.tracks = tracks
+
+    def update(self, gray, detections=None):
+        """Advance one frame, pass the detector's boxes on detection frames
+
+        Returns the tracks that still need to be recognized.
+        """
+        small = self._scaled(gray)
+        if detections is not None:
+            self._associate(small, detections)
+            self.frames_since_detection = 0
+            self.track_lost = False
+        else:
+            for track in self.tracks:
+                self._follow(small, track)
+            self.track_lost = any(track.lost for track in self.tracks)
+            self.tracks = [track for track in self.tracks if not track.lost]
+            self.frames_since_detection += 1
+
+        return [track for track in self.tracks if track.identity is None]
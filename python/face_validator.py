@@ -4,11 +4,18 @@ import numpy as np
 from pathlib import Path
 import logging
 
+from cascade_detector import detect_faces_scaled
+from logging_setup import setup_logging
+
 # Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Project root, where assets/, test_images/ and validation_output/ live
+BASE_DIR = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 def create_output_directory():
-    output_dir = Path('validation_output')
+    output_dir = BASE_DIR / 'validation_output'
     output_dir.mkdir(exist_ok=True)
     return output_dir
 
@@ -16,16 +23,17 @@ def detect_faces(image_path, output_dir, face_cascade):
     # Read the image
     image = cv2.imread(str(image_path))
     if image is None:
-        logging.error(f"Error: Could not read image {image_path}")
+        logger.error(f"Error: Could not read image {image_path}")
         return None
     
     # Convert to grayscale and apply histogram equalization
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     gray = cv2.equalizeHist(gray)
     
-    # Detect faces with optimized parameters from the project
-    faces = face_cascade.detectMultiScale(
+    # Detect faces with optimized parameters from the project, on a downscaled copy
+    faces = detect_faces_scaled(
         gray,
+        face_cascade,
         scaleFactor=1.1,
         minNeighbors=4,
         minSize=(30, 30),
@@ -56,29 +64,29 @@ def detect_faces(image_path, output_dir, face_cascade):
 
 def main():
     # Get the cascade file path from the project
-    cascade_path = Path('assets/haarcascade_frontalface_default.xml')
+    cascade_path = BASE_DIR / 'assets' / 'haarcascade_frontalface_default.xml'
     
     if not cascade_path.exists():
-        logging.error(f"Error: Cascade file not found at {cascade_path}")
+        logger.error(f"Error: Cascade file not found at {cascade_path}")
         return
     
     # Load the cascade classifier
     face_cascade = cv2.CascadeClassifier(str(cascade_path))
     if face_cascade.empty():
-        logging.error("Error: Could not load face cascade classifier")
+        logger.error("Error: Could not load face cascade classifier")
         return
     
     # Create output directory
     output_dir = create_output_directory()
     
     # Process all images in test_images directory
-    test_images_dir = Path('test_images')
+    test_images_dir = BASE_DIR / 'test_images'
     
     if not test_images_dir.exists():
-        logging.error(f"Error: Test images directory not found at {test_images_dir}")
+        logger.error(f"Error: Test images directory not found at {test_images_dir}")
         return
     
-    logging.info("Starting face validation process...")
+    logger.info("Starting face validation process...")
     
     # Supported image extensions
     image_extensions = ('.jpg', '.jpeg', '.png')
@@ -90,27 +98,27 @@ def main():
     for image_path in test_images_dir.glob('*'):
         if image_path.suffix.lower() in image_extensions:
             total_images += 1
-            logging.info(f"\nProcessing {image_path.name}...")
+            logger.info(f"\nProcessing {image_path.name}...")
             
             num_faces = detect_faces(image_path, output_dir, face_cascade)
             
             if num_faces is None:
-                logging.error(f"Failed to process {image_path.name}")
+                logger.error(f"Failed to process {image_path.name}")
                 continue
                 
             if num_faces == 1:
                 correct_images += 1
-                logging.info(f"✓ Success: Found exactly 1 face in {image_path.name}")
+                logger.info(f"✓ Success: Found exactly 1 face in {image_path.name}")
             else:
-                logging.warning(f"✗ Warning: Found {num_faces} faces in {image_path.name} (should be 1)")
+                logger.warning(f"✗ Warning: Found {num_faces} faces in {image_path.name} (should be 1)")
     
     # Print summary
-    logging.info("\n=== Validation Summary ===")
-    logging.info(f"Total images processed: {total_images}")
-    logging.info(f"Images with exactly one face: {correct_images}")
+    logger.info("\n=== Validation Summary ===")
+    logger.info(f"Total images processed: {total_images}")
+    logger.info(f"Images with exactly one face: {correct_images}")
     if total_images > 0:
-        logging.info(f"Success rate: {(correct_images/total_images)*100:.1f}%")
-    logging.info(f"\nProcessed images saved in: {output_dir}")
+        logger.info(f"Success rate: {(correct_images/total_images)*100:.1f}%")
+    logger.info(f"\nProcessed images saved in: {output_dir}")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
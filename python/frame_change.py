@@ -0,0 +1,114 @@
+import cv2
+import time
+import logging
+import threading
+import numpy as np
+from collections import OrderedDict
+
+from logging_setup import setup_logging
+
+# Configure logging
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Thumbnail the scene is compared on, and the 9x8 image the dHash is taken from
+THUMB_SIZE = (32, 24)
+HASH_SIZE = (9, 8)
+
+# A frame is the same scene when both its hash and its thumbnail are this close
+MAX_HASH_DISTANCE = 4       # differing bits of the 64-bit dHash
+MAX_MEAN_DIFF = 4.0         # mean absolute difference of the thumbnails, in gray levels
+
+# A cached result is recomputed after this many seconds even if nothing changed
+MAX_AGE = 3.0
+
+# Cameras/sessions remembered, the least recently seen are dropped first
+MAX_SESSIONS = 256
+
+# Unsuccessful results that still describe the scene and can be reused, errors never are
+CACHEABLE_FAILURES = ('No face detected', 'Face quality too low')
+
+def frame_signature(source):
+    """(dHash, thumbnail) of an image path, encoded bytes or decoded frame, None if unreadable
+
+    Encoded images are decoded at 1/8 scale in grayscale, which is a small
+    fraction of the cost of a full decode.
+    """
+    if isinstance(source, np.ndarray):
+        small = source if source.ndim == 2 else cv2.cvtColor(source, cv2.COLOR_BGR2GRAY)
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        if not len(source):
+            return None
+        small = cv2.imdecode(np.frombuffer(source, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    else:
+        small = cv2.imread(str(source), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if small is None:
+        return None
+
+    thumb = cv2.resize(small, THUMB_SIZE, interpolation=cv2.INTER_AREA)
+    tiny = cv2.resize(thumb, HASH_SIZE, interpolation=cv2.INTER_AREA)
+    # dHash: is each pixel brighter than its right neighbour
+    bits = (tiny[:, 1:] > tiny[:, :-1]).ravel()
+    return int(np.packbits(bits).view('>u8')[0]), thumb
+
+def same_scene(a, b):
+    """True if two frame signatures show essentially the same scene"""
+    if bin(a[0] ^ b[0]).count('1') > MAX_HASH_DISTANCE:
+        return False
+    return float(cv2.absdiff(a[1], b[1]).mean()) <= MAX_MEAN_DIFF
+
+class FrameChangeCache:
+    """Last result per (endpoint, session), reused while the scene does not change
+
+    Each entry keeps the signature of the frame the result was computed on,
+    so slow drift (someone walking in step by step) still adds up to a
+    change, and results older than max_age are recomputed regardless.
+    """
+
+    def __init__(self, max_sessions=MAX_SESSIONS, max_age=MAX_AGE):
+        self.max_sessions = max_sessions
+        self.max_age = max_age
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key, signature):
+        """Copy of the cached result for an unchanged scene, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            if (entry is None or signature is None or time.monotonic() - entry['time'] > self.max_age
+                    or not same_scene(entry['signature'], signature)):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(entry['result'], cached=True)
+
+    def store(self, key, signature, result):
+        if signature is None:
+            return
+        if not result.get('success') and not str(result.get('message', '')).startswith(CACHEABLE_FAILURES):
+            return
+        # Per-request extras are not part of the scene's result
+        result = {k: v for k, v in result.items() if k not in ('timings', 'cached')}
+        with self.lock:
+            self.entries[key] = {'signature': signature, 'result': result, 'time': time.monotonic()}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_sessions:
+                self.entries.popitem(last=False)
+
+_cache = FrameChangeCache()
+
+def get_frame_cache():
+    """This process's FrameChangeCache, shared by the recognition entry points"""
+    return _cache
+
+def cached_result(endpoint, session, image):
+    """(cached result or None, signature to store the new result with) for a session's frame"""
+    signature = frame_signature(image)
+    return _cache.lookup((endpoint, session), signature), signature
+
+def remember(endpoint, session, signature, result):
+    _cache.store((endpoint, session), signature, result)
@@ -0,0 +1,114 @@
+import math
+import logging
+import numpy as np
+
+from logging_setup import setup_logging
+
+# Configure logging
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Histogram rows projected per chunk while building
+BUILD_CHUNK = 2048
+
+class GalleryIndex:
+    """Per-student centroid index over an LBPH gallery
+
+    Every histogram is mapped to sqrt(h) (so L2 approximates the chi-square
+    distance LBPH uses) and randomly projected to a few hundred dimensions.
+    Each student is summarised by the centroid of its projected histograms.
+    A search ranks students by centroid distance and runs the exact
+    chi-square only on the histograms of the best `rerank` students, so the
+    expensive part no longer grows with enrollment and the coarse scan is a
+    small matrix-vector product.
+
+    With n_lists > 0 the centroids are also grouped by k-means into an
+    inverted file and only the nprobe closest lists are scanned. That makes
+    the coarse scan sub-linear too, at some cost in recall, which is why it
+    is opt-in (see benchmark_gallery_index.py).
+    """
+
+    def __init__(self, engine, dim=256, n_lists=0, nprobe=16, rerank=8, iterations=10, seed=0):
+        self.engine = engine
+        self.nprobe = nprobe
+        self.rerank = rerank
+
+        rng = np.random.default_rng(seed)
+        num_bins = engine.gallery.shape[0]
+        self.projection = (rng.standard_normal((num_bins, dim)) / math.sqrt(dim)).astype(np.float32)
+
+        # Group gallery columns by student
+        self.students, student_of = np.unique(engine.labels, return_inverse=True)
+        order = np.argsort(student_of, kind='stable')
+        bounds = np.searchsorted(student_of[order], np.arange(len(self.students) + 1))
+        self.members = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.students))]
+
+        # Mean of the projected histograms per student (projection is linear)
+        centroids = np.zeros((len(self.students), dim), dtype=np.float64)
+        histograms = engine.histograms
+        for start in range(0, len(histograms), BUILD_CHUNK):
+            projected = self.project(histograms[start:start + BUILD_CHUNK])
+            np.add.at(centroids, student_of[start:start + BUILD_CHUNK], projected)
+        counts = np.bincount(student_of, minlength=len(self.students))
+        self.centroids = (centroids / np.maximum(counts, 1)[:, np.newaxis]).astype(np.float32)
+        self.centroid_norms = (self.centroids * self.centroids).sum(axis=1)
+
+        # Optional inverted file over the centroids
+        self.centers = None
+        self.lists = None
+        if n_lists:
+            self.centers, assignment = self._kmeans(self.centroids, n_lists, iterations, rng)
+            self.lists = [np.flatnonzero(assignment == i) for i in range(len(self.centers))]
+
+        logger.info(f"Built gallery index: {len(self.students)} students, "
+                     f"{len(self.lists) if self.lists else 0} lists")
+
+    def project(self, histograms):
+        """sqrt-then-project embedding used for the coarse stages"""
+        return np.sqrt(np.asarray(histograms, dtype=np.float32)) @ self.projection
+
+    @staticmethod
+    def _squared_distances(points, centers):
+        return (
+            (points * points).sum(axis=1)[:, np.newaxis]
+            - 2 * points @ centers.T
+            + (centers * centers).sum(axis=1)[np.newaxis, :]
+        )
+
+    def _kmeans(self, points, k, iterations, rng):
+        k = min(k, len(points))
+        centers = points[rng.choice(len(points), k, replace=False)].copy()
+        assignment = np.zeros(len(points), dtype=np.intp)
+        for _ in range(iterations):
+            assignment = self._squared_distances(points, centers).argmin(axis=1)
+            for i in range(k):
+                members = points[assignment == i]
+                if len(members):
+                    centers[i] = members.mean(axis=0)
+        return centers, assignment
+
+    def candidates(self, projected):
+        """Gallery columns of the most promising students for one projected probe"""
+        # |c|^2 - 2 c.p ranks the same as the squared distance
+        if self.lists is None:
+            students = np.arange(len(self.students))
+            student_distances = self.centroid_norms - 2 * (self.centroids @ projected)
+        else:
+            center_distances = self._squared_distances(projected[np.newaxis], self.centers)[0]
+            nearest_lists = np.argsort(center_distances)[:self.nprobe]
+            students = np.concatenate([self.lists[i] for i in nearest_lists])
+            student_distances = self.centroid_norms[students] - 2 * (self.centroids[students] @ projected)
+
+        if len(students) > self.rerank:
+            best = np.argpartition(student_distances, self.rerank)[:self.rerank]
+            students = students[best]
+        return np.concatenate([self.members[i] for i in students])
+
+    def search(self, histograms):
+        """(label, distance) for each probe histogram, exact chi-square on the candidates"""
+        results = []
+        for histogram, projected in zip(histograms, self.project(histograms)):
+            columns = self.candidates(projected)
+            distances = self.engine.distances(histogram[np.newaxis], subset=columns)[0]
+            results.append(self.engine.best_match(distances, columns))
+        return results
@@ -0,0 +1,177 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from logging_setup import setup_logging
+
+# Configure logging
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Histogram buckets in seconds, from a fast prediction to a slow cold start
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGE_METRIC = 'face_stage_seconds'
+
+HELP = {
+    STAGE_METRIC: 'Time spent in each recognition stage',
+    'face_results_total': 'Recognition and detection results by endpoint and outcome'
+}
+
+# Timers run when metrics are enabled (FACE_METRICS=1 or enable()) or while
+# collect_timings() is gathering a per-request breakdown on this thread
+_enabled = os.environ.get('FACE_METRICS', '') not in ('', '0')
+_local = threading.local()
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+
+class _NullTimer:
+    """Shared do-nothing timer returned while instrumentation is off"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_TIMER = _NullTimer()
+
+class StageTimer:
+    """Times one stage and records it in the histograms and the thread's timings"""
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+def enable(enabled=True):
+    """Turn the aggregated metrics on or off for this process"""
+    global _enabled
+    _enabled = enabled
+
+def is_enabled():
+    return _enabled
+
+def stage(name):
+    """Context manager timing a stage, a shared no-op while instrumentation is off"""
+    if not _enabled and getattr(_local, 'timings', None) is None:
+        return NULL_TIMER
+    return StageTimer(name)
+
+def record(name, seconds):
+    """Add a stage duration to this thread's timings and, if enabled, the histogram"""
+    timings = getattr(_local, 'timings', None)
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+    if not _enabled:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0}
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram['buckets'][i] += 1
+        histogram['sum'] += seconds
+        histogram['count'] += 1
+
+def increment(metric, amount=1, **labels):
+    """Increase a counter, e.g. increment('face_results_total', endpoint='recognize', outcome='unknown')"""
+    if not _enabled:
+        return
+    key = (metric, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+@contextmanager
+def collect_timings():
+    """Collect the stages run on this thread into a {stage: milliseconds} dict
+
+    The dict is filled in when the block exits, e.g.
+        with collect_timings() as timings:
+            result = recognize_image(img, models)
+        result['timings'] = timings
+    """
+    previous = getattr(_local, 'timings', None)
+    seconds = _local.timings = {}
+    timings = {}
+    try:
+        yield timings
+    finally:
+        _local.timings = previous
+        timings.update((name, round(value * 1000, 3)) for name, value in seconds.items())
+
+def reset():
+    """Forget every recorded metric"""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format"""
+    with _lock:
+        histograms = {name: {'buckets': list(h['buckets']), 'sum': h['sum'], 'count': h['count']}
+                      for name, h in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = [
+        f'# HELP {STAGE_METRIC} {HELP[STAGE_METRIC]}',
+        f'# TYPE {STAGE_METRIC} histogram'
+    ]
+    for name in sorted(histograms):
+        histogram = histograms[name]
+        for bound, count in zip(BUCKETS, histogram['buckets']):
+            lines.append(f'{STAGE_METRIC}_bucket{{stage="{name}",le="{bound:g}"}} {count}')
+        lines.append(f'{STAGE_METRIC}_bucket{{stage="{name}",le="+Inf"}} {histogram["count"]}')
+        lines.append(f'{STAGE_METRIC}_sum{{stage="{name}"}} {histogram["sum"]:.6f}')
+        lines.append(f'{STAGE_METRIC}_count{{stage="{name}"}} {histogram["count"]}')
+
+    metrics = sorted({metric for metric, _ in counters})
+    for metric in metrics:
+        if metric in HELP:
+            lines.append(f'# HELP {metric} {HELP[metric]}')
+        lines.append(f'# TYPE {metric} counter')
+        for (name, labels), value in sorted(counters.items()):
+            if name == metric:
+                lines.append(f'{metric}{_format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+def write_prometheus(path):
+    """Write the metrics to a Prometheus textfile, replaced atomically"""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'w') as f:
+            f.write(render_prometheus())
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write metrics to {path}: {str(e)}")
+
+def count_result(endpoint, result):
+    """Count a detect/recognize result by outcome"""
+    if not _enabled:
+        return
+    if result.get('success'):
+        student_id = result.get('student_id')
+        if student_id is None:
+            outcome = 'detected'
+        else:
+            outcome = 'unknown' if student_id == 'Unknown' else 'recognized'
+    else:
+        outcome = 'no_face' if result.get('message') == 'No face detected' else 'error'
+    increment('face_results_total', endpoint=endpoint, outcome=outcome)
@@ -0,0 +1,232 @@
+import cv2
+import sys
+import logging
+import numpy as np
+
+from logging_setup import setup_logging
+
+# Configure logging
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Distance returned when no gallery entry is below the threshold, same as OpenCV (DBL_MAX)
+NO_MATCH_DISTANCE = sys.float_info.max
+
+# Gallery entries scored per chunk, bounds the (probes, bins, entries) temporary
+GALLERY_CHUNK = 1024
+
+# Keeps a / (a + b) defined when both bins are empty
+TINY = np.float32(1e-30)
+
+class NumpyLBPHRecognizer:
+    """LBPH recognizer that scores probes with vectorized NumPy
+
+    Computes the same circular LBP spatial histograms as
+    cv2.face.LBPHFaceRecognizer and keeps every gallery histogram in one
+    contiguous bins-major float32 matrix, so a whole frame's faces are scored
+    against the gallery in one batched chi-square (or histogram intersection)
+    pass.
+    predict() keeps OpenCV's (label, distance) contract, including label -1
+    when nothing is closer than the threshold.
+    """
+
+    def __init__(self, radius=1, neighbors=8, grid_x=8, grid_y=8, threshold=NO_MATCH_DISTANCE,
+                 metric='chisqr'):
+        if metric not in ('chisqr', 'intersection'):
+            raise ValueError(f"Unknown metric: {metric}")
+        self.radius = radius
+        self.neighbors = neighbors
+        self.grid_x = grid_x
+        self.grid_y = grid_y
+        self.threshold = threshold
+        self.metric = metric
+        self.index = None
+        self.set_gallery(np.empty((0, self.num_bins), dtype=np.float32), [])
+        self._sampling = self._sampling_points()
+
+    @property
+    def num_bins(self):
+        return self.grid_x * self.grid_y * (1 << self.neighbors)
+
+    @classmethod
+    def from_opencv(cls, recognizer, metric='chisqr'):
+        """Copy the parameters and gallery of a trained cv2.face LBPH recognizer"""
+        engine = cls(recognizer.getRadius(), recognizer.getNeighbors(), recognizer.getGridX(),
+                     recognizer.getGridY(), recognizer.getThreshold(), metric=metric)
+        histograms = recognizer.getHistograms()
+        if histograms:
+            engine.set_gallery(np.vstack(histograms), recognizer.getLabels())
+        return engine
+
+    def read(self, model_path):
+        """Load a model saved by cv2.face.LBPHFaceRecognizer.save()"""
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer.read(str(model_path))
+        engine = NumpyLBPHRecognizer.from_opencv(recognizer, metric=self.metric)
+        self.__dict__.update(engine.__dict__)
+
+    def _sampling_points(self):
+        """Bilinear sampling offsets and weights for each neighbour, as in OpenCV's elbp"""
+        points = []
+        for n in range(self.neighbors):
+            angle = 2.0 * np.pi * n / self.neighbors
+            x = np.float32(self.radius * np.cos(angle))
+            y = np.float32(-self.radius * np.sin(angle))
+            fx, fy = int(np.floor(x)), int(np.floor(y))
+            cx, cy = int(np.ceil(x)), int(np.ceil(y))
+            tx, ty = np.float32(x - fx), np.float32(y - fy)
+            weights = (
+                np.float32((1 - tx) * (1 - ty)),
+                np.float32(tx * (1 - ty)),
+                np.float32((1 - tx) * ty),
+                np.float32(tx * ty)
+            )
+            points.append(((fy, fx), (fy, cx), (cy, fx), (cy, cx), weights))
+        return points
+
+    def lbp_codes(self, faces):
+        """Circular LBP codes for a (N, H, W) stack of faces"""
+        faces = np.asarray(faces, dtype=np.float32)
+        if faces.ndim == 2:
+            faces = faces[np.newaxis]
+        n, h, w = faces.shape
+        r = self.radius
+        center = faces[:, r:h - r, r:w - r]
+        codes = np.zeros(center.shape, dtype=np.uint32 if self.neighbors > 16 else np.uint16)
+        eps = np.finfo(np.float32).eps
+
+        def shifted(dy, dx):
+            return faces[:, r + dy:h - r + dy, r + dx:w - r + dx]
+
+        for bit, (p1, p2, p3, p4, (w1, w2, w3, w4)) in enumerate(self._sampling):
+            t = w1 * shifted(*p1) + w2 * shifted(*p2) + w3 * shifted(*p3) + w4 * shifted(*p4)
+            codes |= (((t > center) | (np.abs(t - center) < eps)).astype(codes.dtype) << bit)
+        return codes
+
+    def compute_histograms(self, faces):
+        """Spatial LBP histograms for a stack of faces, one float32 row per face"""
+        codes = self.lbp_codes(faces)
+        n, h, w = codes.shape
+        cell_h, cell_w = h // self.grid_y, w // self.grid_x
+        num_patterns = 1 << self.neighbors
+        num_cells = self.grid_x * self.grid_y
+
+        # (N, gy, ch, gx, cw) -> (N, cells, pixels) so each cell is one row
+        cells = codes[:, :self.grid_y * cell_h, :self.grid_x * cell_w]
+        cells = cells.reshape(n, self.grid_y, cell_h, self.grid_x, cell_w)
+        cells = cells.transpose(0, 1, 3, 2, 4).reshape(n, num_cells, cell_h * cell_w)
+
+        # One bincount for every cell of every face
+        offsets = (np.arange(n * num_cells, dtype=np.int64) * num_patterns).reshape(n, num_cells, 1)
+        counts = np.bincount((cells + offsets).ravel(), minlength=n * num_cells * num_patterns)
+        histograms = counts.reshape(n, num_cells * num_patterns).astype(np.float32)
+        histograms /= np.float32(cell_h * cell_w)
+        return histograms
+
+    @property
+    def histograms(self):
+        """Gallery as (gallery_size, num_bins), a view of the bins-major matrix"""
+        return self.gallery.T
+
+    def set_gallery(self, histograms, labels):
+        """Replace the gallery with precomputed (gallery_size, num_bins) histograms"""
+        self.gallery = np.ascontiguousarray(np.asarray(histograms, dtype=np.float32).T)
+        self.gallery_sums = self.gallery.sum(axis=0, dtype=np.float64)
+        self.labels = np.asarray(labels, dtype=np.int32).ravel()
+        # Any index was built for the previous gallery
+        self.index = None
+
+    def load_gallery(self, gallery, gallery_sums, labels):
+        """Use a bins-major gallery as is, e.g. memory-mapped from a binary model (see model_store.py)"""
+        self.gallery = gallery
+        self.gallery_sums = gallery_sums
+        self.labels = labels
+        self.index = None
+
+    def train(self, faces, labels):
+        """Replace the gallery with these faces"""
+        self.set_gallery(self.compute_histograms(np.stack(faces)), labels)
+
+    def update(self, faces, labels):
+        """Add faces to the gallery"""
+        histograms = np.vstack([self.histograms, self.compute_histograms(np.stack(faces))])
+        self.set_gallery(histograms, np.concatenate([self.labels, np.asarray(labels, dtype=np.int32).ravel()]))
+
+    def distances(self, probes, subset=None):
+        """(num_probes, gallery_size) distances between probe histograms and the gallery
+
+        Only bins where a probe is non-zero can change either metric, so each
+        probe's non-zero bins are gathered from the bins-major gallery (padded
+        to the same length with zero weights) and all probes are scored in one
+        (probes, bins, gallery) operation. subset restricts scoring to those
+        gallery columns.
+        """
+        probes = np.asarray(probes, dtype=np.float32)
+        num_probes = len(probes)
+        if subset is None:
+            subset = np.arange(self.gallery.shape[1])
+        size = len(subset)
+
+        # Non-zero bins of every probe, padded with bin 0 / weight 0
+        nonzero = [np.flatnonzero(p) for p in probes]
+        width = max(len(cols) for cols in nonzero)
+        cols = np.zeros((num_probes, width), dtype=np.intp)
+        weights = np.zeros((num_probes, width, 1), dtype=np.float32)
+        for i, c in enumerate(nonzero):
+            cols[i, :len(c)] = c
+            weights[i, :len(c), 0] = probes[i, c]
+
+        result = np.empty((num_probes, size), dtype=np.float64)
+        for start in range(0, size, GALLERY_CHUNK):
+            columns = subset[start:start + GALLERY_CHUNK]
+            b = self.gallery[cols[:, :, np.newaxis], columns]
+            if self.metric == 'chisqr':
+                # HISTCMP_CHISQR_ALT: 2 * sum((a - b)^2 / (a + b))
+                #   = 2 * (sum(a) + sum(b) - 4 * sum(ab / (a + b)))
+                cross = (weights * b / (weights + b + TINY)).sum(axis=1, dtype=np.float64)
+                sums = probes.sum(axis=1, dtype=np.float64)[:, np.newaxis]
+                distance = 2 * (sums + self.gallery_sums[columns] - 4 * cross)
+                result[:, start:start + GALLERY_CHUNK] = np.maximum(distance, 0)
+            else:
+                # Turn the intersection similarity into a distance, 0 for identical faces
+                overlap = np.minimum(weights, b).sum(axis=1, dtype=np.float64)
+                result[:, start:start + GALLERY_CHUNK] = self.grid_x * self.grid_y - overlap
+        return result
+
+    def best_match(self, distances, columns=None):
+        """(label, distance) of the closest gallery entry in a row of distances"""
+        index = int(distances.argmin())
+        distance = float(distances[index])
+        if columns is not None:
+            index = columns[index]
+        if distance < self.threshold:
+            return int(self.labels[index]), distance
+        return -1, NO_MATCH_DISTANCE
+
+    def build_index(self, **kwargs):
+        """Search through a GalleryIndex instead of scanning the whole gallery"""
+        from gallery_index import GalleryIndex
+        self.index = GalleryIndex(self, **kwargs)
+        return self.index
+
+    def predict_batch(self, faces):
+        """Predict every face in one pass, returns a list of (label, distance)"""
+        if len(faces) == 0:
+            return []
+        if len(self.labels) == 0:
+            return [(-1, NO_MATCH_DISTANCE)] * len(faces)
+
+        histograms = self.compute_histograms(np.stack(faces))
+        if self.index is not None:
+            return self.index.search(histograms)
+        return [self.best_match(row) for row in self.distances(histograms)]
+
+    def predict(self, face):
+        """Same (label, distance) contract as cv2.face.LBPHFaceRecognizer.predict"""
+        return self.predict_batch([face])[0]
+
+def predict_faces(recognizer, faces):
+    """Predict several faces, in one batch when the recognizer supports it"""
+    if hasattr(recognizer, 'predict_batch'):
+        return recognizer.predict_batch(faces)
+    return [recognizer.predict(face) for face in faces]
@@ -0,0 +1,229 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+import subprocess
+from collections import Counter
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmark_recognition import latency_summary
+from recognition_server import RecognitionService, make_server, request_service, DEFAULT_HOST, DEFAULT_PORT
+from logging_setup import setup_logging
+
+# Configure logging
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Captured frames replayed by default, relative to the project root
+IMAGE_DIRS = ['uploads', 'temp', 'test_images']
+
+# Scripts the PHP endpoints run for each endpoint
+SCRIPTS = {
+    'recognize': 'realtime_recognition.py',
+    'detect': 'detect_face.py'
+}
+
+def collect_images(directories):
+    """Every JPEG/PNG in the given directories (relative ones are under the project root)"""
+    base_dir = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    images = []
+    for directory in directories:
+        directory = base_dir / directory
+        if directory.is_dir():
+            images.extend(str(path) for path in sorted(directory.iterdir())
+                          if path.suffix.lower() in ('.jpg', '.jpeg', '.png'))
+    return images
+
+class InProcessTarget:
+    """Calls the recognition code directly, with the models loaded once"""
+
+    name = 'inprocess'
+
+    def __init__(self, backend='opencv'):
+        self.service = RecognitionService(backend)
+
+    def call(self, endpoint, image_path):
+        return getattr(self.service, endpoint)(image_path)
+
+class SubprocessTarget:
+    """Starts one Python process per request, like the PHP fallback path"""
+
+    name = 'subprocess'
+
+    def __init__(self, timeout=30):
+        self.timeout = timeout
+        self.script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    def call(self, endpoint, image_path):
+        script = os.path.join(self.script_dir, SCRIPTS[endpoint])
+        completed = subprocess.run([sys.executable, script, image_path], capture_output=True,
+                                   text=True, timeout=self.timeout)
+        # The result is the last line on stdout, logging goes to stderr
+        lines = [line for line in completed.stdout.splitlines() if line.strip()]
+        if not lines:
+            raise RuntimeError(f"No output (exit code {completed.returncode})")
+        return json.loads(lines[-1])
+
+class HttpTarget:
+    """Posts to a recognition_server.py instance"""
+
+    name = 'http'
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=30):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def call(self, endpoint, image_path):
+        result = request_service(endpoint, image_path, self.host, self.port, timeout=self.timeout)
+        if result is None:
+            raise ConnectionError(f"Server at {self.host}:{self.port} not reachable")
+        return result
+
+def start_local_server(backend='opencv'):
+    """Serve recognition_server.py on a free localhost port in a background thread"""
+    server = make_server(DEFAULT_HOST, 0, backend)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def arrival_offsets(requests, rate, poisson=False, seed=0):
+    """Seconds after the start at which each request is sent, all zero for a closed loop"""
+    if not rate:
+        return [0.0] * requests
+    if not poisson:
+        return [i / rate for i in range(requests)]
+    rng = random.Random(seed)
+    offsets = []
+    t = 0.0
+    for _ in range(requests):
+        offsets.append(t)
+        t += rng.expovariate(rate)
+    return offsets
+
+def run_load(target, endpoint, images, requests=40, concurrency=4, rate=0.0, poisson=False, seed=0):
+    """Replay images against a target and return the load report
+
+    With rate=0 every request is queued at once and concurrency workers send
+    them back to back (closed loop, maximum throughput). With a rate, requests
+    are sent on an open-loop schedule and response time is counted from the
+    scheduled send time, so time spent queued behind busy workers shows up in
+    the tail latency instead of silently slowing the arrivals down.
+    """
+    lock = threading.Lock()
+    samples = []
+
+    def send(image_path, scheduled):
+        start = time.perf_counter()
+        error = None
+        try:
+            result = target.call(endpoint, image_path)
+            message = None if result.get('success') else result.get('message', 'Unknown error')
+        except Exception as e:
+            error = message = f"{type(e).__name__}: {str(e)}"
+        end = time.perf_counter()
+        with lock:
+            samples.append({
+                'service': end - start,
+                'response': end - (scheduled if scheduled is not None else start),
+                'error': error,
+                'message': message
+            })
+
+    offsets = arrival_offsets(requests, rate, poisson, seed)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i, offset in enumerate(offsets):
+            scheduled = None
+            if rate:
+                scheduled = started + offset
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(send, images[i % len(images)], scheduled)
+    elapsed = time.perf_counter() - started
+
+    errors = sum(1 for sample in samples if sample['error'])
+    unsuccessful = sum(1 for sample in samples if sample['message'] and not sample['error'])
+    return {
+        'target': target.name,
+        'endpoint': endpoint,
+        'requests': len(samples),
+        'concurrency': concurrency,
+        'rate': rate,
+        'arrivals': 'poisson' if poisson and rate else ('uniform' if rate else 'closed-loop'),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(samples) / elapsed, 3) if elapsed else None,
+        # Transport failures, crashes and timeouts
+        'errors': errors,
+        'error_rate': round(errors / len(samples), 4) if samples else None,
+        # Answered with success=False, e.g. no face in the frame
+        'unsuccessful': unsuccessful,
+        'messages': dict(Counter(sample['message'] for sample in samples if sample['message']).most_common(10)),
+        'latency': {
+            'service': latency_summary([sample['service'] for sample in samples]),
+            'response': latency_summary([sample['response'] for sample in samples])
+        }
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay captured frames against the recognition entry points')
+    parser.add_argument('--target', choices=['inprocess', 'subprocess', 'http'], default='http',
+                        help='Call the code directly, start a process per request, or post to the server')
+    parser.add_argument('--endpoint', choices=list(SCRIPTS), default='recognize')
+    parser.add_argument('--requests', type=int, default=40, help='Number of requests to send')
+    parser.add_argument('--concurrency', type=int, default=4, help='Requests in flight at most')
+    parser.add_argument('--rate', type=float, default=0.0,
+                        help='Arrivals per second (e.g. 0.33 for 40 students in two minutes), 0 for a closed loop')
+    parser.add_argument('--poisson', action='store_true', help='Random (Poisson) arrivals at --rate')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for --poisson and --shuffle')
+    parser.add_argument('--shuffle', action='store_true', help='Replay the images in random order')
+    parser.add_argument('--images', action='append', metavar='DIR',
+                        help=f"Image directory to replay (repeatable, default: {', '.join(IMAGE_DIRS)})")
+    parser.add_argument('--host', default=DEFAULT_HOST, help='With --target http, server address')
+    parser.add_argument('--port', type=int, default=0,
+                        help='With --target http, port of a running server; 0 starts a local one')
+    parser.add_argument('--backend', choices=['opencv', 'numpy', 'indexed'], default='opencv',
+                        help='Recognizer for the in-process target and the local server')
+    parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds')
+    parser.add_argument('--output', help='Also write the JSON report to this file')
+    args = parser.parse_args()
+
+    images = collect_images(args.images or IMAGE_DIRS)
+    if not images:
+        print(json.dumps({'success': False, 'message': 'No images to replay'}))
+        sys.exit(1)
+    if args.shuffle:
+        random.Random(args.seed).shuffle(images)
+
+    server = None
+    if args.target == 'inprocess':
+        target = InProcessTarget(args.backend)
+    elif args.target == 'subprocess':
+        target = SubprocessTarget(args.timeout)
+    else:
+        port = args.port
+        if not port:
+            server = start_local_server(args.backend)
+            port = server.server_address[1]
+            logger.info(f"Started local recognition server on port {port}")
+        target = HttpTarget(args.host, port, args.timeout)
+
+    try:
+        report = run_load(target, args.endpoint, images, max(1, args.requests), max(1, args.concurrency),
+                          max(0.0, args.rate), args.poisson, args.seed)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    report['images'] = len(images)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
@@ -0,0 +1,184 @@
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+from pathlib import Path
+
+# Defaults, each can be overridden with the environment variable next to it
+DEFAULT_LEVEL = 'INFO'          # FACE_LOG_LEVEL
+DEFAULT_FORMAT = 'json'         # FACE_LOG_FORMAT=json|text
+LOG_MAX_BYTES = 5 * 1024 * 1024 # FACE_LOG_MAX_BYTES
+LOG_BACKUPS = 3                 # FACE_LOG_BACKUPS
+SAMPLE_BURST = 20               # FACE_LOG_SAMPLE_BURST
+SAMPLE_INTERVAL = 60.0          # FACE_LOG_SAMPLE_INTERVAL
+# FACE_LOG_FILE: rotating log file, FACE_LOG_LEVELS: 'face_cache=WARNING,realtime_recognition=DEBUG'
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+
+# Attributes every LogRecord has, anything else came in through extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'suppressed'}
+
+_lock = threading.Lock()
+_state = {'queue': None, 'handler': None, 'listener': None, 'handlers': [], 'files': set()}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any extra= fields"""
+
+    def format(self, record):
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            entry['suppressed'] = suppressed
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class SamplingFilter(logging.Filter):
+    """Let through at most burst records per interval from each logging call site
+
+    Meant for per-image and per-frame messages: a call site is identified by
+    file and line, so f-string messages that differ every time still count as
+    one. The next record let through reports how many were dropped.
+    Errors are never sampled.
+    """
+
+    def __init__(self, burst=SAMPLE_BURST, interval=SAMPLE_INTERVAL, max_level=logging.WARNING):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.max_level = max_level
+        self.windows = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > self.max_level or self.burst <= 0:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                # [window start, records passed, records dropped]
+                suppressed = window[2] if window else 0
+                window = self.windows[key] = [now, 0, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+            if window[1] >= self.burst:
+                window[2] += 1
+                return False
+            window[1] += 1
+        return True
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+def parse_module_levels(spec):
+    """{'face_cache': 'WARNING', ...} from 'face_cache=WARNING,realtime_recognition=DEBUG'"""
+    levels = {}
+    for item in (spec or '').split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def _formatter(log_format):
+    if log_format == 'text':
+        return logging.Formatter(TEXT_FORMAT)
+    return JsonFormatter()
+
+def _stop_listener():
+    listener = _state['listener']
+    if listener is not None:
+        listener.stop()
+        _state['listener'] = None
+
+def _restart_in_child():
+    """Forked workers inherit the queue but not the writer thread, start their own"""
+    global _lock
+    _lock = threading.Lock()
+    if _state['handler'] is not None:
+        listener = logging.handlers.QueueListener(_state['queue'], *_state['handlers'],
+                                                  respect_handler_level=True)
+        listener.start()
+        _state['listener'] = listener
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_in_child)
+
+def setup_logging(level=None, log_file=None, log_format=None, module_levels=None):
+    """Send all logging through a queue to a background writer thread
+
+    The calling thread only puts the record on a queue (after the sampling
+    filter), a QueueListener thread formats it and writes it to stderr and,
+    if log_file or FACE_LOG_FILE is set, a size-rotated file. Safe to call
+    from every module: the first call installs the handlers, later calls
+    only add new log files and module levels.
+    """
+    with _lock:
+        log_format = log_format or os.environ.get('FACE_LOG_FORMAT', DEFAULT_FORMAT)
+        root = logging.getLogger()
+
+        levels = dict(module_levels or {})
+        if _state['handler'] is None:
+            root.setLevel((level or os.environ.get('FACE_LOG_LEVEL', DEFAULT_LEVEL)).upper())
+            stream_handler = logging.StreamHandler(sys.stderr)
+            stream_handler.setFormatter(_formatter(log_format))
+            _state['handlers'].append(stream_handler)
+
+            _state['queue'] = queue.SimpleQueue()
+            handler = logging.handlers.QueueHandler(_state['queue'])
+            handler.addFilter(SamplingFilter(
+                int(_env_float('FACE_LOG_SAMPLE_BURST', SAMPLE_BURST)),
+                _env_float('FACE_LOG_SAMPLE_INTERVAL', SAMPLE_INTERVAL)
+            ))
+            root.addHandler(handler)
+            _state['handler'] = handler
+            atexit.register(_stop_listener)
+            log_file = log_file or os.environ.get('FACE_LOG_FILE')
+            levels = dict(parse_module_levels(os.environ.get('FACE_LOG_LEVELS')), **levels)
+        elif level:
+            root.setLevel(level.upper())
+
+        # Per-module levels, the script being run is also the '__main__' logger
+        main_module = Path(sys.argv[0]).stem if sys.argv and sys.argv[0] else None
+        for name, module_level in levels.items():
+            logging.getLogger(name).setLevel(module_level)
+            if name == main_module:
+                logging.getLogger('__main__').setLevel(module_level)
+
+        new_file = log_file and os.path.abspath(log_file) not in _state['files']
+        if new_file:
+            file_handler = logging.handlers.RotatingFileHandler(
+                log_file,
+                maxBytes=int(_env_float('FACE_LOG_MAX_BYTES', LOG_MAX_BYTES)),
+                backupCount=int(_env_float('FACE_LOG_BACKUPS', LOG_BACKUPS)),
+                encoding='utf-8',
+                delay=True
+            )
+            file_handler.setFormatter(JsonFormatter())
+            _state['handlers'].append(file_handler)
+            _state['files'].add(os.path.abspath(log_file))
+
+        # (Re)start the writer thread with the current set of handlers
+        if new_file or _state['listener'] is None:
+            _stop_listener()
+            listener = logging.handlers.QueueListener(_state['queue'], *_state['handlers'],
+                                                      respect_handler_level=True)
+            listener.start()
+            _state['listener'] = listener
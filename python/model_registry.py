@@ -0,0 +1,238 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import threading
+from pathlib import Path
+
+from logging_setup import setup_logging
+
+# Configure logging
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# File names inside a version directory, the same as the flat models/ layout
+MODEL_FILE = 'lbph_model_validated.yml'
+LABELS_FILE = 'labels_validated.pkl'
+
+# Pointer to the version in use, replaced atomically
+CURRENT_FILE = 'CURRENT'
+
+# Versions kept by prune(), always including the current and previous one
+KEEP_VERSIONS = 3
+
+# How often a long-running recognizer checks the pointer, in seconds
+RELOAD_CHECK_INTERVAL = 2.0
+
+def models_dir():
+    base_dir = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return base_dir / 'models'
+
+def registry_dir():
+    return models_dir() / 'registry'
+
+def version_paths(version):
+    """Model and label paths of a version, None gives the legacy files directly in models/"""
+    directory = registry_dir() / version if version else models_dir()
+    return {
+        'model': directory / MODEL_FILE,
+        'labels': directory / LABELS_FILE
+    }
+
+def read_pointer():
+    """{'version': ..., 'previous': ..., 'published': ...} or None before the first training run"""
+    try:
+        with open(registry_dir() / CURRENT_FILE) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        logger.error(f"Unreadable model pointer: {str(e)}")
+        return None
+
+def current_version():
+    """Name of the version in use, or None when only legacy files exist"""
+    pointer = read_pointer()
+    return pointer['version'] if pointer else None
+
+def list_versions():
+    """Complete versions, oldest first"""
+    if not registry_dir().exists():
+        return []
+    return sorted(d.name for d in registry_dir().iterdir()
+                  if d.is_dir() and (d / MODEL_FILE).exists() and (d / LABELS_FILE).exists())
+
+def create_version():
+    """New empty version directory for a training run to write into"""
+    directory = registry_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    existing = [d.name for d in directory.iterdir() if d.is_dir()]
+    number = max((int(name[1:5]) for name in existing if name[:1] == 'v' and name[1:5].isdigit()), default=0) + 1
+    version_dir = directory / f'v{number:04d}-{stamp}'
+    version_dir.mkdir()
+    return version_dir
+
+def _write_pointer(version, previous):
+    pointer = {
+        'version': version,
+        'previous': previous,
+        'published': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    path = registry_dir() / CURRENT_FILE
+    tmp_path = path.with_name(f'{CURRENT_FILE}.{os.getpid()}.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(pointer, f)
+        f.flush()
+        os.fsync(f.fileno())
+    # Readers see either the old pointer or the new one, never a partial file
+    os.replace(tmp_path, path)
+    return pointer
+
+def publish(version):
+    """Make a fully written version the current one, the old one stays for rollback"""
+    if version not in list_versions():
+        raise ValueError(f"Version {version} is missing or incomplete")
+    previous = current_version()
+    pointer = _write_pointer(version, previous if previous != version else None)
+    logger.info(f"Published model version {version}")
+    return pointer
+
+def rollback(version=None):
+    """Point back at the previous version (or the given one)"""
+    pointer = read_pointer()
+    target = version or (pointer or {}).get('previous')
+    if not target:
+        raise ValueError("No previous version to roll back to")
+    return publish(target)
+
+def prune(keep=KEEP_VERSIONS):
+    """Delete old versions, never the current or previous one"""
+    pointer = read_pointer() or {}
+    protected = {pointer.get('version'), pointer.get('previous')}
+    versions = list_versions()
+    removed = []
+    for version in versions[:max(0, len(versions) - keep)]:
+        if version not in protected:
+            shutil.rmtree(registry_dir() / version, ignore_errors=True)
+            removed.append(version)
+    return removed
+
+def import_legacy():
+    """Copy the flat models/ files into a first version and publish it"""
+    legacy = version_paths(None)
+    if not (legacy['model'].exists() and legacy['labels'].exists()):
+        raise FileNotFoundError("No legacy model in models/")
+    version_dir = create_version()
+    shutil.copy2(legacy['model'], version_dir / MODEL_FILE)
+    shutil.copy2(legacy['labels'], version_dir / LABELS_FILE)
+    binary_dir = legacy['model'].with_suffix('')
+    if binary_dir.is_dir():
+        shutil.copytree(binary_dir, version_dir / binary_dir.name)
+    publish(version_dir.name)
+    return version_dir.name
+
+class ModelReloader:
+    """Hands out the loaded models and swaps in a newly published version
+
+    get() is called on every request. At most every check_interval seconds it
+    stats the CURRENT pointer; when it changed, the new version is loaded on
+    a background thread while requests keep using the old models, and the
+    reference is switched once loading is done. Requests never wait for a
+    load, and one that already holds the old models finishes with them.
+    loader may return a dict with the 'version' it actually loaded, which
+    is then reported instead of the pointer read before loading (a publish
+    can land in between).
+    """
+
+    def __init__(self, loader, check_interval=RELOAD_CHECK_INTERVAL):
+        self.loader = loader
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.loading = False
+        self.last_check = time.monotonic()
+        self.pointer_mtime = self._pointer_mtime()
+        version = current_version()
+        self.models = loader()
+        self.version = self._loaded_version(self.models, version)
+
+    @staticmethod
+    def _loaded_version(models, version):
+        """Version the loader reports for models, else the one read before loading"""
+        if isinstance(models, dict) and 'version' in models:
+            return models['version']
+        return version
+
+    @staticmethod
+    def _pointer_mtime():
+        try:
+            return os.stat(registry_dir() / CURRENT_FILE).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def get(self):
+        now = time.monotonic()
+        if now - self.last_check >= self.check_interval:
+            with self.lock:
+                if not self.loading and now - self.last_check >= self.check_interval:
+                    self.last_check = now
+                    mtime = self._pointer_mtime()
+                    if mtime != self.pointer_mtime:
+                        self.loading = True
+                        threading.Thread(target=self._reload, args=(mtime,), name='model-reload',
+                                         daemon=True).start()
+        return self.models
+
+    def _reload(self, mtime):
+        version = current_version()
+        try:
+            start = time.perf_counter()
+            models = self.loader()
+            if models is None:
+                logger.error(f"Model version {version} could not be loaded, keeping {self.version}")
+            else:
+                version = self._loaded_version(models, version)
+                # A single reference assignment, in-flight requests keep the old dict
+                self.models = models
+                logger.info(f"Switched to model version {version} "
+                            f"({(time.perf_counter() - start) * 1000:.0f} ms to load)")
+                self.version = version
+        except Exception as e:
+            logger.error(f"Reloading model version {version} failed: {str(e)}")
+        finally:
+            with self.lock:
+                self.pointer_mtime = mtime
+                self.loading = False
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage trained model versions')
+    parser.add_argument('command', choices=['list', 'rollback', 'publish', 'prune', 'import-legacy'])
+    parser.add_argument('version', nargs='?', help='Version for publish/rollback')
+    parser.add_argument('--keep', type=int, default=KEEP_VERSIONS, help='Versions kept by prune')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'rollback':
+            rollback(args.version)
+        elif args.command == 'publish':
+            if not args.version:
+                raise ValueError("publish needs a version")
+            publish(args.version)
+        elif args.command == 'prune':
+            logger.info(f"Removed versions: {prune(args.keep)}")
+        elif args.command == 'import-legacy':
+            import_legacy()
+    except (ValueError, FileNotFoundError) as e:
+        print(json.dumps({'success': False, 'message': str(e)}))
+        sys.exit(1)
+
+    pointer = read_pointer() or {}
+    print(json.dumps({
+        'success': True,
+        'current': pointer.get('version'),
+        'previous': pointer.get('previous'),
+        'versions': list_versions()
+    }))
@@ -0,0 +1,201 @@
+import os
+import sys
+import json
+import time
+import pickle
+import logging
+import argparse
+import numpy as np
+from pathlib import Path
+
+from lbp_engine import NumpyLBPHRecognizer
+from logging_setup import setup_logging
+
+# Configure logging
+setup_logging()
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+# Files of a binary model directory, meta.json is written last and marks it complete
+HISTOGRAMS_FILE = 'histograms.npy'
+SUMS_FILE = 'histogram_sums.npy'
+LABELS_FILE = 'labels.npy'
+META_FILE = 'meta.json'
+
+# float32 is mapped straight into the recognizer; uint16 stores the raw cell
+# counts in half the space but has to be converted when loaded
+DTYPES = ('float32', 'uint16')
+
+def binary_model_dir(model_path):
+    """Directory the binary copy of a YAML model lives in: models/lbph_model_validated/"""
+    model_path = Path(model_path)
+    return model_path.with_suffix('')
+
+def _save_array(path, array):
+    """np.save through a temporary file so readers never see a partial array"""
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+def save_binary_model(engine, label_map, output_dir, dtype='float32', source=None):
+    """Write a NumpyLBPHRecognizer gallery and its label map as a binary model
+
+    Histograms are stored bins-major, the layout NumpyLBPHRecognizer scores
+    against, so a float32 model is used straight from the memory map.
+    source is the YAML model the gallery came from; its modification time is
+    recorded so a stale binary copy can be detected.
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unknown dtype: {dtype}")
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'dtype': dtype,
+        'radius': engine.radius,
+        'neighbors': engine.neighbors,
+        'grid_x': engine.grid_x,
+        'grid_y': engine.grid_y,
+        'threshold': engine.threshold,
+        'gallery_size': int(len(engine.labels)),
+        'num_bins': int(engine.gallery.shape[0]),
+        # JSON keys are strings, student ids already are
+        'label_map': {str(student_id): int(label) for student_id, label in label_map.items()},
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'source': str(source) if source else None,
+        'source_mtime': os.path.getmtime(source) if source and os.path.exists(source) else None
+    }
+
+    gallery = engine.gallery
+    if dtype == 'uint16':
+        # Histograms are cell counts / pixels per cell, store the counts
+        nonzero = gallery[gallery > 0]
+        scale = float(1.0 / nonzero.min()) if nonzero.size else 1.0
+        counts = np.rint(gallery * scale)
+        if counts.max(initial=0) > np.iinfo(np.uint16).max or not np.allclose(counts / scale, gallery):
+            raise ValueError("Histograms are not whole cell counts that fit in uint16, use float32")
+        meta['scale'] = scale
+        gallery = counts.astype(np.uint16)
+
+    # meta.json goes last, a directory without it is ignored
+    meta_path = output_dir / META_FILE
+    if meta_path.exists():
+        meta_path.unlink()
+    _save_array(output_dir / HISTOGRAMS_FILE, np.ascontiguousarray(gallery))
+    _save_array(output_dir / SUMS_FILE, np.asarray(engine.gallery_sums, dtype=np.float64))
+    _save_array(output_dir / LABELS_FILE, np.asarray(engine.labels, dtype=np.int32))
+    tmp_path = meta_path.with_name(META_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, meta_path)
+    return meta
+
+def read_binary_meta(model_dir):
+    """meta.json of a binary model, or None if there is no complete model there"""
+    meta_path = Path(model_dir) / META_FILE
+    if not meta_path.exists():
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get('format_version') != FORMAT_VERSION:
+        logger.warning(f"Unsupported binary model version {meta.get('format_version')} in {model_dir}")
+        return None
+    return meta
+
+def load_binary_model(model_dir, metric='chisqr', mmap=True):
+    """(NumpyLBPHRecognizer, label_map) from a binary model directory
+
+    The arrays are opened with np.load(mmap_mode='r'), so loading takes the
+    same few milliseconds whatever the gallery size and the pages are read
+    (and shared between processes) as predictions touch them.
+    Returns None if the directory holds no complete model.
+    """
+    model_dir = Path(model_dir)
+    meta = read_binary_meta(model_dir)
+    if meta is None:
+        return None
+
+    mmap_mode = 'r' if mmap else None
+    gallery = np.load(model_dir / HISTOGRAMS_FILE, mmap_mode=mmap_mode)
+    gallery_sums = np.load(model_dir / SUMS_FILE, mmap_mode=mmap_mode)
+    labels = np.load(model_dir / LABELS_FILE, mmap_mode=mmap_mode)
+    if gallery.shape != (meta['num_bins'], meta['gallery_size']) or len(labels) != meta['gallery_size']:
+        raise ValueError(f"Binary model in {model_dir} does not match its meta.json")
+    if meta['dtype'] == 'uint16':
+        gallery = gallery.astype(np.float32) / np.float32(meta['scale'])
+
+    engine = NumpyLBPHRecognizer(meta['radius'], meta['neighbors'], meta['grid_x'], meta['grid_y'],
+                                 meta['threshold'], metric=metric)
+    engine.load_gallery(gallery, gallery_sums, labels)
+    return engine, dict(meta['label_map'])
+
+def is_stale(model_dir, model_path):
+    """True if the YAML model changed after the binary copy was made from it"""
+    meta = read_binary_meta(model_dir)
+    if meta is None:
+        return True
+    model_path = Path(model_path)
+    if not model_path.exists() or meta.get('source_mtime') is None:
+        return False
+    return os.path.getmtime(model_path) != meta['source_mtime']
+
+def convert_model(model_path, labels_path, output_dir=None, dtype='float32'):
+    """Convert a cv2.face LBPH YAML model and its pickled label map to the binary format"""
+    start = time.perf_counter()
+    engine = NumpyLBPHRecognizer()
+    engine.read(str(model_path))
+    with open(labels_path, 'rb') as f:
+        label_map = pickle.load(f)
+    output_dir = output_dir or binary_model_dir(model_path)
+    meta = save_binary_model(engine, label_map, output_dir, dtype=dtype, source=model_path)
+    logger.info(f"Converted {model_path} ({meta['gallery_size']} histograms) in "
+                f"{time.perf_counter() - start:.1f}s")
+    return output_dir, meta
+
+def export_opencv_model(recognizer, label_map, model_path, dtype='float32'):
+    """Write the binary copy of a just-saved cv2.face LBPH model next to it"""
+    engine = NumpyLBPHRecognizer.from_opencv(recognizer)
+    return save_binary_model(engine, label_map, binary_model_dir(model_path), dtype=dtype, source=model_path)
+
+def directory_size(path):
+    return sum(f.stat().st_size for f in Path(path).iterdir() if f.is_file())
+
+if __name__ == '__main__':
+    from realtime_recognition import get_model_paths
+
+    paths = get_model_paths()
+    parser = argparse.ArgumentParser(description='Convert LBPH models to the memory-mapped binary format')
+    parser.add_argument('command', choices=['convert', 'info'])
+    parser.add_argument('--model', default=str(paths['model']), help='YAML model to convert')
+    parser.add_argument('--labels', default=str(paths['labels']), help='Pickled label map of the model')
+    parser.add_argument('--output', help='Binary model directory (default: next to the YAML model)')
+    parser.add_argument('--dtype', choices=DTYPES, default='float32', help='Histogram storage type')
+    args = parser.parse_args()
+
+    model_dir = Path(args.output) if args.output else binary_model_dir(args.model)
+    if args.command == 'convert':
+        if not Path(args.model).exists() or not Path(args.labels).exists():
+            print(json.dumps({'success': False, 'message': 'Model or label file not found'}))
+            sys.exit(1)
+        convert_model(args.model, args.labels, model_dir, args.dtype)
+
+    start = time.perf_counter()
+    loaded = load_binary_model(model_dir)
+    if loaded is None:
+        print(json.dumps({'success': False, 'message': f'No binary model in {model_dir}'}))
+        sys.exit(1)
+    load_ms = (time.perf_counter() - start) * 1000
+    meta = read_binary_meta(model_dir)
+    print(json.dumps({
+        'success': True,
+        'model_dir': str(model_dir),
+        'dtype': meta['dtype'],
+        'gallery_size': meta['gallery_size'],
+        'students': len(meta['label_map']),
+        'size_mb': round(directory_size(model_dir) / (1024 * 1024), 2),
+        'load_ms': round(load_ms, 2),
+        'stale': is_stale(model_dir, args.model)
+    }))
@@ -5,172 +5,352 @@ import sys
 import json
 import pickle
 from pathlib import Path
+import glob
 import logging
 import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from cascade_detector import detect_faces_scaled, detect_faces_hinted, load_cascade, DEFAULT_MIN_FACE_RATIO
+from debug_sink import get_debug_sink, configure_debug_images
+from face_augmentation import FaceAugmenter
+from face_cache import FaceCache
+import frame_change
+from face_quality import assess_face, split_by_quality, passes, gate_enabled
+from face_preprocessing import get_preprocessor, load_image
+from face_tracker import FaceTracker
+import instrumentation
+from instrumentation import stage, collect_timings, count_result, write_prometheus
+from lbp_engine import NumpyLBPHRecognizer, predict_faces
+import model_registry
+from model_store import binary_model_dir, load_binary_model, export_opencv_model, is_stale
+from logging_setup import setup_logging
 
 # Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Rotation angles used to augment each training face
+TRAINING_ROTATIONS = [-7, -3, 3, 7]
+
+# Original, flipped and rotated copies of every training face
+TRAINING_AUGMENTER = FaceAugmenter(flip=True, rotations=TRAINING_ROTATIONS)
+
+# Cascade loaded once per training worker process
+_training_cascade = None
+
+def _init_training_worker(cascade_path):
+    """Load the cascade in a training worker process"""
+    global _training_cascade
+    _training_cascade = cv2.CascadeClassifier(cascade_path)
 
-def train_lbph_with_validated_faces():
-    """Train LBPH model using only the validated face images"""
+# Detection and preprocessing settings, part of the face cache key
+TRAINING_CACHE_PARAMS = {
+    'detector': 'haarcascade_frontalface_default',
+    'scaleFactor': 1.1,
+    'minNeighbors': 4,
+    'minSize': 30,
+    'maxSize': 400,
+    'min_face_ratio': DEFAULT_MIN_FACE_RATIO,
+    'size': 100,
+    'preprocess': 'equalizeHist',
+    'single_face': True
+}
+
+def augment_training_face(face_roi):
+    """Stack the original, flipped and rotated versions of a preprocessed face"""
+    return TRAINING_AUGMENTER.apply_one(face_roi)
+
+def _process_training_image(img_path):
+    """Detect, preprocess and augment one validated face image
+    
+    Returns (img_path, faces, box, num_detected) where faces is a stack of the
+    original, flipped and rotated 100x100 faces, or None if the image is skipped.
+    """
+    # Read image
+    img = cv2.imread(str(img_path))
+    if img is None:
+        return img_path, None, None, 0
+    
+    # Convert to grayscale
+    preprocessor = get_preprocessor('lbph')
+    gray = preprocessor.gray(img)
+    
+    # Detect face using the same cascade, on a downscaled copy for large images
+    faces = detect_faces_scaled(
+        gray,
+        _training_cascade,
+        scaleFactor=1.1,
+        minNeighbors=4,
+        minSize=(30, 30),
+        maxSize=(400, 400)
+    )
+    
+    if len(faces) != 1:
+        return img_path, None, None, len(faces)
+    
+    x, y, w, h = faces[0]
+    
+    # Preprocess
+    face_roi = preprocessor.face(gray, (x, y, w, h))
+    
+    # Debug output and the preprocessed face for verification (FACE_DEBUG_IMAGES)
+    debug_sink = get_debug_sink()
+    if debug_sink.wants('training'):
+        debug_img = img.copy()
+        cv2.rectangle(debug_img, (x, y), (x+w, y+h), (0, 255, 0), 2)
+        debug_sink.submit(img_path.parent / f'training_debug_{img_path.name}', debug_img)
+        debug_sink.submit(img_path.parent / f'prep_{img_path.name}', face_roi)
+    
+    return img_path, augment_training_face(face_roi), (x, y, w, h), 1
+
+def train_lbph_with_validated_faces(student_ids=None, workers=None, cache_augmented=False):
+    """Train LBPH model using only the validated face images
+    
+    With student_ids, only those students' faces are added to the existing
+    model with LBPH update() instead of retraining everyone. Images are
+    processed on a pool of worker processes. With cache_augmented the face
+    cache keeps every augmented variant instead of only the original face.
+    The result is written to a new model_registry version and published
+    once complete, the model in use is never modified.
+    """
     try:
-        # Get paths
+        # Get paths, an incremental update starts from the current version
         base_dir = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
         validated_dir = base_dir / 'validated_faces'
-        models_dir = base_dir / 'models'
-        model_path = models_dir / 'lbph_model_validated.yml'
-        labels_path = models_dir / 'labels_validated.pkl'
-        cascade_path = base_dir / 'assets' / 'haarcascade_frontalface_default.xml'
+        paths = get_model_paths()
+        model_path = paths['model']
+        labels_path = paths['labels']
+        cascade_path = paths['cascade']
         
         if not cascade_path.exists():
             return False, "Cascade file not found"
-            
-        # Create models directory if needed
-        models_dir.mkdir(exist_ok=True)
         
-        # Load face cascade
-        face_cascade = cv2.CascadeClassifier(str(cascade_path))
-        
-        # Initialize LBPH recognizer
-        recognizer = cv2.face.LBPHFaceRecognizer_create(
-            radius=1,        # Local binary patterns radius
-            neighbors=8,     # Number of points
-            grid_x=8,       # Grid size
-            grid_y=8,       # Grid size
-            threshold=80    # Slightly higher threshold for better known face detection
-        )
-        
-        # Initialize training data
-        face_images = []
-        face_labels = []
+        # Incremental training needs an existing model and only works for new students,
+        # LBPH can't drop the histograms of a student who is already enrolled
         labels = {}
-        next_label = 0
+        incremental = False
+        if student_ids:
+            student_ids = {str(s) for s in student_ids}
+            if model_path.exists() and labels_path.exists():
+                with open(labels_path, 'rb') as f:
+                    labels = pickle.load(f)
+                enrolled = student_ids & set(labels)
+                if enrolled:
+                    logger.warning(f"Students {sorted(enrolled)} are already enrolled - doing a full retrain")
+                    labels = {}
+                else:
+                    incremental = True
+            else:
+                logger.info("No existing model - doing a full retrain")
+        
+        next_label = max(labels.values()) + 1 if labels else 0
         
-        # Process each student directory
-        for student_dir in validated_dir.iterdir():
+        # Collect the images to process
+        if cache_augmented:
+            cache = FaceCache('validated_augmented',
+                              dict(TRAINING_CACHE_PARAMS, augmentation=TRAINING_AUGMENTER.config()),
+                              face_size=(TRAINING_AUGMENTER.num_variants, 100, 100))
+        else:
+            cache = FaceCache('validated', TRAINING_CACHE_PARAMS)
+        cached = []
+        jobs = []
+        for student_dir in sorted(validated_dir.iterdir()):
             if not student_dir.is_dir() or student_dir.name == 'random':
                 continue
                 
             student_id = student_dir.name.replace('student', '')
+            if incremental and student_id not in student_ids:
+                continue
             if student_id not in labels:
                 labels[student_id] = next_label
                 next_label += 1
             
             label = labels[student_id]
-            logging.info(f"Processing student {student_id} with label {label}")
+            logger.info(f"Processing student {student_id} with label {label}")
             
-            # Process each face image
-            face_count = 0
-            for img_path in student_dir.glob('face_*.jpg'):
+            for img_path in sorted(student_dir.glob('face_*.jpg')):
                 if 'debug' in img_path.name:
                     continue
                 
-                logging.info(f"Processing image: {img_path}")
-                
-                # Read image
-                img = cv2.imread(str(img_path))
-                if img is None:
-                    continue
-                
-                # Convert to grayscale
-                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                
-                # Detect face using the same cascade
-                faces = face_cascade.detectMultiScale(
-                    gray,
-                    scaleFactor=1.1,
-                    minNeighbors=4,
-                    minSize=(30, 30),
-                    maxSize=(400, 400)
-                )
+                # Unchanged images come straight from the face cache
+                key, face_roi, box = cache.lookup(student_dir.name, img_path)
+                if face_roi is not None:
+                    cached.append((student_id, label, face_roi))
+                elif box is None:
+                    jobs.append((student_id, student_dir.name, label, key, img_path))
+        
+        face_images = []
+        face_labels = []
+        face_counts = {}
+        
+        def add_faces(student_id, label, augmented):
+            face_images.extend(augmented)
+            face_labels.extend([label] * len(augmented))
+            face_counts[student_id] = face_counts.get(student_id, 0) + 1
+        
+        # Augment all cached faces in one batch, unless the cache already holds the variants
+        if cached:
+            faces = np.stack([face for _, _, face in cached])
+            if not cache_augmented:
+                faces = TRAINING_AUGMENTER.apply(faces)
+            for (student_id, label, _), augmented in zip(cached, faces):
+                add_faces(student_id, label, augmented)
+        
+        # Detect, preprocess and augment the remaining images on worker processes
+        if jobs:
+            workers = workers or os.cpu_count() or 1
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_training_worker,
+                                     initargs=(str(cascade_path),)) as pool:
+                results = pool.map(_process_training_image, [job[4] for job in jobs],
+                                   chunksize=max(1, len(jobs) // (workers * 4)))
                 
-                if len(faces) == 1:
-                    x, y, w, h = faces[0]
-                    face_roi = gray[y:y+h, x:x+w]
-                    
-                    # Debug output
-                    debug_img = img.copy()
-                    cv2.rectangle(debug_img, (x, y), (x+w, y+h), (0, 255, 0), 2)
-                    debug_path = img_path.parent / f'training_debug_{img_path.name}'
-                    cv2.imwrite(str(debug_path), debug_img)
-                    
-                    # Preprocess
-                    face_roi = cv2.resize(face_roi, (100, 100))
-                    face_roi = cv2.equalizeHist(face_roi)
-                    
-                    # Save preprocessed face for verification
-                    prep_path = img_path.parent / f'prep_{img_path.name}'
-                    cv2.imwrite(str(prep_path), face_roi)
-                    
-                    # Add original
-                    face_images.append(face_roi)
-                    face_labels.append(label)
-                    
-                    # Add flipped
-                    flipped = cv2.flip(face_roi, 1)
-                    face_images.append(flipped)
-                    face_labels.append(label)
-                    
-                    # Add rotated versions
-                    for angle in [-7, -3, 3, 7]:
-                        M = cv2.getRotationMatrix2D((50, 50), angle, 1)
-                        rotated = cv2.warpAffine(face_roi, M, (100, 100))
-                        face_images.append(rotated)
-                        face_labels.append(label)
-                    
-                    face_count += 1
-                    logging.info(f"Successfully processed face from {img_path.name}")
-                else:
-                    logging.warning(f"Found {len(faces)} faces in {img_path.name} - skipping")
-            
-            logging.info(f"Processed {face_count} faces for student {student_id}")
+                for (student_id, shard, label, key, _), (img_path, augmented, box, num_faces) in zip(jobs, results):
+                    if augmented is None:
+                        logger.warning(f"Found {num_faces} faces in {img_path.name} - skipping")
+                        cache.store(shard, key, None, None)
+                        continue
+                    cache.store(shard, key, augmented if cache_augmented else augmented[0], box)
+                    add_faces(student_id, label, augmented)
+        
+        cache.save()
+        
+        for student_id, face_count in face_counts.items():
+            logger.info(f"Processed {face_count} faces for student {student_id}")
         
         if not face_images:
             return False, "No valid face images found for training"
         
-        # Train model
-        logging.info(f"Training model with {len(face_images)} faces...")
-        recognizer.train(face_images, np.array(face_labels))
+        if incremental:
+            # Add the new students to the existing model
+            logger.info(f"Updating model with {len(face_images)} faces...")
+            recognizer = cv2.face.LBPHFaceRecognizer_create()
+            recognizer.read(str(model_path))
+            recognizer.update(face_images, np.array(face_labels))
+        else:
+            # Initialize LBPH recognizer
+            recognizer = cv2.face.LBPHFaceRecognizer_create(
+                radius=1,        # Local binary patterns radius
+                neighbors=8,     # Number of points
+                grid_x=8,       # Grid size
+                grid_y=8,       # Grid size
+                threshold=80    # Slightly higher threshold for better known face detection
+            )
+            
+            # Train model
+            logger.info(f"Training model with {len(face_images)} faces...")
+            recognizer.train(face_images, np.array(face_labels))
         
-        # Save model and labels
+        # Save model and labels into a new version, then switch the pointer to it
+        version_dir = model_registry.create_version()
+        model_path = version_dir / model_registry.MODEL_FILE
         recognizer.save(str(model_path))
-        with open(labels_path, 'wb') as f:
+        with open(version_dir / model_registry.LABELS_FILE, 'wb') as f:
             pickle.dump(labels, f)
+        # Binary copy the numpy backends memory-map instead of parsing the YAML
+        export_opencv_model(recognizer, labels, model_path)
+        model_registry.publish(version_dir.name)
+        model_registry.prune()
         
+        if incremental:
+            return True, f"Model updated with {len(face_images)} faces from {len(face_counts)} new students"
         return True, f"Model trained with {len(face_images)} faces from {len(labels)} students"
         
     except Exception as e:
-        logging.error(f"Error during training: {str(e)}")
+        logger.error(f"Error during training: {str(e)}")
         return False, str(e)
 
-def start_recognition():
-    """Start real-time face recognition using webcam"""
+def draw_recognition(display, box, label, confidence, labels_reverse):
+    """Draw one face's box, name and match quality, returns True if it was recognized"""
+    x, y, w, h = box
+
+    # Adaptive confidence thresholds based on face size and position
+    # Larger faces (closer to camera) can have slightly higher threshold
+    face_size_factor = min(1.2, max(0.8, (w * h) / (200 * 200)))
+    base_threshold = 75  # Base threshold for recognition
+    adaptive_threshold = base_threshold * face_size_factor
+
+    # The confidence is actually a distance - lower is better
+    # Convert to a more intuitive percentage where higher is better
+    confidence_percentage = max(0, min(100, 100 * (1 - confidence / 100)))
+
+    # Recognition with adaptive threshold
+    recognized = confidence < adaptive_threshold and label in labels_reverse
+    if recognized:
+        name = f"Student {labels_reverse[label]}"
+        color = (0, 255, 0)  # Green
+
+        # Add confidence level indicator with adjusted thresholds
+        if confidence < 50:
+            match_quality = "Excellent"
+            color = (0, 255, 0)  # Pure green for excellent
+        elif confidence < 65:
+            match_quality = "Good"
+            color = (0, 255, 100)  # Slightly different green for good
+        else:
+            match_quality = "Fair"
+            color = (0, 200, 100)  # More muted green for fair
+
+    else:
+        name = "Unknown"
+        match_quality = "No match"
+        confidence_percentage = 0
+        color = (0, 0, 255)  # Red
+
+    # Draw rectangle and name
+    cv2.rectangle(display, (x, y), (x+w, y+h), color, 2)
+
+    # Show name and match quality
+    text = f"{name} - {match_quality}"
+    cv2.putText(display, text, (x, y-10),
+              cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+    # Show confidence values
+    conf_text = f"Confidence: {confidence_percentage:.1f}%"
+    cv2.putText(display, conf_text, (x, y+h+20),
+              cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+    raw_text = f"Distance: {confidence:.1f}"
+    cv2.putText(display, raw_text, (x, y+h+40),
+              cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+    return recognized
+
+def draw_low_quality(display, box, reason=None):
+    """Mark a face that was not sent to the recognizer, it is retried on the next frame"""
+    x, y, w, h = (int(v) for v in box)
+    color = (0, 200, 255)  # Amber
+    cv2.rectangle(display, (x, y), (x+w, y+h), color, 2)
+    text = f"Low quality ({reason})" if reason else "Waiting for a clear face"
+    cv2.putText(display, text, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+def extract_face_rois(gray, boxes):
+    """(N, 100, 100) stack of the cropped, resized and equalized faces of an equalized frame"""
+    return get_preprocessor('lbph').faces(gray, boxes)
+
+def start_recognition(backend='opencv', track=False, detect_interval=5):
+    """Start real-time face recognition using webcam
+
+    With track=True the detector only runs every detect_interval frames (or
+    when a face is lost) and faces are followed in between by FaceTracker,
+    so each face is recognized once instead of on every frame.
+    """
     try:
-        # Get paths
-        base_dir = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        cascade_path = base_dir / 'assets' / 'haarcascade_frontalface_default.xml'
-        model_path = base_dir / 'models' / 'lbph_model_validated.yml'
-        labels_path = base_dir / 'models' / 'labels_validated.pkl'
-        
         # Check required files
-        if not cascade_path.exists():
+        paths = get_model_paths()
+        if not paths['cascade'].exists():
             print("Error: Face detection model not found")
             return
-        if not model_path.exists() or not labels_path.exists():
+        if not paths['model'].exists() or not paths['labels'].exists():
             print("Error: Recognition model not found. Please train the model first.")
             return
         
-        # Load face detection
-        face_cascade = cv2.CascadeClassifier(str(cascade_path))
-        
-        # Load recognition model
-        recognizer = cv2.face.LBPHFaceRecognizer_create()
-        recognizer.read(str(model_path))
-        
-        # Load labels
-        with open(labels_path, 'rb') as f:
-            labels_dict = pickle.load(f)
-        labels_reverse = {v: k for k, v in labels_dict.items()}
+        # Load face detection, recognition model and labels
+        models = load_recognition_models(backend)
+        face_cascade = models['face_cascade']
+        recognizer = models['recognizer']
+        labels_reverse = models['labels_reverse']
+        tracker = FaceTracker(detect_interval=detect_interval) if track else None
+        preprocessor = get_preprocessor('lbph')
         
         # Start video capture
         cap = cv2.VideoCapture(0)
@@ -189,79 +369,49 @@ def start_recognition():
             # Create copy for drawing
             display = frame.copy()
             
-            # Convert to grayscale
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            
-            # Apply histogram equalization
-            gray = cv2.equalizeHist(gray)
+            # Grayscale and histogram equalization, into a reused buffer
+            gray = preprocessor.frame(frame)
             
-            # Detect faces
-            faces = face_cascade.detectMultiScale(
-                gray,
-                scaleFactor=1.1,
-                minNeighbors=4,
-                minSize=(30, 30),
-                maxSize=(400, 400)
-            )
+            if tracker is None or tracker.should_detect():
+                # Detect faces on a downscaled copy, boxes are in full-resolution pixels
+                faces = detect_faces_scaled(
+                    gray,
+                    face_cascade,
+                    scaleFactor=1.1,
+                    minNeighbors=4,
+                    minSize=(30, 30),
+                    maxSize=(400, 400)
+                )
+            else:
+                faces = None
             
-            # Process each face
-            for (x, y, w, h) in faces:
-                # Extract and preprocess face region
-                face_roi = gray[y:y+h, x:x+w]
-                face_roi = cv2.resize(face_roi, (100, 100))
-                face_roi = cv2.equalizeHist(face_roi)
-                
-                # Predict
-                label, confidence = recognizer.predict(face_roi)
+            if tracker is None:
+                # Blurry, badly lit or turned faces are skipped before prediction
+                faces, skipped = split_by_quality(frame, faces)
+                for box, quality in skipped:
+                    draw_low_quality(display, box, quality['reason'])
                 
-                # Adaptive confidence thresholds based on face size and position
-                # Larger faces (closer to camera) can have slightly higher threshold
-                face_size_factor = min(1.2, max(0.8, (w * h) / (200 * 200)))
-                base_threshold = 75  # Base threshold for recognition
-                adaptive_threshold = base_threshold * face_size_factor
+                # Predict all faces of the frame together
+                predictions = predict_faces(recognizer, extract_face_rois(gray, faces))
+                for box, (label, confidence) in zip(faces, predictions):
+                    draw_recognition(display, box, label, confidence, labels_reverse)
+            else:
+                # Only new (or not yet recognized) faces of good enough quality go to the
+                # recognizer, the others stay pending until a clearer frame
+                pending = [t for t in tracker.update(gray, faces) if passes(frame, t.box)]
+                if pending:
+                    predictions = predict_faces(
+                        recognizer, extract_face_rois(gray, [t.box for t in pending]))
+                    for face_track, identity in zip(pending, predictions):
+                        face_track.identity = identity
                 
-                # The confidence is actually a distance - lower is better
-                # Convert to a more intuitive percentage where higher is better
-                confidence_percentage = max(0, min(100, 100 * (1 - confidence / 100)))
-                
-                # Recognition with adaptive threshold
-                if confidence < adaptive_threshold:
-                    name = f"Student {labels_reverse[label]}"
-                    color = (0, 255, 0)  # Green
-                    
-                    # Add confidence level indicator with adjusted thresholds
-                    if confidence < 50:
-                        match_quality = "Excellent"
-                        color = (0, 255, 0)  # Pure green for excellent
-                    elif confidence < 65:
-                        match_quality = "Good"
-                        color = (0, 255, 100)  # Slightly different green for good
-                    else:
-                        match_quality = "Fair"
-                        color = (0, 200, 100)  # More muted green for fair
-                        
-                else:
-                    name = "Unknown"
-                    match_quality = "No match"
-                    confidence_percentage = 0
-                    color = (0, 0, 255)  # Red
-                
-                # Draw rectangle and name
-                cv2.rectangle(display, (x, y), (x+w, y+h), color, 2)
-                
-                # Show name and match quality
-                text = f"{name} - {match_quality}"
-                cv2.putText(display, text, (x, y-10),
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-                
-                # Show confidence values
-                conf_text = f"Confidence: {confidence_percentage:.1f}%"
-                cv2.putText(display, conf_text, (x, y+h+20),
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-                
-                raw_text = f"Distance: {confidence:.1f}"
-                cv2.putText(display, raw_text, (x, y+h+40),
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+                for face_track in tracker.tracks:
+                    if face_track.identity is None:
+                        draw_low_quality(display, face_track.box)
+                        continue
+                    label, confidence = face_track.identity
+                    face_track.confirmed = draw_recognition(
+                        display, face_track.box, label, confidence, labels_reverse)
             
             # Show frame
             cv2.imshow('Face Recognition', display)
@@ -275,128 +425,360 @@ def start_recognition():
         cv2.destroyAllWindows()
         
     except Exception as e:
-        logging.error(f"Error during recognition: {str(e)}")
+        logger.error(f"Error during recognition: {str(e)}")
 
-def recognize_single_image(image_path):
-    """Recognize a single image and return the result"""
-    try:
-        # Get paths
-        base_dir = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        cascade_path = base_dir / 'assets' / 'haarcascade_frontalface_default.xml'
-        model_path = base_dir / 'models' / 'lbph_model_validated.yml'
-        labels_path = base_dir / 'models' / 'labels_validated.pkl'
-        
-        # Check required files
-        if not all(p.exists() for p in [cascade_path, model_path, labels_path]):
-            return {
+def get_model_paths():
+    """Return the cascade, model and label paths used for recognition
+    
+    The model and labels come from the current model_registry version, or
+    straight from models/ when nothing has been published yet.
+    """
+    base_dir = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    version = model_registry.current_version()
+    paths = {'cascade': base_dir / 'assets' / 'haarcascade_frontalface_default.xml', 'version': version}
+    paths.update(model_registry.version_paths(version))
+    return paths
+
+def load_recognition_models(backend='opencv'):
+    """Load the face cascade, LBPH model and label map so they can be reused
+    
+    backend='numpy' scores faces with the vectorized NumpyLBPHRecognizer
+    instead of cv2.face.LBPHFaceRecognizer, backend='indexed' also searches it
+    through a per-student GalleryIndex. Both memory-map the binary copy of
+    the model (model_store.py) when there is an up to date one.
+    """
+    paths = get_model_paths()
+    
+    # Load face detection
+    if not paths['cascade'].exists():
+        return None
+    face_cascade = cv2.CascadeClassifier(str(paths['cascade']))
+    
+    # Load recognition model and labels
+    binary_dir = binary_model_dir(paths['model'])
+    loaded = None
+    if backend in ('numpy', 'indexed') and not is_stale(binary_dir, paths['model']):
+        loaded = load_binary_model(binary_dir)
+    if loaded is not None:
+        recognizer, labels_dict = loaded
+    else:
+        if not (paths['model'].exists() and paths['labels'].exists()):
+            return None
+        if backend in ('numpy', 'indexed'):
+            recognizer = NumpyLBPHRecognizer()
+        else:
+            recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer.read(str(paths['model']))
+        with open(paths['labels'], 'rb') as f:
+            labels_dict = pickle.load(f)
+    if backend == 'indexed':
+        recognizer.build_index()
+    labels_reverse = {v: k for k, v in labels_dict.items()}
+    
+    return {
+        'face_cascade': face_cascade,
+        'recognizer': recognizer,
+        'labels_reverse': labels_reverse,
+        'version': paths['version']
+    }
+
+def find_largest_face(gray, face_cascade, prev_faces=None):
+    """(x, y, w, h) of the largest face in a preprocessed frame, or None"""
+    # Detect faces near the previous ones or on a downscaled copy,
+    # then crop from the full-resolution image
+    faces, _ = detect_faces_hinted(
+        gray,
+        face_cascade,
+        prev_faces,
+        scaleFactor=1.1,
+        minNeighbors=4,
+        minSize=(30, 30),
+        maxSize=(400, 400)
+    )
+    
+    if len(faces) == 0:
+        return None
+    
+    # Process the largest face if multiple faces are detected
+    return max(faces, key=lambda x: x[2] * x[3])  # Select largest face by area
+
+def detect_and_preprocess(img, face_cascade, prev_faces=None):
+    """Find the largest face and return (face_roi, face_location), or (None, error result)
+    
+    prev_faces are the face boxes of the previous frame; they are searched
+    first and the whole frame is only scanned if a face is not found there.
+    A face that fails the quality gate (blurry, badly exposed, too small or
+    turned away) is not preprocessed, the error result names the reason.
+    """
+    # Grayscale and histogram equalization
+    preprocessor = get_preprocessor('lbph')
+    with stage('color'):
+        raw = preprocessor.gray(img)
+    with stage('preprocess'):
+        gray = preprocessor.frame(raw)
+    
+    with stage('detect'):
+        box = find_largest_face(gray, face_cascade, prev_faces)
+    if box is None:
+        return None, {
+            'success': False,
+            'message': 'No face detected'
+        }
+    
+    # Get face location
+    x, y, w, h = box
+    face_location = {
+        'x': int(x),
+        'y': int(y),
+        'width': int(w),
+        'height': int(h)
+    }
+    
+    # Scored on the frame before equalization, which hides bad exposure
+    if gate_enabled():
+        with stage('quality'):
+            quality = assess_face(raw, box)
+        if not quality['passed']:
+            return None, {
                 'success': False,
-                'message': 'Required model files not found'
+                'message': f"Face quality too low ({quality['reason']})",
+                'face_location': face_location,
+                'quality': quality
             }
-        
-        # Load face detection
-        face_cascade = cv2.CascadeClassifier(str(cascade_path))
-        
-        # Load recognition model
-        recognizer = cv2.face.LBPHFaceRecognizer_create()
-        recognizer.read(str(model_path))
-        
-        # Load labels
-        with open(labels_path, 'rb') as f:
-            labels_dict = pickle.load(f)
-        labels_reverse = {v: k for k, v in labels_dict.items()}
+    
+    # Extract and preprocess face region
+    with stage('preprocess'):
+        face_roi = preprocessor.face(gray, (x, y, w, h))
+    
+    return face_roi, face_location
+
+def classify_face(face_roi, face_location, models):
+    """Run the LBPH prediction on a preprocessed face"""
+    recognizer = models['recognizer']
+    labels_reverse = models['labels_reverse']
+    
+    # Predict
+    with stage('predict'):
+        label, confidence = recognizer.predict(face_roi)
+    
+    # Convert confidence to percentage (0-100%)
+    confidence_percentage = max(0, min(100, 100 * (1 - confidence / 100)))
+    
+    # Determine if face is recognized
+    if confidence < 75:  # Using base threshold
+        student_id = labels_reverse[label]
+        return {
+            'success': True,
+            'student_id': student_id,  # Remove "Student " prefix
+            'confidence': confidence_percentage,
+            'face_location': face_location
+        }
+    else:
+        return {
+            'success': True,
+            'student_id': "Unknown",
+            'confidence': 0,
+            'face_location': face_location
+        }
+
+def recognize_image(img, models, prev_faces=None):
+    """Recognize the largest face in an already loaded image"""
+    face_roi, result = detect_and_preprocess(img, models['face_cascade'], prev_faces)
+    if face_roi is None:
+        return result
+    return classify_face(face_roi, result, models)
+
+def recognize_single_image(image_path, models=None, prev_faces=None, timings=False, session=None):
+    """Recognize a single image and return the result
+    
+    image_path can also be the encoded JPEG/PNG bytes, which are decoded in
+    memory. Pass models from load_recognition_models() to skip reloading them,
+    and the previous frame's face_location as prev_faces to search there first.
+    With timings=True the result includes a per-stage breakdown in milliseconds.
+    With a session (camera) id, a frame showing the same scene as that
+    session's last one gets the previous result back, marked 'cached'.
+    """
+    if timings:
+        with collect_timings() as stage_timings:
+            result = recognize_single_image(image_path, models, prev_faces, session=session)
+        result['timings'] = stage_timings
+        return result
+    
+    if session:
+        with stage('change'):
+            cached, signature = frame_change.cached_result('recognize', session, image_path)
+        if cached is not None:
+            count_result('recognize', cached)
+            return cached
+    
+    try:
+        if models is None:
+            models = load_recognition_models()
+            if models is None:
+                return {
+                    'success': False,
+                    'message': 'Required model files not found'
+                }
         
         # Read and process image
-        img = cv2.imread(image_path)
+        with stage('decode'):
+            img = load_image(image_path)
         if img is None:
-            return {
+            result = {
                 'success': False,
                 'message': 'Failed to load image'
             }
-        
-        # Convert to grayscale
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        # Apply histogram equalization
-        gray = cv2.equalizeHist(gray)
-        
-        # Detect faces
-        faces = face_cascade.detectMultiScale(
-            gray,
-            scaleFactor=1.1,
-            minNeighbors=4,
-            minSize=(30, 30),
-            maxSize=(400, 400)
-        )
-        
-        if len(faces) == 0:
-            return {
-                'success': False,
-                'message': 'No face detected'
-            }
-        
-        # Process the largest face if multiple faces are detected
-        if len(faces) > 1:
-            faces = [max(faces, key=lambda x: x[2] * x[3])]  # Select largest face by area
-        
-        # Get face location
-        x, y, w, h = faces[0]
-        face_location = {
-            'x': int(x),
-            'y': int(y),
-            'width': int(w),
-            'height': int(h)
-        }
-        
-        # Extract and preprocess face region
-        face_roi = gray[y:y+h, x:x+w]
-        face_roi = cv2.resize(face_roi, (100, 100))
-        face_roi = cv2.equalizeHist(face_roi)
-        
-        # Predict
-        label, confidence = recognizer.predict(face_roi)
-        
-        # Convert confidence to percentage (0-100%)
-        confidence_percentage = max(0, min(100, 100 * (1 - confidence / 100)))
-        
-        # Determine if face is recognized
-        if confidence < 75:  # Using base threshold
-            student_id = labels_reverse[label]
-            return {
-                'success': True,
-                'student_id': student_id,  # Remove "Student " prefix
-                'confidence': confidence_percentage,
-                'face_location': face_location
-            }
         else:
-            return {
-                'success': True,
-                'student_id': "Unknown",
-                'confidence': 0,
-                'face_location': face_location
-            }
+            result = recognize_image(img, models, prev_faces)
+            if session:
+                frame_change.remember('recognize', session, signature, result)
             
     except Exception as e:
-        logging.error(f"Recognition error: {str(e)}")
-        return {
+        logger.error(f"Recognition error: {str(e)}")
+        result = {
             'success': False,
             'message': str(e)
         }
+    count_result('recognize', result)
+    return result
+
+def iter_image_paths(source):
+    """Expand a directory, a glob pattern or '-' (paths on stdin) into image paths"""
+    if source == '-':
+        for line in sys.stdin:
+            line = line.strip()
+            if line:
+                yield line
+    elif os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.lower().endswith(('.jpg', '.jpeg', '.png')):
+                yield os.path.join(source, name)
+    else:
+        yield from sorted(glob.glob(source))
+
+def recognize_batch(image_paths, models=None, workers=None):
+    """Recognize many images with the models loaded once
+    
+    Decoding, detection and preprocessing run on a thread pool (OpenCV releases
+    the GIL), prediction runs on the calling thread. Results are yielded in input
+    order as soon as they are ready.
+    """
+    if models is None:
+        models = load_recognition_models()
+        if models is None:
+            yield {
+                'success': False,
+                'message': 'Required model files not found'
+            }
+            return
+    
+    # CascadeClassifier is not safe to share between threads, load_cascade keeps one per worker
+    cascade_path = str(get_model_paths()['cascade'])
+    
+    def prepare(image_path):
+        with stage('decode'):
+            img = cv2.imread(image_path)
+        if img is None:
+            return None, {
+                'success': False,
+                'message': 'Failed to load image'
+            }
+        return detect_and_preprocess(img, load_cascade(cascade_path))
+    
+    workers = workers or os.cpu_count() or 1
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        paths = iter(image_paths)
+        while True:
+            # Keep a bounded window of work in flight so stdin input streams
+            while len(pending) < workers * 4:
+                image_path = next(paths, None)
+                if image_path is None:
+                    break
+                pending.append((image_path, pool.submit(prepare, image_path)))
+            if not pending:
+                break
+            
+            image_path, future = pending.popleft()
+            try:
+                face_roi, result = future.result()
+                if face_roi is not None:
+                    result = classify_face(face_roi, result, models)
+            except Exception as e:
+                logger.error(f"Recognition error for {image_path}: {str(e)}")
+                result = {
+                    'success': False,
+                    'message': str(e)
+                }
+            result['image_path'] = image_path
+            count_result('recognize', result)
+            yield result
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Face Recognition System')
     parser.add_argument('--train', action='store_true', help='Train the model')
+    parser.add_argument('--batch', metavar='SOURCE',
+                        help="Recognize a directory, a glob pattern or '-' for paths on stdin")
+    parser.add_argument('--student', action='append', dest='students', metavar='ID',
+                        help='With --train, add only this new student to the existing model (repeatable)')
+    parser.add_argument('--cache-augmented', action='store_true',
+                        help='With --train, keep the augmented faces in the face cache too')
+    parser.add_argument('--workers', type=int, help='Worker threads/processes for --batch and --train (default: CPU count)')
+    parser.add_argument('--backend', choices=['opencv', 'numpy', 'indexed'], default='opencv',
+                        help='Recognizer used to score faces')
+    parser.add_argument('--track', action='store_true',
+                        help='Webcam mode: detect every few frames and track faces in between')
+    parser.add_argument('--detect-interval', type=int, default=5,
+                        help='With --track, frames between detector runs (default: 5)')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Webcam mode: run capture, detection, recognition and display on separate threads')
+    parser.add_argument('--prev-faces', metavar='JSON',
+                        help="With image_path, face box(es) from the previous frame to search first")
+    parser.add_argument('--timings', action='store_true',
+                        help="With image_path, add per-stage timings (ms) to the result")
+    parser.add_argument('--metrics-file', metavar='PATH',
+                        help='Write stage histograms and result counters of this run as a Prometheus textfile')
+    parser.add_argument('--debug-images', type=int, metavar='N',
+                        help='Write training_debug_/prep_ images for 1 in N faces (default: none)')
+    parser.add_argument('--stdin', action='store_true',
+                        help='Recognize the JPEG/PNG bytes read from stdin instead of image_path')
     parser.add_argument('image_path', nargs='?', help='Path to image for recognition')
     args = parser.parse_args()
+    if args.debug_images is not None:
+        configure_debug_images(args.debug_images)
+    if args.metrics_file:
+        instrumentation.enable()
 
-    if args.train:
-        success, message = train_lbph_with_validated_faces()
-        if not success:
-            logging.error(f"Training failed: {message}")
-            sys.exit(1)
-        logging.info(f"Training successful: {message}")
-        sys.exit(0)
-    elif args.image_path:
-        result = recognize_single_image(args.image_path)
-        print(json.dumps(result))
-    else:
-        start_recognition() 
\ No newline at end of file
+    try:
+        if args.train:
+            success, message = train_lbph_with_validated_faces(args.students, workers=args.workers,
+                                                               cache_augmented=args.cache_augmented)
+            if not success:
+                logger.error(f"Training failed: {message}")
+                sys.exit(1)
+            logger.info(f"Training successful: {message}")
+            sys.exit(0)
+        elif args.batch:
+            # One JSON result per line
+            models = load_recognition_models(args.backend)
+            for result in recognize_batch(iter_image_paths(args.batch), models=models, workers=args.workers):
+                with stage('serialize'):
+                    line = json.dumps(result)
+                print(line, flush=True)
+        elif args.image_path or args.stdin:
+            # With --stdin the image never touches the disk
+            image = sys.stdin.buffer.read() if args.stdin else args.image_path
+            result = recognize_single_image(image, models=load_recognition_models(args.backend),
+                                            prev_faces=args.prev_faces, timings=args.timings)
+            with stage('serialize'):
+                output = json.dumps(result)
+            print(output)
+        elif args.pipeline:
+            from video_pipeline import run_pipeline
+            run_pipeline(args.backend, track=args.track, detect_interval=args.detect_interval)
+        else:
+            start_recognition(args.backend, track=args.track, detect_interval=args.detect_interval)
+    finally:
+        # Also after --train, which exits with its status code
+        if args.metrics_file:
+            write_prometheus(args.metrics_file)
@@ -0,0 +1,329 @@
+import os
+import sys
+import json
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import request as urlrequest
+from urllib import error as urlerror
+from urllib.parse import urlsplit, parse_qs, urlencode
+
+from realtime_recognition import load_recognition_models, recognize_single_image
+from detect_face import detect_faces
+from cascade_detector import parse_face_boxes, load_cascade
+from model_registry import ModelReloader
+from attendance_store import get_attendance_store, DEBOUNCE_SECONDS
+from attendance_writer import get_attendance_writer
+import instrumentation
+from instrumentation import stage, render_prometheus
+from logging_setup import setup_logging
+
+# Configure logging
+setup_logging()
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Largest raw image body accepted, a webcam JPEG is a few hundred KB
+MAX_IMAGE_BYTES = 16 * 1024 * 1024
+
+# Request handler threads. They are kept alive, so per-thread cascades and
+# preprocessing buffers are reused across requests.
+DEFAULT_WORKERS = min(8, os.cpu_count() or 4)
+
+class LockedRecognizer:
+    """cv2.face.LBPHFaceRecognizer shared between threads, one prediction at a time"""
+
+    def __init__(self, recognizer):
+        self.recognizer = recognizer
+        self.lock = threading.Lock()
+
+    def predict(self, face):
+        with self.lock:
+            return self.recognizer.predict(face)
+
+class RecognitionService:
+    """Keeps the cascade, LBPH model and labels loaded between requests
+    
+    A newly published model version is loaded in the background and swapped
+    in between requests (see model_registry.ModelReloader). Requests run
+    concurrently: every handler thread detects with its own cascade
+    (cascade_detector.load_cascade), the NumPy recognizers are read-only and
+    only the cv2 LBPH recognizer is serialized.
+    """
+
+    def __init__(self, backend='opencv'):
+        self.reloader = ModelReloader(lambda: self._shareable(load_recognition_models(backend)))
+
+    @staticmethod
+    def _shareable(models):
+        if models is not None and not hasattr(models['recognizer'], 'predict_batch'):
+            models['recognizer'] = LockedRecognizer(models['recognizer'])
+        return models
+
+    @property
+    def models(self):
+        return self.reloader.get()
+
+    def recognize(self, image_path, prev_faces=None, timings=False, session=None):
+        # Taken once, so the whole request uses one version
+        models = self.models
+        if models is None:
+            return {'success': False, 'message': 'Required model files not found'}
+        # The shared cascade is swapped for this thread's own
+        models = dict(models, face_cascade=load_cascade())
+        return recognize_single_image(image_path, models=models, prev_faces=prev_faces,
+                                      timings=timings, session=session)
+
+    def detect(self, image_path, prev_faces=None, timings=False, session=None):
+        return detect_faces(image_path, face_cascade=load_cascade(), prev_faces=prev_faces,
+                            timings=timings, session=session)
+
+    def mark_attendance(self, payload):
+        """Mark a student unless debounced, with the records added since the client's cursor"""
+        if not payload.get('student_id'):
+            return {'success': False, 'message': 'No student id provided'}
+        store = get_attendance_store()
+        result = store.mark(payload['student_id'], payload.get('name'), payload.get('confidence'),
+                            float(payload.get('debounce', DEBOUNCE_SECONDS)), time_text=payload.get('time'))
+        records, cursor = store.records_since(payload.get('cursor') or 0, payload.get('limit') or 50)
+        return dict(result, success=True, records=records, cursor=cursor)
+
+    def mark_class_attendance(self, payload):
+        """Queue a tblattendance mark for the batched writer"""
+        if not all(payload.get(key) for key in ('studentID', 'course', 'unit')):
+            return {'success': False, 'message': 'studentID, course and unit are required'}
+        writer = get_attendance_writer()
+        if writer is None:
+            return {'success': False, 'message': 'Attendance database not available'}
+        queued = writer.submit(payload['studentID'], payload['course'], payload['unit'],
+                               payload.get('attendanceStatus') or 'Present', payload.get('confidence'),
+                               payload.get('date'))
+        return {'success': True, 'queued': queued}
+
+    def attendance(self, cursor=None, limit=50):
+        """Records after cursor, or the newest ones without a cursor"""
+        store = get_attendance_store()
+        if cursor is None:
+            records, cursor = store.recent(limit)
+        else:
+            records, cursor = store.records_since(cursor, limit)
+        return {'success': True, 'records': records, 'cursor': cursor}
+
+class RecognitionRequestHandler(BaseHTTPRequestHandler):
+    """Serves POST /recognize and POST /detect with a JSON {"image_path": ...} body
+    
+    An optional "prev_faces" list (boxes from the previous frame) is passed on
+    as a detection hint, and "timings": true adds the per-stage breakdown to
+    the result. The image can also be posted as the raw body (Content-Type
+    image/jpeg, image/png or application/octet-stream), with prev_faces and
+    timings in the query string; it is decoded in memory, never written to disk.
+    GET /metrics exports the stage histograms for Prometheus.
+
+    Attendance: POST /attendance/mark with {"student_id", "name",
+    "confidence", "time", "cursor"} and GET /attendance?cursor=N&limit=M.
+    POST /attendance/class queues a tblattendance mark ({"studentID",
+    "course", "unit", ...}) for the batched database writer.
+    """
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/attendance':
+            query = parse_qs(url.query)
+            try:
+                cursor = int(query['cursor'][0]) if 'cursor' in query else None
+                limit = int(query.get('limit', ['50'])[0])
+            except ValueError:
+                self.send_json({'success': False, 'message': 'Invalid cursor or limit'}, status=400)
+                return
+            self.send_json(self.server.service.attendance(cursor, limit))
+        elif self.path == '/health':
+            service = self.server.service
+            self.send_json({'success': True, 'models_loaded': service.models is not None,
+                            'model_version': service.reloader.version})
+        elif self.path == '/metrics':
+            body = render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_json({'success': False, 'message': 'Not found'}, status=404)
+
+    def do_POST(self):
+        attendance_handlers = {
+            '/attendance/mark': self.server.service.mark_attendance,
+            '/attendance/class': self.server.service.mark_class_attendance
+        }
+        if self.path in attendance_handlers:
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                self.send_json(attendance_handlers[self.path](payload))
+            except Exception as e:
+                logger.error(f"Attendance error: {str(e)}")
+                self.send_json({'success': False, 'message': str(e)}, status=500)
+            return
+
+        handlers = {
+            '/recognize': self.server.service.recognize,
+            '/detect': self.server.service.detect
+        }
+        url = urlsplit(self.path)
+        handler = handlers.get(url.path)
+        if handler is None:
+            self.send_json({'success': False, 'message': 'Not found'}, status=404)
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            content_type = self.headers.get('Content-Type', '').split(';')[0].strip().lower()
+            if content_type.startswith('image/') or content_type == 'application/octet-stream':
+                # Raw image bytes, options in the query string
+                if length <= 0 or length > MAX_IMAGE_BYTES:
+                    self.send_json({'success': False, 'message': 'Missing or oversized image body'}, status=400)
+                    return
+                query = parse_qs(url.query)
+                image = self.rfile.read(length)
+                prev_faces = query.get('prev_faces', [None])[0]
+                timings = query.get('timings', ['0'])[0] not in ('', '0', 'false')
+                session = query.get('session', [None])[0]
+            else:
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                image = payload.get('image_path')
+                prev_faces = payload.get('prev_faces')
+                timings = bool(payload.get('timings'))
+                session = payload.get('session')
+                if not image:
+                    self.send_json({'success': False, 'message': 'No image path provided'}, status=400)
+                    return
+            self.send_json(handler(image, prev_faces, timings, session))
+        except Exception as e:
+            logger.error(f"Request error: {str(e)}")
+            self.send_json({'success': False, 'message': str(e)}, status=500)
+
+    def send_json(self, result, status=200):
+        with stage('serialize'):
+            body = json.dumps(result).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Per-request access lines are too noisy for the kiosk
+        pass
+
+class PooledHTTPServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer that hands requests to a fixed pool of worker threads"""
+
+    def __init__(self, server_address, handler_class, workers=DEFAULT_WORKERS):
+        super().__init__(server_address, handler_class)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='recognition')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+def make_server(host=DEFAULT_HOST, port=DEFAULT_PORT, backend='opencv', workers=DEFAULT_WORKERS):
+    """HTTP server with the models loaded, port=0 picks a free port"""
+    # The server always aggregates metrics for GET /metrics
+    instrumentation.enable()
+    service = RecognitionService(backend)
+    if service.models is None:
+        logger.warning("Recognition model not found - /recognize will fail until the model is trained")
+
+    server = PooledHTTPServer((host, port), RecognitionRequestHandler, workers)
+    server.service = service
+    return server
+
+def run_server(host=DEFAULT_HOST, port=DEFAULT_PORT, backend='opencv', workers=DEFAULT_WORKERS):
+    """Load the models once and serve detect/recognize requests on localhost"""
+    server = make_server(host, port, backend, workers)
+    logger.info(f"Recognition server listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def request_service(endpoint, image_path, host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=10, prev_faces=None,
+                    timings=False, session=None):
+    """Send a request to a running server, returns None if it is not reachable
+    
+    image_path can also be the encoded image bytes, which are posted as the
+    request body instead of a path. Requests with a session (camera) id get
+    the session's last result back while the scene does not change.
+    """
+    if isinstance(image_path, (bytes, bytearray)):
+        query = {}
+        if prev_faces:
+            query['prev_faces'] = json.dumps(parse_face_boxes(prev_faces))
+        if timings:
+            query['timings'] = '1'
+        if session:
+            query['session'] = session
+        url = f'http://{host}:{port}/{endpoint}' + (f'?{urlencode(query)}' if query else '')
+        req = urlrequest.Request(url, data=bytes(image_path), headers={'Content-Type': 'image/jpeg'})
+    else:
+        payload = {'image_path': os.path.abspath(image_path)}
+        if prev_faces:
+            payload['prev_faces'] = parse_face_boxes(prev_faces)
+        if timings:
+            payload['timings'] = True
+        if session:
+            payload['session'] = session
+        req = urlrequest.Request(
+            f'http://{host}:{port}/{endpoint}',
+            data=json.dumps(payload).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}
+        )
+    try:
+        with urlrequest.urlopen(req, timeout=timeout) as response:
+            return json.loads(response.read())
+    except urlerror.HTTPError as e:
+        return json.loads(e.read())
+    except (urlerror.URLError, ConnectionError, TimeoutError):
+        return None
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Resident face recognition server')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='Address to bind/connect to')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to bind/connect to')
+    parser.add_argument('--backend', choices=['opencv', 'numpy', 'indexed'], default='opencv',
+                        help='Recognizer used to score faces')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Request handler threads')
+    parser.add_argument('--client', choices=['recognize', 'detect'],
+                        help='Send one request to a running server instead of starting one')
+    parser.add_argument('--prev-faces', metavar='JSON', help='Client mode: face boxes from the previous frame')
+    parser.add_argument('--timings', action='store_true', help='Client mode: add per-stage timings to the result')
+    parser.add_argument('--stdin', action='store_true', help='Client mode: send the image bytes read from stdin')
+    parser.add_argument('--session', help='Client mode: camera session id, unchanged frames reuse its last result')
+    parser.add_argument('image_path', nargs='?', help='Image path for client mode')
+    args = parser.parse_args()
+
+    if args.client:
+        if not args.image_path and not args.stdin:
+            print(json.dumps({'success': False, 'message': 'No image path provided'}))
+            sys.exit(1)
+        image = sys.stdin.buffer.read() if args.stdin else args.image_path
+        result = request_service(args.client, image, args.host, args.port, prev_faces=args.prev_faces,
+                                 timings=args.timings, session=args.session)
+        if result is None:
+            # Server is down - fall back to loading the models in this process
+            if args.client == 'recognize':
+                result = recognize_single_image(image, prev_faces=args.prev_faces, timings=args.timings)
+            else:
+                result = detect_faces(image, prev_faces=args.prev_faces, timings=args.timings)
+        print(json.dumps(result))
+    else:
+        run_server(args.host, args.port, args.backend, max(1, args.workers))
@@ -0,0 +1,86 @@
+import json
+import tempfile
+from pathlib import Path
+from attendance_store import AttendanceStore
+
+NOW = 1_750_000_000.0
+
+def make_store():
+    """Store on a fresh database, and the directory it lives in"""
+    directory = Path(tempfile.mkdtemp())
+    return AttendanceStore(directory / 'attendance.db'), directory
+
+def test_debounce_across_store_instances():
+    """A second store on the same database (another process) sees the first one's marks"""
+    first, directory = make_store()
+    second = AttendanceStore(directory / 'attendance.db')
+    assert first.mark('45', 'Asha', 61.0, debounce=5, now=NOW)['marked']
+
+    # second's in-memory index is stale, the check inside the transaction catches it
+    repeat = second.mark('45', 'Asha', 70.0, debounce=5, now=NOW + 2)
+    assert not repeat['marked']
+    assert repeat['wait'] == 3.0
+    assert second.last_seen('45') == NOW
+
+    assert second.mark('45', 'Asha', 70.0, debounce=5, now=NOW + 5)['marked']
+    assert first.count() == 2
+    print("✓ debounce holds across store instances")
+
+def test_records_since_pages_by_cursor():
+    store, _ = make_store()
+    for student in range(7):
+        store.mark(str(student), f'Student {student}', now=NOW + student)
+
+    records, cursor = store.records_since(0, limit=3)
+    assert [r['student_id'] for r in records] == ['0', '1', '2']
+    records, cursor = store.records_since(cursor, limit=3)
+    assert [r['student_id'] for r in records] == ['3', '4', '5']
+    records, cursor = store.records_since(cursor, limit=3)
+    assert [r['student_id'] for r in records] == ['6']
+
+    # Nothing new: the cursor stays put and later records are still found
+    records, same = store.records_since(cursor)
+    assert records == [] and same == cursor
+    store.mark('7', 'Student 7', now=NOW + 7)
+    records, _ = store.records_since(cursor)
+    assert [r['student_id'] for r in records] == ['7']
+    print("✓ records paged by cursor")
+
+def test_cursor_past_the_end_is_clamped():
+    """A cursor from another database must not hide the records added after it"""
+    store, _ = make_store()
+    store.mark('45', 'Asha', now=NOW)
+    records, cursor = store.records_since(1000)
+    assert records == [] and cursor == 1
+    store.mark('99', 'Ravi', now=NOW + 1)
+    records, _ = store.records_since(cursor)
+    assert [r['student_id'] for r in records] == ['99']
+    print("✓ cursor past the end clamped to the last record")
+
+def test_migrate_json_runs_once():
+    store, directory = make_store()
+    json_path = directory / 'attendance.json'
+    with open(json_path, 'w') as f:
+        json.dump([
+            {'student_id': '45', 'name': 'Asha', 'time': '2025-05-23 09:00:00', 'confidence': 61.0},
+            {'student_id': '99', 'name': 'Ravi', 'time': '2025-05-23 09:01:00', 'confidence': 55.0}
+        ], f)
+
+    assert store.migrate_json(json_path) == 2
+    assert not json_path.exists()
+    assert (directory / 'attendance.json.migrated').exists()
+    assert store.last_seen('99') is not None
+
+    # A new file (or another store on the same database) is not imported again
+    with open(json_path, 'w') as f:
+        json.dump([{'student_id': '7', 'name': 'Late', 'time': '2025-05-23 10:00:00'}], f)
+    assert AttendanceStore(directory / 'attendance.db').migrate_json(json_path) == 0
+    assert store.count() == 2
+    assert json_path.exists()
+    print("✓ attendance.json imported once and renamed")
+
+if __name__ == '__main__':
+    test_debounce_across_store_instances()
+    test_records_since_pages_by_cursor()
+    test_cursor_past_the_end_is_clamped()
+    test_migrate_json_runs_once()
@@ -0,0 +1,141 @@
+import os
+import time
+import sqlite3
+import tempfile
+from attendance_writer import AttendanceWriter, sqlite_connection
+
+DAY = '2025-05-23'
+
+def make_writer(**kwargs):
+    """Writer on a fresh SQLite stand-in for the attendance database"""
+    path = os.path.join(tempfile.mkdtemp(), 'attendance.db')
+    kwargs.setdefault('background', False)
+    return AttendanceWriter(sqlite_connection(path), 'sqlite', **kwargs), path
+
+def rows(path):
+    conn = sqlite3.connect(path)
+    result = conn.execute('SELECT studentRegistrationNumber, course, unit, attendanceStatus, dateMarked, confidence '
+                          'FROM tblattendance ORDER BY studentRegistrationNumber').fetchall()
+    conn.close()
+    return result
+
+def test_repeated_sightings_write_one_row():
+    """A student seen on every frame becomes one row in one statement"""
+    writer, path = make_writer()
+    assert writer.submit('45', 'BCA', 'AI', confidence=40.0, day=DAY)
+    for confidence in [55.0, 48.0, 61.0]:
+        assert not writer.submit('45', 'BCA', 'AI', confidence=confidence, day=DAY)
+    assert writer.flush() == 1
+    assert rows(path) == [('45', 'BCA', 'AI', 'Present', DAY, 61.0)]
+    assert writer.stats['statements'] == 1
+    assert writer.stats['deduplicated'] == 3
+    print("✓ repeated sightings are merged before the database")
+
+def test_written_marks_are_not_resent():
+    """Once a mark is written as Present, later sightings never reach the database"""
+    writer, path = make_writer()
+    writer.submit('45', 'BCA', 'AI', day=DAY)
+    writer.flush()
+    assert not writer.submit('45', 'BCA', 'AI', day=DAY)
+    assert writer.flush() == 0
+    assert writer.stats['statements'] == 1
+    print("✓ written marks are deduplicated for the session")
+
+def test_batch_is_one_multi_row_statement():
+    """A burst of different students is written with one statement per max_batch rows"""
+    writer, path = make_writer(max_batch=50)
+    for student in range(120):
+        writer.submit(str(student), 'BCA', 'AI', day=DAY)
+    assert writer.flush() == 120
+    assert len(rows(path)) == 120
+    assert writer.stats['statements'] == 3
+    print("✓ 120 marks written with 3 statements")
+
+def test_absent_is_upgraded_present_is_kept():
+    """Like update_attendance.php, only an Absent mark is changed"""
+    writer, path = make_writer()
+    writer.submit('45', 'BCA', 'AI', status='Absent', day=DAY)
+    writer.submit('99', 'BCA', 'AI', status='Present', day=DAY)
+    writer.flush()
+
+    # A second session (e.g. after a restart) has no memory of the first
+    second = AttendanceWriter(sqlite_connection(path), 'sqlite', background=False)
+    second.submit('45', 'BCA', 'AI', status='Present', day=DAY)
+    second.submit('99', 'BCA', 'AI', status='Absent', day=DAY)
+    second.flush()
+    assert [row[3] for row in rows(path)] == ['Present', 'Present']
+    print("✓ Absent upgraded to Present, Present never downgraded")
+
+def test_marks_are_kept_per_course_unit_and_day():
+    writer, path = make_writer()
+    writer.submit('45', 'BCA', 'AI', day=DAY)
+    writer.submit('45', 'BCA', 'DB', day=DAY)
+    writer.submit('45', 'BCA', 'AI', day='2025-05-24')
+    assert writer.flush() == 3
+    assert len(rows(path)) == 3
+    print("✓ separate rows per course, unit and day")
+
+def test_background_flush():
+    """Marks reach the database within the flush interval without calling flush()"""
+    writer, path = make_writer(background=True, flush_interval=0.05)
+    writer.submit('45', 'BCA', 'AI', day=DAY)
+    deadline = time.time() + 2
+    while not rows(path) and time.time() < deadline:
+        time.sleep(0.02)
+    writer.close()
+    assert len(rows(path)) == 1
+    print("✓ background thread flushes on its interval")
+
+def test_failed_flush_keeps_marks():
+    """Marks survive a failed write and go out with the next flush"""
+    writer, path = make_writer()
+    writer.submit('45', 'BCA', 'AI', day=DAY)
+    writer.connection.execute('ALTER TABLE tblattendance RENAME TO tblattendance_away')
+    assert writer.flush() == 0
+    assert writer.stats['errors'] == 1
+    writer.connection.execute('ALTER TABLE tblattendance_away RENAME TO tblattendance')
+    assert writer.flush() == 1
+    assert len(rows(path)) == 1
+    print("✓ failed flush retried")
+
+class DroppedConnection:
+    """A connection the server has closed: every call fails, rollback included"""
+
+    def cursor(self):
+        raise ConnectionError("Lost connection to MySQL server")
+
+    rollback = commit = cursor
+
+    def close(self):
+        pass
+
+def test_dropped_connection_reconnects():
+    """A dead connection neither loses marks nor stops the background thread"""
+    path = os.path.join(tempfile.mkdtemp(), 'attendance.db')
+    sqlite_connection(path).close()
+    writer = AttendanceWriter(DroppedConnection(), 'sqlite', flush_interval=0.05,
+                              connect=lambda: sqlite_connection(path))
+    writer.submit('45', 'BCA', 'AI', day=DAY)
+    deadline = time.time() + 2
+    while writer.stats['errors'] == 0 and time.time() < deadline:
+        time.sleep(0.02)
+    assert writer.stats['errors'] == 1
+    assert writer.thread.is_alive()
+
+    # The next flush runs on a fresh connection and writes the kept mark with the new one
+    writer.submit('99', 'BCA', 'AI', day=DAY)
+    while len(rows(path)) < 2 and time.time() < deadline:
+        time.sleep(0.02)
+    writer.close()
+    assert [row[0] for row in rows(path)] == ['45', '99']
+    print("✓ dropped connection replaced, no marks lost")
+
+if __name__ == '__main__':
+    test_repeated_sightings_write_one_row()
+    test_written_marks_are_not_resent()
+    test_batch_is_one_multi_row_statement()
+    test_absent_is_upgraded_present_is_kept()
+    test_marks_are_kept_per_course_unit_and_day()
+    test_background_flush()
+    test_failed_flush_keeps_marks()
+    test_dropped_connection_reconnects()
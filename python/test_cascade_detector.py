@@ -0,0 +1,88 @@
+import cv2
+import math
+import numpy as np
+from pathlib import Path
+from cascade_detector import (detect_faces_hinted, detect_faces_scaled, detection_scale, load_cascade,
+                              box_iou, DETECTION_MIN_FACE)
+
+TEST_DIR = Path(__file__).resolve().parent.parent / 'test_images'
+
+# Detection settings every caller uses
+PARAMS = {'scaleFactor': 1.1, 'minNeighbors': 4, 'minSize': (30, 30), 'maxSize': (400, 400)}
+
+def gray_image(path):
+    return cv2.equalizeHist(cv2.cvtColor(cv2.imread(str(path)), cv2.COLOR_BGR2GRAY))
+
+def test_downscaled_scan_finds_the_full_resolution_faces():
+    """At the default ratio a 1080p frame is downscaled and its faces are still found"""
+    face_cascade = load_cascade()
+    for name in ['random1.jpg', 'random3.jpg']:
+        gray = gray_image(TEST_DIR / name)
+        assert detection_scale(gray.shape, PARAMS['minSize']) > 1.0
+        full = face_cascade.detectMultiScale(gray, **PARAMS).tolist()
+        scaled = detect_faces_scaled(gray, face_cascade, **PARAMS).tolist()
+        assert len(full) == 2
+        # Boxes shift by a few pixels at the other resolution
+        for box in full:
+            assert any(box_iou(box, other) > 0.7 for other in scaled), f"{name}: {box} not in {scaled}"
+    print("✓ downscaled scan finds the full-resolution faces")
+
+def test_smallest_face_covers_the_cascade_window():
+    """The pyramid level is picked so minSize still spans the cascade's 24px window"""
+    for min_side in [30, 45, 60, 100, 200]:
+        for shape in [(480, 640), (1080, 1920), (2160, 3840)]:
+            scale = detection_scale(shape, (min_side, min_side), min_face_ratio=None)
+            assert min_side / scale >= 24
+            assert min_side / scale >= DETECTION_MIN_FACE or scale == 1.0
+            # With a ratio, the face it expects spans the cascade window instead
+            scale = detection_scale(shape, (min_side, min_side), min_face_ratio=0.04)
+            assert max(min_side, 0.04 * shape[0]) / scale >= DETECTION_MIN_FACE
+    # The usual minSize keeps full resolution without a ratio, and webcam frames with one
+    assert detection_scale((2160, 3840), (30, 30), min_face_ratio=None) == 1.0
+    assert detection_scale((480, 640), (30, 30), min_face_ratio=0.04) == 1.0
+    print("✓ smallest face never shrinks below the cascade window")
+
+def test_faces_near_max_size_are_kept():
+    """maxSize on the downscaled image still reaches maxSize at full resolution"""
+    for min_side in [45, 60, 100, 200]:
+        for max_side in [300, 400, 401]:
+            scale = detection_scale((1080, 1920), (min_side, min_side))
+            # Same rounding as detect_faces_scaled
+            assert math.ceil(max_side / scale * 1.1) * scale >= max_side * 1.1
+    print("✓ maxSize rounded up on the downscaled image")
+
+def test_hinted_boxes_stay_put():
+    """Boxes fed back as hints come back as the full-scan boxes, round after round"""
+    face_cascade = load_cascade()
+    gray = gray_image(TEST_DIR / 'random1.jpg')
+    full = sorted(face_cascade.detectMultiScale(gray, **PARAMS).tolist())
+    assert len(full) == 2
+    boxes = full
+    for _ in range(5):
+        found, hinted = detect_faces_hinted(gray, face_cascade, boxes, **PARAMS)
+        boxes = sorted(found.tolist())
+        assert hinted
+        assert boxes == full
+    print("✓ hinted boxes equal the full-scan boxes over several rounds")
+
+def test_hinted_box_follows_a_moved_face():
+    face_cascade = load_cascade()
+    gray = gray_image(TEST_DIR / 'random3.jpg')
+    full = face_cascade.detectMultiScale(gray, **PARAMS).tolist()
+    # Every face 60px to the right
+    moved = np.zeros_like(gray)
+    moved[:, 60:] = gray[:, :-60]
+    expected = face_cascade.detectMultiScale(moved, **PARAMS).tolist()
+
+    found, hinted = detect_faces_hinted(moved, face_cascade, full, **PARAMS)
+    assert hinted and len(found) == len(full)
+    for box in found.tolist():
+        assert any(box_iou(box, other) > 0.8 for other in expected), f"{box} not in {expected}"
+    print("✓ hinted box follows a moved face")
+
+if __name__ == '__main__':
+    test_downscaled_scan_finds_the_full_resolution_faces()
+    test_smallest_face_covers_the_cascade_window()
+    test_faces_near_max_size_are_kept()
+    test_hinted_boxes_stay_put()
+    test_hinted_box_follows_a_moved_face()
@@ -0,0 +1,73 @@
+import cv2
+import numpy as np
+from lbp_engine import NumpyLBPHRecognizer, predict_faces
+
+# Parameters of the training code (realtime_recognition.py)
+PARAMS = {'radius': 1, 'neighbors': 8, 'grid_x': 8, 'grid_y': 8}
+
+def make_faces(count, seed=0):
+    """Smooth random 100x100 'faces' with labels 0..count-1"""
+    rng = np.random.default_rng(seed)
+    faces = [cv2.GaussianBlur(rng.integers(0, 256, (100, 100), dtype=np.uint8), (5, 5), 0) for _ in range(count)]
+    return faces, np.arange(count, dtype=np.int32)
+
+def trained_pair(faces, labels):
+    """(cv2 LBPH recognizer, NumpyLBPHRecognizer) trained on the same faces"""
+    recognizer = cv2.face.LBPHFaceRecognizer_create(**PARAMS)
+    recognizer.train(faces, labels)
+    engine = NumpyLBPHRecognizer(**PARAMS)
+    engine.train(faces, labels)
+    return recognizer, engine
+
+def test_histograms_match_opencv():
+    faces, labels = make_faces(5)
+    recognizer, engine = trained_pair(faces, labels)
+    expected = np.vstack(recognizer.getHistograms())
+    assert np.allclose(engine.histograms, expected, atol=1e-6)
+    print("✓ LBP histograms match cv2.face")
+
+def test_predict_matches_opencv():
+    """Same (label, distance) as cv2.face.LBPHFaceRecognizer.predict, for noisy probes too"""
+    faces, labels = make_faces(8)
+    recognizer, engine = trained_pair(faces, labels)
+    rng = np.random.default_rng(1)
+    for face in faces:
+        noisy = np.clip(face.astype(np.int16) + rng.integers(-6, 7, face.shape), 0, 255).astype(np.uint8)
+        for probe in (face, noisy):
+            label, distance = recognizer.predict(probe)
+            engine_label, engine_distance = engine.predict(probe)
+            assert engine_label == label
+            assert abs(engine_distance - distance) < 1e-3 * max(1.0, distance)
+    print("✓ predict() matches cv2.face")
+
+def test_batch_equals_single_predictions():
+    """A frame's faces scored in one pass give the same answers as one at a time"""
+    faces, labels = make_faces(6)
+    _, engine = trained_pair(faces, labels)
+    probes = [cv2.flip(face, 1) for face in faces] + faces[:2]
+    batch = predict_faces(engine, probes)
+    assert len(batch) == len(probes)
+    for probe, (label, distance) in zip(probes, batch):
+        single_label, single_distance = engine.predict(probe)
+        assert label == single_label
+        assert abs(distance - single_distance) < 1e-6
+    print("✓ batched scoring equals single predictions")
+
+def test_threshold_and_intersection_metric():
+    faces, labels = make_faces(4)
+    strict = NumpyLBPHRecognizer(threshold=1e-3, **PARAMS)
+    strict.train(faces, labels)
+    assert strict.predict(cv2.flip(faces[0], 0))[0] == -1
+
+    engine = NumpyLBPHRecognizer(metric='intersection', **PARAMS)
+    engine.train(faces, labels)
+    for face, label in zip(faces, labels):
+        predicted, distance = engine.predict(face)
+        assert predicted == label and abs(distance) < 1e-3
+    print("✓ threshold and histogram intersection")
+
+if __name__ == '__main__':
+    test_histograms_match_opencv()
+    test_predict_matches_opencv()
+    test_batch_equals_single_predictions()
+    test_threshold_and_intersection_metric()
@@ -0,0 +1,125 @@
+import time
+import tempfile
+from pathlib import Path
+import model_registry
+from model_registry import ModelReloader, MODEL_FILE, LABELS_FILE
+
+def use_temp_models_dir():
+    """Point the registry at a fresh models/ directory, returns the restore function"""
+    original = model_registry.models_dir
+    directory = Path(tempfile.mkdtemp())
+    model_registry.models_dir = lambda: directory
+    return lambda: setattr(model_registry, 'models_dir', original)
+
+def write_version():
+    """A complete (dummy) version, not yet published"""
+    version_dir = model_registry.create_version()
+    (version_dir / MODEL_FILE).write_text('model')
+    (version_dir / LABELS_FILE).write_text('labels')
+    return version_dir.name
+
+def publish_later(version):
+    """Publish with a pointer mtime the reloader can tell apart from the last one"""
+    time.sleep(0.02)
+    model_registry.publish(version)
+
+def wait_for_version(reloader, version, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if reloader.get().get('version') == version and reloader.version == version:
+            return True
+        time.sleep(0.01)
+    return False
+
+def test_publish_and_rollback():
+    restore = use_temp_models_dir()
+    try:
+        assert model_registry.current_version() is None
+        first, second = write_version(), write_version()
+        assert model_registry.list_versions() == [first, second]
+
+        model_registry.publish(first)
+        model_registry.publish(second)
+        assert model_registry.read_pointer()['previous'] == first
+        model_registry.rollback()
+        assert model_registry.current_version() == first
+
+        # Versions without both files can not be published
+        incomplete = model_registry.create_version().name
+        try:
+            model_registry.publish(incomplete)
+            assert False, "incomplete version published"
+        except ValueError:
+            pass
+        print("✓ publish and rollback")
+    finally:
+        restore()
+
+def test_reloader_reports_the_loaded_version():
+    """A publish that lands while loading does not relabel the models that were loaded"""
+    restore = use_temp_models_dir()
+    try:
+        first, second, third = write_version(), write_version(), write_version()
+        model_registry.publish(first)
+        pending = [second]
+
+        def loader():
+            version = model_registry.current_version()
+            if pending:
+                publish_later(pending.pop())
+            return {'version': version}
+
+        reloader = ModelReloader(loader, check_interval=0)
+        assert reloader.get()['version'] == first
+        assert reloader.version == first
+
+        # The publish during the first load is picked up on a later check
+        assert wait_for_version(reloader, second)
+
+        pending.append(first)
+        publish_later(third)
+        assert wait_for_version(reloader, third)
+        # ... and the one published while third was loading
+        assert wait_for_version(reloader, first)
+
+        # Published after the reloader read the pointer, before the loader did
+        def late_loader():
+            if pending:
+                publish_later(pending.pop())
+            return {'version': model_registry.current_version()}
+
+        pending.append(second)
+        reloader = ModelReloader(late_loader, check_interval=0)
+        assert reloader.version == second
+        assert reloader.get()['version'] == second
+        print("✓ reloader reports the version the loader returned")
+    finally:
+        restore()
+
+def test_reloader_keeps_models_when_loading_fails():
+    restore = use_temp_models_dir()
+    try:
+        first, second = write_version(), write_version()
+        model_registry.publish(first)
+        results = [None, {'version': first}]
+
+        reloader = ModelReloader(lambda: results.pop() if results else {'version': second}, check_interval=0)
+        assert reloader.version == first
+        publish_later(second)
+        # The failed load (None) keeps the old models and the old version
+        deadline = time.monotonic() + 5.0
+        while results and time.monotonic() < deadline:
+            assert reloader.get()['version'] == first
+            time.sleep(0.01)
+        assert reloader.get()['version'] == first and reloader.version == first
+
+        publish_later(second)
+        assert wait_for_version(reloader, second)
+        print("✓ failed load keeps the current models")
+    finally:
+        restore()
+
+if __name__ == '__main__':
+    test_publish_and_rollback()
+    test_reloader_reports_the_loaded_version()
+    test_reloader_keeps_models_when_loading_fails()
@@ -6,9 +6,12 @@ import json
 import pickle
 import logging
 from improved_face_recognition import train_improved_lbph
+from logging_setup import setup_logging
 
 # Set up logging
-logging.basicConfig(filename='face_recognition.log', level=logging.DEBUG)
+setup_logging(log_file=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                   'face_recognition.log'))
+logger = logging.getLogger(__name__)
 
 def train_lbph_model(student_id):
     """Train LBPH model for a new student using improved implementation"""
@@ -19,24 +22,24 @@ def train_lbph_model(student_id):
         info_file = os.path.join(student_dir, 'info.json')
         
         if not os.path.exists(info_file):
-            logging.error(f"Student info not found at {info_file}")
+            logger.error(f"Student info not found at {info_file}")
             return {'success': False, 'message': f'Student info not found at {info_file}'}
         
         # Train the model using improved implementation
         result = train_improved_lbph()
         
         if result['success']:
-            logging.info("Model training completed successfully")
+            logger.info("Model training completed successfully")
             return {
                 'success': True,
                 'message': f"Model trained successfully with {result['num_faces']} faces from {result['num_students']} students"
             }
         else:
-            logging.error(f"Training failed: {result['message']}")
+            logger.error(f"Training failed: {result['message']}")
             return result
             
     except Exception as e:
-        logging.error(f"Unexpected error: {str(e)}")
+        logger.error(f"Unexpected error: {str(e)}")
         return {'success': False, 'message': str(e)}
 
 if __name__ == "__main__":
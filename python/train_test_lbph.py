@@ -7,27 +7,33 @@ import pickle
 import logging
 import math
 
+from debug_sink import get_debug_sink
+from face_cache import FaceCache
+from face_preprocessing import get_preprocessor
+from logging_setup import setup_logging
+
 # Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Detection and preprocessing settings, part of the face cache key
+CACHE_PARAMS = {
+    'detector': 'haarcascade_frontalface_default',
+    'scaleFactor': 1.1,
+    'minNeighbors': 5,
+    'minSize': 50,
+    'maxSize': 300,
+    'size': 100,
+    'preprocess': 'equalizeHist+GaussianBlur5+minmax',
+    'largest_face': True
+}
 
 def preprocess_face(image):
-    """Preprocess face image for better recognition"""
-    # Convert to grayscale if needed
-    if len(image.shape) > 2:
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    else:
-        gray = image
-        
-    # Apply histogram equalization
-    gray = cv2.equalizeHist(gray)
+    """Preprocess face image for better recognition (equalize, blur, normalize)
     
-    # Apply Gaussian blur to reduce noise
-    gray = cv2.GaussianBlur(gray, (5, 5), 0)
-    
-    # Normalize the image
-    gray = cv2.normalize(gray, None, 0, 255, cv2.NORM_MINMAX)
-    
-    return gray
+    Returns a reused buffer, valid until the next call on this thread.
+    """
+    return get_preprocessor('students').frame(image)
 
 def train_lbph():
     """Train LBPH model with existing student data"""
@@ -64,8 +70,11 @@ def train_lbph():
         labels = {}
         next_label = 0
         
+        # Detected faces from previous runs
+        cache = FaceCache('students', CACHE_PARAMS)
+        
         # Process each student directory
-        logging.info("Starting to process student directories...")
+        logger.info("Starting to process student directories...")
         for student_id in os.listdir(students_dir):
             student_dir = os.path.join(students_dir, student_id)
             if not os.path.isdir(student_dir):
@@ -77,7 +86,7 @@ def train_lbph():
                 next_label += 1
                 
             label = labels[student_id]
-            logging.info(f"Processing student {student_id} with label {label}")
+            logger.info(f"Processing student {student_id} with label {label}")
             
             # Process each face image
             for img_name in os.listdir(student_dir):
@@ -85,47 +94,57 @@ def train_lbph():
                     continue
                     
                 img_path = os.path.join(student_dir, img_name)
-                logging.info(f"Processing image: {img_path}")
+                logger.debug(f"Processing image: {img_path}")
                 
-                # Read and preprocess image
-                img = cv2.imread(img_path)
-                if img is None:
-                    logging.warning(f"Failed to load image: {img_path}")
+                # Reuse the detected face if the image hasn't changed
+                key, face_roi, box = cache.lookup(student_id, img_path)
+                if box is not None and face_roi is None:
+                    logger.warning(f"No face detected in {img_path}")
                     continue
                 
-                # Convert to grayscale and preprocess
-                gray = preprocess_face(img)
-                
-                # Detect face
-                faces = face_cascade.detectMultiScale(
-                    gray,
-                    scaleFactor=1.1,
-                    minNeighbors=5,
-                    minSize=(50, 50),
-                    maxSize=(300, 300)
-                )
-                
-                if len(faces) == 0:
-                    logging.warning(f"No face detected in {img_path}")
-                    continue
+                if face_roi is None:
+                    # Read and preprocess image
+                    img = cv2.imread(img_path)
+                    if img is None:
+                        logger.warning(f"Failed to load image: {img_path}")
+                        continue
                     
-                # Process the largest face
-                largest_face = max(faces, key=lambda rect: rect[2] * rect[3])
-                x, y, w, h = largest_face
-                
-                # Extract and preprocess face region
-                face_roi = gray[y:y+h, x:x+w]
-                face_roi = cv2.resize(face_roi, (100, 100))
+                    # Convert to grayscale and preprocess
+                    gray = preprocess_face(img)
+                    
+                    # Detect face
+                    faces = face_cascade.detectMultiScale(
+                        gray,
+                        scaleFactor=1.1,
+                        minNeighbors=5,
+                        minSize=(50, 50),
+                        maxSize=(300, 300)
+                    )
+                    
+                    if len(faces) == 0:
+                        logger.warning(f"No face detected in {img_path}")
+                        cache.store(student_id, key, None, None)
+                        continue
+                        
+                    # Process the largest face
+                    largest_face = max(faces, key=lambda rect: rect[2] * rect[3])
+                    x, y, w, h = largest_face
+                    
+                    # Extract and preprocess face region
+                    face_roi = get_preprocessor('students').face(gray, (x, y, w, h))
+                    cache.store(student_id, key, face_roi, (x, y, w, h))
                 
                 # Add to training data
                 face_images.append(face_roi)
                 face_labels.append(label)
                 
+        cache.save()
+        
         if not face_images:
             return {'success': False, 'message': 'No valid face images found for training'}
             
         # Train model
-        logging.info(f"Training model with {len(face_images)} faces...")
+        logger.info(f"Training model with {len(face_images)} faces...")
         recognizer.train(face_images, np.array(face_labels))
         
         # Save model and labels
@@ -133,7 +152,7 @@ def train_lbph():
         with open(labels_path, 'wb') as f:
             pickle.dump(labels, f)
             
-        logging.info("Training completed successfully")
+        logger.info("Training completed successfully")
         return {
             'success': True,
             'message': f'Model trained successfully with {len(face_images)} faces from {len(labels)} students',
@@ -142,7 +161,7 @@ def train_lbph():
         }
         
     except Exception as e:
-        logging.error(f"Error during training: {str(e)}")
+        logger.error(f"Error during training: {str(e)}")
         return {'success': False, 'message': str(e)}
 
 def test_recognition(test_image_path):
@@ -203,8 +222,7 @@ def test_recognition(test_image_path):
         x, y, w, h = largest_face
         
         # Extract and preprocess face region
-        face_roi = gray[y:y+h, x:x+w]
-        face_roi = cv2.resize(face_roi, (100, 100))
+        face_roi = get_preprocessor('students').face(gray, (x, y, w, h))
         
         # Predict with distance threshold
         label, confidence = recognizer.predict(face_roi)
@@ -222,14 +240,16 @@ def test_recognition(test_image_path):
         if confidence_percentage < 30:  # Lowered from 50% to 30%
             predicted_student_id = 'Unknown'
             
-        # Save debug image
-        debug_img = img.copy()
-        color = (0, 255, 0) if predicted_student_id != 'Unknown' else (0, 0, 255)
-        cv2.rectangle(debug_img, (x, y), (x+w, y+h), color, 2)
-        text = f'{predicted_student_id} ({confidence_percentage:.1f}%)'
-        cv2.putText(debug_img, text, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-        debug_path = os.path.join(os.path.dirname(test_image_path), 'debug_recognition.jpg')
-        cv2.imwrite(debug_path, debug_img)
+        # Save debug image (only with FACE_DEBUG_IMAGES)
+        debug_sink = get_debug_sink()
+        if debug_sink.wants('recognition'):
+            debug_img = img.copy()
+            color = (0, 255, 0) if predicted_student_id != 'Unknown' else (0, 0, 255)
+            cv2.rectangle(debug_img, (x, y), (x+w, y+h), color, 2)
+            text = f'{predicted_student_id} ({confidence_percentage:.1f}%)'
+            cv2.putText(debug_img, text, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+            debug_path = os.path.join(os.path.dirname(test_image_path), 'debug_recognition.jpg')
+            debug_sink.submit(debug_path, debug_img)
         
         return {
             'success': True,
@@ -240,7 +260,7 @@ def test_recognition(test_image_path):
         }
         
     except Exception as e:
-        logging.error(f"Error during recognition: {str(e)}")
+        logger.error(f"Error during recognition: {str(e)}")
         return {'success': False, 'message': str(e)}
 
 if __name__ == '__main__':
@@ -0,0 +1,161 @@
+import json
+import atexit
+import logging
+import threading
+from pathlib import Path
+
+from face_augmentation import FaceAugmenter
+from lbp_engine import predict_faces
+from logging_setup import setup_logging
+
+# Configure logging
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# LBPH distance below which the plain face is trusted without extra variants
+DEFAULT_EARLY_EXIT_DISTANCE = 40
+
+# Predictions counted in memory before they are appended to the stats file
+STATS_FLUSH_EVERY = 200
+
+def parse_variants(spec):
+    """Variant keyword arguments from a spec like 'flip,rotate-5,rotate+5,scale1.1'"""
+    flip = False
+    rotations = []
+    scales = []
+    for item in (part.strip() for part in spec.split(',')):
+        if not item or item in ('none', 'original'):
+            continue
+        if item == 'flip':
+            flip = True
+        elif item.startswith('rotate'):
+            rotations.append(float(item[len('rotate'):]))
+        elif item.startswith('scale'):
+            scales.append(float(item[len('scale'):]))
+        else:
+            raise ValueError(f"Unknown test-time variant: {item}")
+    return {'flip': flip, 'rotations': rotations, 'scales': scales}
+
+class TTAPolicy:
+    """Test-time augmentation: which extra probes to score and when to stop
+
+    The unmodified face is always predicted first. When its distance is below
+    early_exit_distance the answer is returned as is, otherwise the extra
+    variants (flip, rotations, scales) are scored in one batch and the closest
+    prediction wins. stats counts, per variant, how often it was scored, won
+    and changed the predicted label, so the variant set and the cutoff can be
+    tuned from real traffic. With a stats_path the counts are appended to it
+    every flush_every predictions and at exit, never on each prediction.
+    """
+
+    def __init__(self, size=(100, 100), flip=False, rotations=(), scales=(),
+                 early_exit_distance=DEFAULT_EARLY_EXIT_DISTANCE, stats_path=None,
+                 flush_every=STATS_FLUSH_EVERY):
+        self.early_exit_distance = early_exit_distance
+        self.augmenter = FaceAugmenter(size=size, flip=flip, rotations=rotations,
+                                       scales=scales, include_original=False)
+        self.stats = self._empty_stats()
+        self.stats_path = stats_path
+        self.flush_every = flush_every
+        self.lock = threading.Lock()
+        if stats_path is not None:
+            atexit.register(self.flush_stats)
+
+    @classmethod
+    def from_spec(cls, spec, **kwargs):
+        """Policy from a comma separated variant list, see parse_variants"""
+        return cls(**parse_variants(spec), **kwargs)
+
+    @property
+    def names(self):
+        return ['original'] + self.augmenter.names
+
+    def _empty_stats(self):
+        return {
+            'predictions': 0,
+            'early_exits': 0,
+            'variants': {name: {'scored': 0, 'won': 0, 'changed': 0} for name in self.names}
+        }
+
+    def predict(self, recognizer, face):
+        """(label, distance, winning variant name) for one preprocessed face"""
+        label, distance = recognizer.predict(face)
+        best = (label, distance, 'original')
+        scored = ['original']
+        if distance >= self.early_exit_distance and self.augmenter.num_variants:
+            variants = self.augmenter.apply_one(face)
+            for name, (variant_label, variant_distance) in zip(self.augmenter.names,
+                                                               predict_faces(recognizer, variants)):
+                scored.append(name)
+                if variant_distance < best[1]:
+                    best = (variant_label, variant_distance, name)
+
+        with self.lock:
+            self.stats['predictions'] += 1
+            if distance < self.early_exit_distance:
+                self.stats['early_exits'] += 1
+            variant_stats = self.stats['variants']
+            for name in scored:
+                variant_stats[name]['scored'] += 1
+            variant_stats[best[2]]['won'] += 1
+            if best[0] != label:
+                variant_stats[best[2]]['changed'] += 1
+            due = self.stats_path is not None and self.stats['predictions'] >= self.flush_every
+        if due:
+            self.flush_stats()
+        return best
+
+    def report(self):
+        """Stats with the early exit and per variant change rates filled in"""
+        predictions = self.stats['predictions']
+        report = {
+            'predictions': predictions,
+            'early_exits': self.stats['early_exits'],
+            'early_exit_rate': self.stats['early_exits'] / predictions if predictions else 0.0,
+            'variants': {}
+        }
+        for name, counts in self.stats['variants'].items():
+            scored = counts['scored']
+            report['variants'][name] = dict(counts, change_rate=counts['changed'] / scored if scored else 0.0)
+        return report
+
+    def load_stats(self, stats_path):
+        """Sum of the counts flush_stats appended, empty counts when there are none yet"""
+        totals = self._empty_stats()
+        try:
+            with open(stats_path, 'r') as f:
+                lines = f.readlines()
+        except OSError:
+            return totals
+        for line in lines:
+            try:
+                saved = json.loads(line)
+            except ValueError:
+                # A line cut short by a crash
+                continue
+            totals['predictions'] += saved.get('predictions', 0)
+            totals['early_exits'] += saved.get('early_exits', 0)
+            for name, counts in saved.get('variants', {}).items():
+                total = totals['variants'].setdefault(name, {'scored': 0, 'won': 0, 'changed': 0})
+                for key in total:
+                    total[key] += counts.get(key, 0)
+        return totals
+
+    def flush_stats(self):
+        """Append the counts gathered since the last flush to stats_path and reset them
+
+        Each process appends one line per flush instead of rewriting the
+        totals, so concurrent processes never overwrite each other's counts.
+        """
+        with self.lock:
+            if self.stats_path is None or not self.stats['predictions']:
+                return
+            stats, self.stats = self.stats, self._empty_stats()
+        try:
+            stats_path = Path(self.stats_path)
+            stats_path.parent.mkdir(parents=True, exist_ok=True)
+            # One write of one line, appends from several processes do not interleave
+            with open(stats_path, 'a') as f:
+                f.write(json.dumps(stats) + '\n')
+        except OSError as e:
+            logger.warning(f"Could not save test-time augmentation stats: {str(e)}")
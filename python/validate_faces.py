@@ -3,12 +3,34 @@ import os
 import shutil
 from pathlib import Path
 import logging
+import argparse
+
+from cascade_detector import detect_faces_scaled
+from debug_sink import get_debug_sink
+from face_quality import assess_face, select_best
+from logging_setup import setup_logging
 
 # Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Sharpest, best exposed frontal faces kept per student for training
+DEFAULT_BEST_FRAMES = 20
 
-def validate_faces():
-    """Validate face images in student folders and copy valid ones to a new directory"""
+# Validated faces that are no longer among the best are moved here, out of the
+# face_*.jpg glob the trainers read, instead of being deleted
+UNSELECTED_DIR = 'unselected'
+
+def validate_faces(best_frames=DEFAULT_BEST_FRAMES):
+    """Validate face images in student folders and copy valid ones to a new directory
+    
+    An image is valid when it has exactly one face that passes the quality
+    gate. Of those, the best_frames highest scoring per student are copied
+    (0 copies all of them); validated images that are no longer among the
+    best are moved to an unselected/ subfolder, so training only sees the
+    selection and nothing is lost. A student with no valid face keeps the
+    validated set as it was.
+    """
     try:
         # Get paths
         base_dir = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -21,47 +43,56 @@ def validate_faces():
         # Load face cascade
         cascade_path = base_dir / 'assets' / 'haarcascade_frontalface_default.xml'
         if not cascade_path.exists():
-            logging.error(f"Cascade file not found at: {cascade_path}")
+            logger.error(f"Cascade file not found at: {cascade_path}")
             return
             
         face_cascade = cv2.CascadeClassifier(str(cascade_path))
         if face_cascade.empty():
-            logging.error("Failed to load face cascade classifier")
+            logger.error("Failed to load face cascade classifier")
             return
         
+        # Debug images are only drawn with FACE_DEBUG_IMAGES
+        debug_sink = get_debug_sink()
+        draw_debug = debug_sink.wants('validation')
+        
         # Process each student directory
         total_images = 0
         valid_images = 0
+        selected_images = 0
         
         for student_dir in students_dir.iterdir():
             if not student_dir.is_dir():
                 continue
                 
             student_id = student_dir.name
-            logging.info(f"\nProcessing student {student_id}")
+            logger.info(f"\nProcessing student {student_id}")
             
             # Create student directory in validated faces
             student_validated_dir = validated_dir / student_id
             student_validated_dir.mkdir(exist_ok=True)
             
+            # (image path, quality) of every image with a single face
+            candidates = []
+            
             # Process each face image
             for img_path in student_dir.glob('face_*.jpg'):
                 total_images += 1
-                logging.info(f"Checking image: {img_path.name}")
+                logger.debug(f"Checking image: {img_path.name}")
                 
                 # Read image
                 img = cv2.imread(str(img_path))
                 if img is None:
-                    logging.warning(f"Failed to load image: {img_path}")
+                    logger.warning(f"Failed to load image: {img_path}")
                     continue
                 
                 # Convert to grayscale and apply histogram equalization
                 gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
                 gray = cv2.equalizeHist(gray)
                 
-                # Detect faces with optimized parameters
-                faces = face_cascade.detectMultiScale(
+                # Detect faces with optimized parameters, on a downscaled copy
+                faces = detect_faces_scaled(
                     gray,
+                    face_cascade,
                     scaleFactor=1.1,
                     minNeighbors=4,
                     minSize=(30, 30),
@@ -69,50 +100,80 @@ def validate_faces():
                 )
                 
                 # Create debug image
-                debug_img = img.copy()
+                debug_img = img.copy() if draw_debug else None
                 
                 if len(faces) == 1:
-                    # Single face detected - good!
-                    valid_images += 1
+                    # Single face detected - score it, the best ones are copied below
                     x, y, w, h = faces[0]
+                    quality = assess_face(img, faces[0])
+                    candidates.append((img_path, quality))
                     
-                    # Draw green rectangle for valid face
-                    cv2.rectangle(debug_img, (x, y), (x+w, y+h), (0, 255, 0), 2)
-                    cv2.putText(debug_img, 'Valid Face', (x, y-10),
-                              cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                    
-                    # Copy to validated directory
-                    shutil.copy2(img_path, student_validated_dir / img_path.name)
-                    logging.info(f"✓ Valid face detected in {img_path.name}")
+                    if quality['passed']:
+                        valid_images += 1
+                        # Draw green rectangle for valid face
+                        color, label = (0, 255, 0), f"Valid Face ({quality['score']:.2f})"
+                        logger.debug(f"✓ Valid face detected in {img_path.name}")
+                    else:
+                        color, label = (0, 200, 255), f"Low Quality ({quality['reason']})"
+                        logger.warning(f"✗ Face in {img_path.name} rejected: {quality['reason']}")
+                    if draw_debug:
+                        cv2.rectangle(debug_img, (x, y), (x+w, y+h), color, 2)
+                        cv2.putText(debug_img, label, (x, y-10),
+                                  cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
                     
                 elif len(faces) == 0:
                     # No face detected
-                    cv2.putText(debug_img, 'No Face Detected', (10, 30),
-                              cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-                    logging.warning(f"✗ No face detected in {img_path.name}")
+                    if draw_debug:
+                        cv2.putText(debug_img, 'No Face Detected', (10, 30),
+                                  cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+                    logger.warning(f"✗ No face detected in {img_path.name}")
                     
                 else:
                     # Multiple faces detected
-                    for (x, y, w, h) in faces:
-                        cv2.rectangle(debug_img, (x, y), (x+w, y+h), (0, 165, 255), 2)
-                    cv2.putText(debug_img, f'Multiple Faces ({len(faces)})', (10, 30),
-                              cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 165, 255), 2)
-                    logging.warning(f"⚠ Multiple faces ({len(faces)}) detected in {img_path.name}")
+                    if draw_debug:
+                        for (x, y, w, h) in faces:
+                            cv2.rectangle(debug_img, (x, y), (x+w, y+h), (0, 165, 255), 2)
+                        cv2.putText(debug_img, f'Multiple Faces ({len(faces)})', (10, 30),
+                                  cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 165, 255), 2)
+                    logger.warning(f"⚠ Multiple faces ({len(faces)}) detected in {img_path.name}")
                 
-                # Save debug image
-                debug_path = student_validated_dir / f'debug_{img_path.name}'
-                cv2.imwrite(str(debug_path), debug_img)
+                # Save debug image (only with FACE_DEBUG_IMAGES)
+                if draw_debug:
+                    debug_sink.submit(student_validated_dir / f'debug_{img_path.name}', debug_img)
+            
+            # Copy the best faces to the validated directory
+            best = select_best(candidates, best_frames or len(candidates))
+            if not best:
+                logger.warning(f"No valid face for student {student_id}, validated faces left unchanged")
+                continue
+            keep = {img_path.name for img_path, _ in best}
+            unselected_dir = student_validated_dir / UNSELECTED_DIR
+            for img_path, _ in best:
+                shutil.copy2(img_path, student_validated_dir / img_path.name)
+                # Selected again after an earlier run set it aside
+                (unselected_dir / img_path.name).unlink(missing_ok=True)
+            for old_path in student_validated_dir.glob('face_*.jpg'):
+                if old_path.name not in keep:
+                    unselected_dir.mkdir(exist_ok=True)
+                    os.replace(old_path, unselected_dir / old_path.name)
+            selected_images += len(best)
+            logger.info(f"Selected {len(best)} of {len(candidates)} faces for student {student_id}")
         
         # Print summary
         print("\n=== Face Validation Summary ===")
         print(f"Total images processed: {total_images}")
         print(f"Valid face images: {valid_images}")
         print(f"Invalid face images: {total_images - valid_images}")
+        print(f"Selected for training: {selected_images}")
         print(f"Validation rate: {(valid_images/total_images)*100:.1f}%")
         print(f"\nValid faces copied to: {validated_dir}")
         
     except Exception as e:
-        logging.error(f"Error during face validation: {str(e)}")
+        logger.error(f"Error during face validation: {str(e)}")
 
 if __name__ == '__main__':
-    validate_faces() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Validate student face images for training')
+    parser.add_argument('--best', type=int, default=DEFAULT_BEST_FRAMES,
+                        help='Highest quality faces kept per student, 0 keeps every valid one')
+    args = parser.parse_args()
+    validate_faces(max(0, args.best))
@@ -4,8 +4,12 @@ import shutil
 from pathlib import Path
 import logging
 
+from debug_sink import get_debug_sink
+from logging_setup import setup_logging
+
 # Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+setup_logging()
+logger = logging.getLogger(__name__)
 
 def validate_test_images():
     """Validate test images and organize them into categories"""
@@ -16,7 +20,7 @@ def validate_test_images():
         tested_dir = base_dir / 'tested_faces'
         
         if not test_dir.exists():
-            logging.error(f"Test images directory not found at: {test_dir}")
+            logger.error(f"Test images directory not found at: {test_dir}")
             return
         
         # Create tested faces directory structure
@@ -32,14 +36,18 @@ def validate_test_images():
         # Load face cascade
         cascade_path = base_dir / 'assets' / 'haarcascade_frontalface_default.xml'
         if not cascade_path.exists():
-            logging.error(f"Cascade file not found at: {cascade_path}")
+            logger.error(f"Cascade file not found at: {cascade_path}")
             return
             
         face_cascade = cv2.CascadeClassifier(str(cascade_path))
         if face_cascade.empty():
-            logging.error("Failed to load face cascade classifier")
+            logger.error("Failed to load face cascade classifier")
             return
         
+        # Debug images are only drawn with FACE_DEBUG_IMAGES
+        debug_sink = get_debug_sink()
+        draw_debug = debug_sink.wants('validation')
+        
         # Initialize counters
         stats = {
             'student45': {'total': 0, 'valid': 0},
@@ -63,12 +71,12 @@ def validate_test_images():
                 continue
             
             stats[category]['total'] += 1
-            logging.info(f"\nProcessing {category} image: {img_path.name}")
+            logger.info(f"\nProcessing {category} image: {img_path.name}")
             
             # Read image
             img = cv2.imread(str(img_path))
             if img is None:
-                logging.warning(f"Failed to load image: {img_path}")
+                logger.warning(f"Failed to load image: {img_path}")
                 continue
             
             # Convert to grayscale and apply histogram equalization
@@ -85,7 +93,7 @@ def validate_test_images():
             )
             
             # Create debug image
-            debug_img = img.copy()
+            debug_img = img.copy() if draw_debug else None
             
             if len(faces) == 1:
                 # Single face detected - good!
@@ -93,9 +101,10 @@ def validate_test_images():
                 x, y, w, h = faces[0]
                 
                 # Draw green rectangle for valid face
-                cv2.rectangle(debug_img, (x, y), (x+w, y+h), (0, 255, 0), 2)
-                cv2.putText(debug_img, 'Valid Face', (x, y-10),
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+                if draw_debug:
+                    cv2.rectangle(debug_img, (x, y), (x+w, y+h), (0, 255, 0), 2)
+                    cv2.putText(debug_img, 'Valid Face', (x, y-10),
+                              cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
                 
                 # Extract and save just the face region
                 face_img = img[y:y+h, x:x+w]
@@ -104,25 +113,27 @@ def validate_test_images():
                 
                 # Also save the original image
                 shutil.copy2(img_path, target_dir / img_path.name)
-                logging.info(f"✓ Valid face detected in {img_path.name}")
+                logger.info(f"✓ Valid face detected in {img_path.name}")
                 
             elif len(faces) == 0:
                 # No face detected
-                cv2.putText(debug_img, 'No Face Detected', (10, 30),
-                          cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-                logging.warning(f"✗ No face detected in {img_path.name}")
+                if draw_debug:
+                    cv2.putText(debug_img, 'No Face Detected', (10, 30),
+                              cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+                logger.warning(f"✗ No face detected in {img_path.name}")
                 
             else:
                 # Multiple faces detected
-                for (x, y, w, h) in faces:
-                    cv2.rectangle(debug_img, (x, y), (x+w, y+h), (0, 165, 255), 2)
-                cv2.putText(debug_img, f'Multiple Faces ({len(faces)})', (10, 30),
-                          cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 165, 255), 2)
-                logging.warning(f"⚠ Multiple faces ({len(faces)}) detected in {img_path.name}")
+                if draw_debug:
+                    for (x, y, w, h) in faces:
+                        cv2.rectangle(debug_img, (x, y), (x+w, y+h), (0, 165, 255), 2)
+                    cv2.putText(debug_img, f'Multiple Faces ({len(faces)})', (10, 30),
+                              cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 165, 255), 2)
+                logger.warning(f"⚠ Multiple faces ({len(faces)}) detected in {img_path.name}")
             
-            # Save debug image
-            debug_path = target_dir / f'debug_{img_path.name}'
-            cv2.imwrite(str(debug_path), debug_img)
+            # Save debug image (only with FACE_DEBUG_IMAGES)
+            if draw_debug:
+                debug_sink.submit(target_dir / f'debug_{img_path.name}', debug_img)
         
         # Print summary
         print("\n=== Test Images Validation Summary ===")
@@ -147,7 +158,7 @@ def validate_test_images():
         print(f"\nProcessed images saved to: {tested_dir}")
         
     except Exception as e:
-        logging.error(f"Error during test images validation: {str(e)}")
+        logger.error(f"Error during test images validation: {str(e)}")
 
 if __name__ == '__main__':
     validate_test_images() 
\ No newline at end of file
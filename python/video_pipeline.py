@@ -0,0 +1,302 @@
+import cv2
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+import numpy as np
+from collections import deque
+
+from face_tracker import FaceTracker
+from cascade_detector import detect_faces_scaled
+from face_preprocessing import get_preprocessor
+from face_quality import split_by_quality, passes
+from lbp_engine import predict_faces
+from realtime_recognition import load_recognition_models, draw_recognition, draw_low_quality, extract_face_rois
+from logging_setup import setup_logging
+
+# Configure logging
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Latency samples kept per stage for the percentiles
+STATS_WINDOW = 500
+
+class StageStats:
+    """Latency samples and drop counts of one pipeline stage"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=STATS_WINDOW)
+        self.processed = 0
+        self.dropped = 0
+
+    def record(self, seconds):
+        with self.lock:
+            self.latencies.append(seconds * 1000)
+            self.processed += 1
+
+    def drop(self, count=1):
+        with self.lock:
+            self.dropped += count
+
+    def summary(self):
+        with self.lock:
+            latencies = np.array(self.latencies)
+            result = {'processed': self.processed, 'dropped': self.dropped}
+        if len(latencies):
+            result.update({
+                'p50_ms': round(float(np.percentile(latencies, 50)), 2),
+                'p95_ms': round(float(np.percentile(latencies, 95)), 2),
+                'max_ms': round(float(latencies.max()), 2)
+            })
+        return result
+
+class DropOldestQueue:
+    """Bounded queue that discards its oldest item instead of blocking the producer
+
+    Keeps a slow consumer working on recent frames: the backlog can never grow
+    past maxsize, so neither can the latency it adds. maxsize=1 is a "latest
+    frame" slot.
+    """
+
+    def __init__(self, maxsize, stats=None, on_drop=None):
+        self.items = deque()
+        self.maxsize = maxsize
+        self.stats = stats
+        self.on_drop = on_drop
+        self.cond = threading.Condition()
+
+    def put(self, item):
+        with self.cond:
+            if len(self.items) >= self.maxsize:
+                dropped = self.items.popleft()
+                if self.stats is not None:
+                    self.stats.drop()
+                if self.on_drop is not None and dropped is not None:
+                    self.on_drop(dropped)
+            self.items.append(item)
+            self.cond.notify()
+
+    def get(self, timeout=None):
+        """Oldest item, or None after the timeout"""
+        with self.cond:
+            if not self.items:
+                self.cond.wait(timeout)
+            if not self.items:
+                return None
+            return self.items.popleft()
+
+class FramePacket:
+    """A frame travelling through the pipeline"""
+
+    def __init__(self, index, frame):
+        self.index = index
+        self.frame = frame
+        self.captured = time.perf_counter()
+        self.gray = None
+        # Detect stage output: face boxes, or (box, track) pairs and new tracks in tracking mode
+        self.boxes = []
+        # (box, reason) of faces the quality gate kept from the recognizer
+        self.skipped = []
+        self.tracks = None
+        self.pending = []
+        # (box, label, distance, track) for each face after recognition
+        self.results = []
+
+class VideoPipeline:
+    """Live recognition split into capture, detect, recognize and render stages
+
+    Each stage runs on its own thread (render stays on the caller's thread,
+    as HighGUI requires) and hands frames on through DropOldestQueues, so a
+    slow detection or prediction drops stale frames instead of queueing them
+    and end-to-end latency stays bounded. Per-stage latency and drop counts
+    are available from stats_summary().
+    """
+
+    def __init__(self, models, source=0, track=False, detect_interval=5, queue_size=2):
+        self.models = models
+        self.source = source
+        self.tracker = FaceTracker(detect_interval=detect_interval) if track else None
+        self.stats = {name: StageStats() for name in ('capture', 'detect', 'recognize', 'render', 'end_to_end')}
+        self.frames = DropOldestQueue(1, self.stats['capture'])
+        self.detected = DropOldestQueue(queue_size, self.stats['detect'], on_drop=self._release)
+        self.recognized = DropOldestQueue(queue_size, self.stats['recognize'])
+        self.stop_event = threading.Event()
+        self.capture_done = threading.Event()
+        # Track ids handed to the recognize stage and not answered yet
+        self.in_flight = set()
+        self.in_flight_lock = threading.Lock()
+
+    def _release(self, packet):
+        """Let the tracks of a dropped packet be sent for recognition again"""
+        with self.in_flight_lock:
+            self.in_flight.difference_update(track.track_id for _, track in packet.pending)
+
+    def _capture(self, cap, max_frames):
+        index = 0
+        while not self.stop_event.is_set() and (max_frames is None or index < max_frames):
+            start = time.perf_counter()
+            ret, frame = cap.read()
+            if not ret:
+                break
+            self.stats['capture'].record(time.perf_counter() - start)
+            # Only the newest frame is kept, so the camera buffer never backs up
+            self.frames.put(FramePacket(index, frame))
+            index += 1
+        self.capture_done.set()
+
+    def _detect(self):
+        face_cascade = self.models['face_cascade']
+        preprocessor = get_preprocessor('lbph')
+        while not self.stop_event.is_set():
+            packet = self.frames.get(timeout=0.1)
+            if packet is None:
+                if self.capture_done.is_set():
+                    break
+                continue
+
+            start = time.perf_counter()
+            # The frame moves on to another thread, so it gets its own buffer
+            packet.gray = preprocessor.frame(packet.frame, out=np.empty(packet.frame.shape[:2], dtype=np.uint8))
+
+            faces = None
+            if self.tracker is None or self.tracker.should_detect():
+                faces = detect_faces_scaled(
+                    packet.gray,
+                    face_cascade,
+                    scaleFactor=1.1,
+                    minNeighbors=4,
+                    minSize=(30, 30),
+                    maxSize=(400, 400)
+                )
+
+            if self.tracker is None:
+                good, skipped = split_by_quality(packet.frame, faces)
+                packet.boxes = [tuple(int(v) for v in box) for box in good]
+                packet.skipped = [(box, quality['reason']) for box, quality in skipped]
+            else:
+                # Faces failing the quality gate stay pending until a clearer frame
+                pending = [t for t in self.tracker.update(packet.gray, faces) if passes(packet.frame, t.box)]
+                packet.tracks = [(track.box, track) for track in self.tracker.tracks]
+                # A track being recognized on an earlier frame is not sent again
+                with self.in_flight_lock:
+                    packet.pending = [(t.box, t) for t in pending if t.track_id not in self.in_flight]
+                    self.in_flight.update(t.track_id for _, t in packet.pending)
+
+            self.stats['detect'].record(time.perf_counter() - start)
+            self.detected.put(packet)
+        self.detected.put(None)
+
+    def _recognize(self):
+        recognizer = self.models['recognizer']
+        while True:
+            packet = self.detected.get(timeout=0.1)
+            if packet is None:
+                if self.stop_event.is_set() or not self._detect_thread.is_alive():
+                    break
+                continue
+
+            start = time.perf_counter()
+            if packet.tracks is None:
+                predictions = predict_faces(recognizer, extract_face_rois(packet.gray, packet.boxes))
+                packet.results = [(box, label, distance, None)
+                                  for box, (label, distance) in zip(packet.boxes, predictions)]
+            else:
+                if packet.pending:
+                    predictions = predict_faces(
+                        recognizer, extract_face_rois(packet.gray, [box for box, _ in packet.pending]))
+                    for (_, track), identity in zip(packet.pending, predictions):
+                        track.identity = identity
+                    self._release(packet)
+                packet.results = [(box, track.identity[0], track.identity[1], track)
+                                  for box, track in packet.tracks if track.identity is not None]
+
+            self.stats['recognize'].record(time.perf_counter() - start)
+            self.recognized.put(packet)
+        self.recognized.put(None)
+
+    def run(self, display=True, max_frames=None):
+        """Run until 'q' is pressed or the source ends, returns stats()"""
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            logger.error(f"Could not open video source {self.source}")
+            return None
+
+        labels_reverse = self.models['labels_reverse']
+        threads = [
+            threading.Thread(target=self._capture, args=(cap, max_frames), daemon=True),
+            threading.Thread(target=self._detect, daemon=True),
+            threading.Thread(target=self._recognize, daemon=True)
+        ]
+        self._detect_thread = threads[1]
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                packet = self.recognized.get(timeout=0.1)
+                if packet is None:
+                    if not threads[2].is_alive():
+                        break
+                    continue
+
+                start = time.perf_counter()
+                display_frame = packet.frame.copy()
+                for box, reason in packet.skipped:
+                    draw_low_quality(display_frame, box, reason)
+                for box, label, distance, track in packet.results:
+                    recognized = draw_recognition(display_frame, box, label, distance, labels_reverse)
+                    if track is not None:
+                        track.confirmed = recognized
+
+                if display:
+                    cv2.imshow('Face Recognition', display_frame)
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        break
+
+                now = time.perf_counter()
+                self.stats['render'].record(now - start)
+                self.stats['end_to_end'].record(now - packet.captured)
+        finally:
+            self.stop_event.set()
+            for thread in threads:
+                thread.join(timeout=2)
+            cap.release()
+            if display:
+                cv2.destroyAllWindows()
+
+        stats = self.stats_summary()
+        logger.info(f"Pipeline stats: {json.dumps(stats)}")
+        return stats
+
+    def stats_summary(self):
+        return {name: stats.summary() for name, stats in self.stats.items()}
+
+def run_pipeline(backend='opencv', source=0, track=False, detect_interval=5, display=True, max_frames=None):
+    """Load the models and run the live pipeline, returns its stats"""
+    models = load_recognition_models(backend)
+    if models is None:
+        print("Error: Recognition model not found. Please train the model first.")
+        return None
+    pipeline = VideoPipeline(models, source=source, track=track, detect_interval=detect_interval)
+    return pipeline.run(display=display, max_frames=max_frames)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Threaded live face recognition pipeline')
+    parser.add_argument('--source', default='0', help='Camera index or video file (default: 0)')
+    parser.add_argument('--backend', choices=['opencv', 'numpy', 'indexed'], default='opencv',
+                        help='Recognizer used to score faces')
+    parser.add_argument('--track', action='store_true', help='Detect every few frames and track faces in between')
+    parser.add_argument('--detect-interval', type=int, default=5, help='With --track, frames between detector runs')
+    parser.add_argument('--frames', type=int, help='Stop after this many captured frames')
+    parser.add_argument('--no-display', action='store_true', help='Do not open a window, only report stats')
+    args = parser.parse_args()
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    stats = run_pipeline(args.backend, source, args.track, args.detect_interval,
+                         display=not args.no_display, max_frames=args.frames)
+    if stats is None:
+        sys.exit(1)
+    print(json.dumps(stats, indent=2))
@@ -0,0 +1,211 @@
+<?php
+// Client for the resident recognition server (python/recognition_server.py).
+// Talks to it over localhost HTTP so the endpoints don't have to fork Python per frame.
+
+define('RECOGNITION_SERVER_URL', 'http://127.0.0.1:8765');
+
+// Posts the encoded image to the server as the request body, so nothing is written
+// to disk. Face boxes from the previous frame are searched before the whole frame.
+// With a camera session id the server hands back the session's last result while
+// the scene does not change.
+function callRecognitionServerBytes($endpoint, $imageData, $timeout = 10, $prevFaces = null, $session = null)
+{
+    $params = [];
+    if (!empty($prevFaces)) {
+        $params['prev_faces'] = json_encode($prevFaces);
+    }
+    if (!empty($session)) {
+        $params['session'] = $session;
+    }
+    $query = $params ? '?' . http_build_query($params) : '';
+
+    $context = stream_context_create([
+        'http' => [
+            'method' => 'POST',
+            'header' => "Content-Type: image/jpeg\r\n",
+            'content' => $imageData,
+            'timeout' => $timeout,
+            'ignore_errors' => true
+        ]
+    ]);
+
+    // Returns null when the server is not running so callers can fall back to exec
+    $response = @file_get_contents(RECOGNITION_SERVER_URL . '/' . $endpoint . $query, false, $context);
+    if ($response === false) {
+        return null;
+    }
+
+    return json_decode($response, true);
+}
+
+// Run a Python script with --stdin, piping the image bytes to it instead of a file
+// path. Returns the parsed result, or null if the script printed none.
+function runPythonWithImage($script, $imageData, $prevFaces = null)
+{
+    $command = 'python ' . escapeshellarg($script) . ' --stdin' . prevFacesArgument($prevFaces);
+    $descriptors = [
+        0 => ['pipe', 'r'],
+        1 => ['pipe', 'w'],
+        2 => ['pipe', 'w']
+    ];
+
+    $process = proc_open($command, $descriptors, $pipes);
+    if (!is_resource($process)) {
+        return null;
+    }
+
+    fwrite($pipes[0], $imageData);
+    fclose($pipes[0]);
+    // Logging goes to stderr, only the result line is needed
+    $output = stream_get_contents($pipes[1]);
+    stream_get_contents($pipes[2]);
+    fclose($pipes[1]);
+    fclose($pipes[2]);
+    proc_close($process);
+
+    return parsePythonResult($output);
+}
+
+// Encoded image of this request: the raw body when the browser posted the frame as
+// image/*, otherwise the 'image' multipart upload. Null if there is neither.
+function getUploadedImageData()
+{
+    $contentType = strtolower(trim(explode(';', $_SERVER['CONTENT_TYPE'] ?? '')[0]));
+    if (strpos($contentType, 'image/') === 0 || $contentType === 'application/octet-stream') {
+        $data = file_get_contents('php://input');
+        return $data === '' || $data === false ? null : $data;
+    }
+
+    if (!empty($_FILES['image']['tmp_name']) && is_uploaded_file($_FILES['image']['tmp_name'])) {
+        return file_get_contents($_FILES['image']['tmp_name']);
+    }
+    return null;
+}
+
+// Previous face boxes sent by the browser as a JSON 'prev_faces' field (form field,
+// or query parameter when the frame is the raw body), or null
+function getPrevFaces()
+{
+    $prevFaces = $_POST['prev_faces'] ?? $_GET['prev_faces'] ?? null;
+    if (empty($prevFaces)) {
+        return null;
+    }
+
+    $prevFaces = json_decode($prevFaces, true);
+    if (!is_array($prevFaces)) {
+        return null;
+    }
+    // A single face_location object is accepted as well as a list of them
+    if (isset($prevFaces['x'])) {
+        $prevFaces = [$prevFaces];
+    }
+
+    $boxes = [];
+    foreach ($prevFaces as $face) {
+        if (!isset($face['x'], $face['y'], $face['width'], $face['height'])) {
+            return null;
+        }
+        $boxes[] = [
+            'x' => (int)round($face['x']),
+            'y' => (int)round($face['y']),
+            'width' => (int)round($face['width']),
+            'height' => (int)round($face['height'])
+        ];
+    }
+    return $boxes ?: null;
+}
+
+// Camera session id sent by the browser as a 'session' field or query parameter,
+// or null if missing or not a short [A-Za-z0-9_-] token
+function getSessionId()
+{
+    $session = $_POST['session'] ?? $_GET['session'] ?? null;
+    if (!is_string($session) || !preg_match('/^[A-Za-z0-9_-]{1,64}$/', $session)) {
+        return null;
+    }
+    return $session;
+}
+
+// Extra command line arguments passing the previous face boxes to a Python script
+function prevFacesArgument($prevFaces)
+{
+    if (empty($prevFaces)) {
+        return '';
+    }
+    return ' --prev-faces ' . escapeshellarg(json_encode($prevFaces));
+}
+
+// Result of a Python script run through exec/shell_exec: the last output line that
+// is a JSON object with a 'success' key. Log lines (JSON or text) are skipped, since
+// the scripts write them asynchronously and they can follow the result when stderr
+// is merged into the output.
+function parsePythonResult($output)
+{
+    $lines = is_array($output) ? $output : preg_split('/\r?\n/', (string)$output);
+    for ($i = count($lines) - 1; $i >= 0; $i--) {
+        $decoded = json_decode(trim($lines[$i]), true);
+        if (is_array($decoded) && array_key_exists('success', $decoded)) {
+            return $decoded;
+        }
+    }
+    return null;
+}
+
+// Attendance log (python/attendance_store.py), through the recognition server when it
+// is running and through the script otherwise. Returns the decoded result or null.
+function callAttendanceStore($method, $path, $payload, $args)
+{
+    $options = ['method' => $method, 'timeout' => 10, 'ignore_errors' => true];
+    $url = RECOGNITION_SERVER_URL . $path;
+    if ($method === 'POST') {
+        $options['header'] = "Content-Type: application/json\r\n";
+        $options['content'] = json_encode($payload);
+    } elseif (!empty($payload)) {
+        $url .= '?' . http_build_query($payload);
+    }
+
+    $response = @file_get_contents($url, false, stream_context_create(['http' => $options]));
+    if ($response !== false) {
+        $result = json_decode($response, true);
+        if (is_array($result)) {
+            return $result;
+        }
+    }
+
+    $command = 'python ' . escapeshellarg(__DIR__ . '/python/attendance_store.py');
+    foreach ($args as $arg) {
+        $command .= ' ' . escapeshellarg((string)$arg);
+    }
+    return parsePythonResult(shell_exec($command));
+}
+
+// Mark a student unless they were marked in the last few seconds. The result has
+// 'marked', the new 'record', and the 'records' added after $cursor with the new 'cursor'.
+function markAttendance($studentId, $name, $confidence, $cursor = 0)
+{
+    $time = date('Y-m-d H:i:s');
+    $payload = [
+        'student_id' => (string)$studentId,
+        'name' => $name,
+        'confidence' => $confidence,
+        'time' => $time,
+        'cursor' => (int)$cursor
+    ];
+    $args = ['mark', '--student-id', $studentId, '--name', $name, '--time', $time, '--cursor', (int)$cursor];
+    if ($confidence !== null) {
+        array_push($args, '--confidence', $confidence);
+    }
+    return callAttendanceStore('POST', '/attendance/mark', $payload, $args);
+}
+
+// A page of attendance records: the newest ones without a cursor, else those after it
+function getAttendanceRecords($cursor = null, $limit = 50)
+{
+    $payload = ['limit' => (int)$limit];
+    $args = ['recent', '--limit', (int)$limit];
+    if ($cursor !== null) {
+        $payload['cursor'] = (int)$cursor;
+        $args = ['since', '--cursor', (int)$cursor, '--limit', (int)$limit];
+    }
+    return callAttendanceStore('GET', '/attendance', $payload, $args);
+}
@@ -1,6 +1,8 @@
 <?php
 header('Content-Type: application/json');
 
+require_once __DIR__ . '/recognition_client.php';
+
 function logMessage($message)
 {
     $logFile = __DIR__ . '/face_recognition.log';
@@ -9,48 +11,28 @@ function logMessage($message)
 }
 
 try {
-    if (!isset($_FILES['image'])) {
+    // The frame is handed to Python in memory, it is never saved
+    $imageData = getUploadedImageData();
+    if ($imageData === null) {
         throw new Exception('No image file received');
     }
 
-    $uploadDir = __DIR__ . '/temp/';
-    if (!file_exists($uploadDir)) {
-        mkdir($uploadDir, 0777, true);
-    }
-
-    // Save uploaded image
-    $tempImage = $uploadDir . 'temp_' . uniqid() . '.jpg';
-    if (!move_uploaded_file($_FILES['image']['tmp_name'], $tempImage)) {
-        throw new Exception('Failed to save uploaded image');
-    }
-
-    // Call Python script for face recognition
-    $pythonScript = __DIR__ . '/python/realtime_recognition.py';
-    $command = "python \"$pythonScript\" \"$tempImage\"";
-
-    logMessage("Executing command: $command");
-    $output = [];
-    $returnCode = 0;
-    exec($command . " 2>&1", $output, $returnCode);
+    // Face location from the previous frame, searched first
+    $prevFaces = getPrevFaces();
+    $session = getSessionId();
 
-    // Log raw output for debugging
-    logMessage("Python output: " . print_r($output, true));
-
-    if ($returnCode !== 0) {
-        throw new Exception('Python script failed: ' . implode("\n", $output));
-    }
-
-    // Get the last line of output (should be JSON)
-    $lastLine = end($output);
-    $result = json_decode($lastLine, true);
+    // Ask the resident recognition server first, it already has the models loaded
+    $result = callRecognitionServerBytes('recognize', $imageData, 10, $prevFaces, $session);
 
     if ($result === null) {
-        logMessage("Error parsing Python output: " . print_r($output, true));
-        throw new Exception('Failed to parse recognition result');
-    }
+        // Server not running - pipe the image to the Python script for face recognition
+        $result = runPythonWithImage(__DIR__ . '/python/realtime_recognition.py', $imageData, $prevFaces);
 
-    // Clean up temporary file
-    unlink($tempImage);
+        // Only failures are logged (by the catch below), successful calls stay off the disk
+        if ($result === null) {
+            throw new Exception('Failed to parse recognition result');
+        }
+    }
 
     if (!$result['success']) {
         // If Python script returns failure, forward the error
@@ -71,10 +53,5 @@ try {
         'success' => false,
         'message' => $e->getMessage()
     ]);
-} finally {
-    // Make sure to clean up temp file if it exists
-    if (isset($tempImage) && file_exists($tempImage)) {
-        unlink($tempImage);
-    }
 }
 ?>
\ No newline at end of file
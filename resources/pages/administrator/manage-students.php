@@ -153,17 +153,14 @@ if (isset($_POST['addStudent'])) {
             throw new Exception("Python script not found at: $pythonScript");
         }
 
-        // Call the script with the train argument
-        $command = "python \"{$pythonScript}\" --train";
-        debug_log("Executing command: $command");
-
+        // Add only the new student to the existing model instead of retraining everyone
+        $command = "python \"{$pythonScript}\" --train --student " . escapeshellarg($registrationNumber);
         $output = [];
         $returnVar = 0;
         exec($command . " 2>&1", $output, $returnVar);
-        debug_log("Command output: " . print_r($output, true));
-        debug_log("Return code: $returnVar");
 
         if ($returnVar !== 0) {
+            debug_log("Command failed ($returnVar): $command\n" . implode("\n", $output));
             throw new Exception("Face recognition training failed. Output: " . implode("\n", $output));
         }
 
@@ -14,7 +14,8 @@ if ($_SERVER['REQUEST_METHOD'] === 'POST') {
             $date = date("Y-m-d"); 
 
             $sql = "INSERT INTO tblattendance(studentRegistrationNumber, course, unit, attendanceStatus, dateMarked)  
-                    VALUES ('$studentID', '$course', '$unit', '$attendanceStatus', '$date')";
+                    VALUES ('$studentID', '$course', '$unit', '$attendanceStatus', '$date')
+                    ON DUPLICATE KEY UPDATE attendanceStatus = VALUES(attendanceStatus)";
             
             if ($conn->query($sql) === TRUE) {
                 echo "Attendance data for student ID $studentID inserted successfully.<br>";
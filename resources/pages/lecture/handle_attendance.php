@@ -20,17 +20,14 @@ error_reporting(E_ALL);
 ini_set('display_errors', 1);
 
 try {
-    // Log request details
-    debugLog("Request started");
-    debugLog("POST data: " . print_r($_POST, true));
-    debugLog("FILES data: " . print_r($_FILES, true));
+    // One compact line per request, the full payloads are only logged on errors
+    debugLog("Request: fields=" . implode(',', array_keys($_POST))
+        . " image=" . (isset($_FILES['image']['size']) ? $_FILES['image']['size'] . ' bytes' : 'none'));
 
     // Get the absolute path to the project root
     $projectRoot = realpath(__DIR__ . '/../../..');
     define('PROJECT_ROOT', $projectRoot);
 
-    debugLog("Project root: " . PROJECT_ROOT);
-
     // Validate required files exist
     $pythonScript = PROJECT_ROOT . '/python/recognize_face.py';
     $haarCascade = PROJECT_ROOT . '/assets/haarcascade_frontalface_default.xml';
@@ -61,7 +58,6 @@ try {
 
     // Save the uploaded image
     $tempImage = $uploadsDir . '/temp_' . uniqid() . '.jpg';
-    debugLog("Saving image to: " . $tempImage);
 
     if (!move_uploaded_file($_FILES['image']['tmp_name'], $tempImage)) {
         throw new Exception("Failed to save uploaded image");
@@ -80,7 +76,6 @@ try {
         $command .= ' --detect-only';
     }
 
-    debugLog("Executing command: " . $command);
 
     // Execute command with proper error handling
     $descriptorspec = array(
@@ -100,17 +95,9 @@ try {
 
     $returnValue = proc_close($process);
 
-    // Log outputs
-    debugLog("Command stdout: " . $stdout);
-    if ($stderr) {
-        debugLog("Command stderr: " . $stderr);
-    }
-    debugLog("Command return value: " . $returnValue);
-
     // Clean up temp file
     if (file_exists($tempImage)) {
         unlink($tempImage);
-        debugLog("Temporary image deleted");
     }
 
     // Check for execution errors
@@ -136,7 +123,6 @@ try {
         'stderr' => $stderr
     );
 
-    debugLog("Sending response: " . json_encode($result));
     echo json_encode($result);
 
 } catch (Exception $e) {
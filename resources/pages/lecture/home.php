@@ -5,8 +5,10 @@ if ($_SERVER['REQUEST_METHOD'] === 'POST') {
     $attendanceData = json_decode(file_get_contents("php://input"), true);
     if ($attendanceData) {
         try {
+            // Resubmitting the sheet updates the day's marks (unique key from database/attendance_indexes.sql)
             $sql = "INSERT INTO tblattendance (studentRegistrationNumber, course, unit, attendanceStatus, dateMarked)  
-                VALUES (:studentID, :course, :unit, :attendanceStatus, :date)";
+                VALUES (:studentID, :course, :unit, :attendanceStatus, :date)
+                ON DUPLICATE KEY UPDATE attendanceStatus = VALUES(attendanceStatus)";
 
             $stmt = $pdo->prepare($sql);
 
@@ -14,10 +14,18 @@ document.addEventListener("DOMContentLoaded", () => {
   let detectionInterval = null;
   let isFaceDetected = false;
   let lastFacePosition = null;
+  let lastFaceLocation = null; // Raw box of the last response, sent as a detection hint
+  let requestCount = 0;
+  const FULL_SCAN_EVERY = 10; // Scan the whole frame every Nth request to find new faces
   let frameCount = 0;
   let skipFrames = 2; // Process every 3rd frame
   let faceSmoothingFactor = 0.3; // Smoothing factor for face position
   let lastRecognitionStatus = null;
+  let attendanceCursor = 0; // Id of the last attendance record shown, only newer ones are sent
+  // Camera session id: the server reuses its last result while the scene does not change
+  const cameraSession = window.crypto && crypto.randomUUID
+    ? crypto.randomUUID()
+    : Math.random().toString(36).slice(2);
 
   // Start camera
   startButton.addEventListener("click", async () => {
@@ -85,7 +93,6 @@ document.addEventListener("DOMContentLoaded", () => {
     }
 
     try {
-      const formData = new FormData();
       let blob;
       try {
         blob = dataURLtoBlob(imageData);
@@ -96,11 +103,20 @@ document.addEventListener("DOMContentLoaded", () => {
         requestAnimationFrame(startFaceDetection);
         return;
       }
-      formData.append("image", blob);
+      // The JPEG is sent as the raw body, so the server never writes it to disk
+      const params = new URLSearchParams({
+        cursor: attendanceCursor,
+        session: cameraSession,
+      });
+      requestCount++;
+      if (lastFaceLocation && requestCount % FULL_SCAN_EVERY !== 0) {
+        params.set("prev_faces", JSON.stringify(lastFaceLocation));
+      }
 
-      const response = await fetch("process_attendance.php", {
+      const response = await fetch(`process_attendance.php?${params}`, {
         method: "POST",
-        body: formData,
+        headers: { "Content-Type": "image/jpeg" },
+        body: blob,
       });
 
       let result;
@@ -115,6 +131,9 @@ document.addEventListener("DOMContentLoaded", () => {
         return;
       }
 
+      // Remember where the face was, even when the status text is unchanged
+      lastFaceLocation = result.success ? result.face_location || null : null;
+
       if (result.message !== lastRecognitionStatus) {
         lastRecognitionStatus = result.message;
         if (result.success) {
@@ -179,7 +198,7 @@ document.addEventListener("DOMContentLoaded", () => {
           }
 
           if (result.records) {
-            updateAttendanceList(result.records);
+            updateAttendanceList(result.records, result.cursor);
           }
         } else {
           status.textContent = `Status: ${result.message}`;
@@ -240,14 +259,15 @@ document.addEventListener("DOMContentLoaded", () => {
     // Convert canvas to blob
     canvas.toBlob(
       async (blob) => {
-        const formData = new FormData();
-        formData.append("image", blob, "capture.jpg");
-
         try {
-          const response = await fetch("process_attendance.php", {
-            method: "POST",
-            body: formData,
-          });
+          const response = await fetch(
+            `process_attendance.php?cursor=${attendanceCursor}`,
+            {
+              method: "POST",
+              headers: { "Content-Type": "image/jpeg" },
+              body: blob,
+            }
+          );
 
           let result;
           const responseText = await response.text();
@@ -262,7 +282,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
           if (result.success) {
             status.textContent = `Status: ${result.message}`;
-            updateAttendanceList(result.records);
+            updateAttendanceList(result.records, result.cursor);
           } else {
             status.textContent = `Status: ${result.message}`;
           }
@@ -277,9 +297,9 @@ document.addEventListener("DOMContentLoaded", () => {
     ); // Higher quality for capture
   });
 
-  // Update attendance list
-  function updateAttendanceList(records) {
-    attendanceRecords.innerHTML = records
+  // Add new records to the attendance list, replace swaps the whole list
+  function updateAttendanceList(records, cursor, replace = false) {
+    const html = records
       .map(
         (record) => `
             <div class="attendance-record">
@@ -289,6 +309,14 @@ document.addEventListener("DOMContentLoaded", () => {
         `
       )
       .join("");
+    if (replace) {
+      attendanceRecords.innerHTML = html;
+    } else {
+      attendanceRecords.insertAdjacentHTML("beforeend", html);
+    }
+    if (cursor !== undefined) {
+      attendanceCursor = cursor;
+    }
   }
 
   // Load initial attendance records
@@ -307,7 +335,7 @@ document.addEventListener("DOMContentLoaded", () => {
       }
 
       if (result.success) {
-        updateAttendanceList(result.records);
+        updateAttendanceList(result.records, result.cursor, true);
       } else {
         status.textContent =
           "Status: Error loading attendance records - " + result.message;
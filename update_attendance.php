@@ -3,6 +3,7 @@ header('Content-Type: application/json');
 
 // Include database connection
 require_once 'database/database_connection.php';
+require_once __DIR__ . '/recognition_client.php';
 
 // Get JSON data
 $data = json_decode(file_get_contents('php://input'), true);
@@ -23,71 +24,140 @@ try {
     $attendanceStatus = $data['attendanceStatus'];
     $date = isset($data['date']) ? $data['date'] : date('Y-m-d');
 
-    // First check if there's an existing attendance record
-    $checkSql = "SELECT attendanceID, attendanceStatus FROM tblattendance 
-                 WHERE studentRegistrationNumber = :studentID 
-                 AND course = :course 
-                 AND unit = :unit 
-                 AND DATE(dateMarked) = :date";
+    // The upserts below (and in the server's batched writer) rely on the unique
+    // (student, course, unit, date) key from database/attendance_indexes.sql.
+    // Until it is applied, an existing mark is looked up first as before.
+    $indexStmt = $pdo->query("SHOW INDEX FROM tblattendance WHERE Key_name = 'uq_attendance_mark'");
+    $hasUniqueKey = $indexStmt->fetch() !== false;
 
-    $checkStmt = $pdo->prepare($checkSql);
-    $checkStmt->execute([
-        ':studentID' => $studentID,
-        ':course' => $course,
-        ':unit' => $unit,
-        ':date' => $date
-    ]);
+    if (!$hasUniqueKey) {
+        // Check if there's an existing attendance record
+        $checkSql = "SELECT attendanceID, attendanceStatus FROM tblattendance 
+                     WHERE studentRegistrationNumber = :studentID 
+                     AND course = :course 
+                     AND unit = :unit 
+                     AND DATE(dateMarked) = :date";
 
-    $existingRecord = $checkStmt->fetch(PDO::FETCH_ASSOC);
+        $checkStmt = $pdo->prepare($checkSql);
+        $checkStmt->execute([
+            ':studentID' => $studentID,
+            ':course' => $course,
+            ':unit' => $unit,
+            ':date' => $date
+        ]);
 
-    if ($existingRecord) {
-        // If record exists and is marked as 'Absent', update it to 'Present'
-        if ($existingRecord['attendanceStatus'] === 'Absent') {
-            $updateSql = "UPDATE tblattendance 
-                         SET attendanceStatus = :status,
-                             dateMarked = NOW() 
-                         WHERE attendanceID = :attendanceID";
+        $existingRecord = $checkStmt->fetch(PDO::FETCH_ASSOC);
 
-            $updateStmt = $pdo->prepare($updateSql);
-            $updateStmt->execute([
-                ':status' => $attendanceStatus,
-                ':attendanceID' => $existingRecord['attendanceID']
+        if ($existingRecord) {
+            // If record exists and is marked as 'Absent', update it to 'Present'
+            if ($existingRecord['attendanceStatus'] === 'Absent') {
+                $updateSql = "UPDATE tblattendance 
+                             SET attendanceStatus = :status,
+                                 dateMarked = NOW() 
+                             WHERE attendanceID = :attendanceID";
+
+                $updateStmt = $pdo->prepare($updateSql);
+                $updateStmt->execute([
+                    ':status' => $attendanceStatus,
+                    ':attendanceID' => $existingRecord['attendanceID']
+                ]);
+
+                echo json_encode([
+                    'success' => true,
+                    'message' => 'Attendance updated successfully',
+                    'updated' => true
+                ]);
+            } else {
+                // Record exists but is already marked as Present
+                echo json_encode([
+                    'success' => true,
+                    'message' => 'Attendance already marked as Present',
+                    'updated' => false
+                ]);
+            }
+        } else {
+            // No existing record, insert new one
+            $insertSql = "INSERT INTO tblattendance 
+                          (studentRegistrationNumber, course, unit, attendanceStatus, dateMarked) 
+                          VALUES (:studentID, :course, :unit, :status, NOW())";
+
+            $insertStmt = $pdo->prepare($insertSql);
+            $insertStmt->execute([
+                ':studentID' => $studentID,
+                ':course' => $course,
+                ':unit' => $unit,
+                ':status' => $attendanceStatus
             ]);
 
             echo json_encode([
                 'success' => true,
-                'message' => 'Attendance updated successfully',
+                'message' => 'New attendance record created successfully',
                 'updated' => true
             ]);
-        } else {
-            // Record exists but is already marked as Present
-            echo json_encode([
-                'success' => true,
-                'message' => 'Attendance already marked as Present',
-                'updated' => false
-            ]);
         }
-    } else {
-        // No existing record, insert new one
-        $insertSql = "INSERT INTO tblattendance 
-                      (studentRegistrationNumber, course, unit, attendanceStatus, dateMarked) 
-                      VALUES (:studentID, :course, :unit, :status, NOW())";
-
-        $insertStmt = $pdo->prepare($insertSql);
-        $insertStmt->execute([
-            ':studentID' => $studentID,
-            ':course' => $course,
-            ':unit' => $unit,
-            ':status' => $attendanceStatus
-        ]);
+        exit;
+    }
 
+    // Hand the mark to the recognition server's batched writer when it is running,
+    // repeats of the same student are dropped there before reaching the database
+    $context = stream_context_create([
+        'http' => [
+            'method' => 'POST',
+            'header' => "Content-Type: application/json\r\n",
+            'content' => json_encode([
+                'studentID' => $studentID,
+                'course' => $course,
+                'unit' => $unit,
+                'attendanceStatus' => $attendanceStatus,
+                'date' => $date,
+                'confidence' => $data['confidence'] ?? null
+            ]),
+            'timeout' => 5,
+            'ignore_errors' => true
+        ]
+    ]);
+    $response = @file_get_contents(RECOGNITION_SERVER_URL . '/attendance/class', false, $context);
+    $queued = $response !== false ? json_decode($response, true) : null;
+
+    if (!empty($queued['success'])) {
         echo json_encode([
             'success' => true,
-            'message' => 'New attendance record created successfully',
-            'updated' => true
+            'message' => $queued['queued'] ? 'Attendance queued' : 'Attendance already marked as Present',
+            'updated' => $queued['queued']
         ]);
+        exit;
     }
 
+    // Otherwise one upsert on the unique (student, course, unit, date) key from
+    // database/attendance_indexes.sql; an existing mark only changes while 'Absent'
+    $upsertSql = "INSERT INTO tblattendance 
+                  (studentRegistrationNumber, course, unit, attendanceStatus, dateMarked) 
+                  VALUES (:studentID, :course, :unit, :status, :date)
+                  ON DUPLICATE KEY UPDATE 
+                  attendanceStatus = IF(attendanceStatus = 'Absent', VALUES(attendanceStatus), attendanceStatus)";
+
+    $upsertStmt = $pdo->prepare($upsertSql);
+    $upsertStmt->execute([
+        ':studentID' => $studentID,
+        ':course' => $course,
+        ':unit' => $unit,
+        ':status' => $attendanceStatus,
+        ':date' => $date
+    ]);
+
+    // MySQL reports 1 for an insert, 2 for an update and 0 when nothing changed
+    $affected = $upsertStmt->rowCount();
+    $messages = [
+        0 => 'Attendance already marked as Present',
+        1 => 'New attendance record created successfully',
+        2 => 'Attendance updated successfully'
+    ];
+    echo json_encode([
+        'success' => true,
+        'message' => $messages[$affected] ?? 'Attendance updated successfully',
+        'updated' => $affected > 0
+    ]);
+
 } catch (PDOException $e) {
     error_log("Database error: " . $e->getMessage());
     echo json_encode([